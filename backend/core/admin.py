@@ -1,10 +1,56 @@
+from functools import cached_property
+from django import forms
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count
 from django.shortcuts import render
 from django.contrib import messages
-from .models import InstituteProfile, CourseCategory, Course, Student, Enrollment, ContactMessage, SeasonalOffer, Batch
+from .models import (
+    InstituteProfile, CourseCategory, Course, Student, Enrollment, ContactMessage, SeasonalOffer, Batch,
+    BatchReminderRule, MessageCampaign, Payment, Installment, BatchTemplate, BatchTemplateSkip
+)
+from .caching import get_batch_choices
+from .installments import create_installment_plans
+from .rollover import rollover_batches
+from .timetable import room_clashes
+from .transitions import transition_enrollments
 from .utils import send_professional_email, send_whatsapp_message
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids COUNT(*) on large unfiltered changelists.
+
+    On PostgreSQL an unfiltered queryset is counted from the planner's
+    row estimate (pg_class.reltuples, kept fresh by autovacuum) once it
+    exceeds ADMIN_ESTIMATED_COUNT_THRESHOLD rows; filtered or searched
+    changelists, small tables and other databases use an exact count.
+    """
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 10000):
+                return row[0]
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables that grow without bound"""
+    paginator = EstimatedCountPaginator
+    # Skips the second, unfiltered COUNT(*) behind "N total"
+    show_full_result_count = False
+
+
 @admin.register(InstituteProfile)
 class InstituteProfileAdmin(admin.ModelAdmin):
     list_display = ['name', 'certification', 'founding_year', 'total_centers', 'students_per_year']
@@ -36,9 +82,13 @@ class CourseCategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     ordering = ['display_order', 'name']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_courses=Count('courses'))
+    
     def course_count(self, obj):
-        return obj.courses.count()
+        return obj.num_courses
     course_count.short_description = 'Number of Courses'
+    course_count.admin_order_field = 'num_courses'
 
 
 @admin.register(Course)
@@ -46,6 +96,7 @@ class CourseAdmin(admin.ModelAdmin):
     list_display = ['code', 'name', 'category', 'duration', 'fees', 'is_featured', 'is_active', 'enrollment_open']
     list_filter = ['category', 'is_featured', 'is_active', 'enrollment_open']
     list_editable = ['is_featured', 'is_active', 'enrollment_open']
+    list_select_related = ['category']
     search_fields = ['name', 'code', 'objective', 'description']
     ordering = ['category__display_order', 'name']
     
@@ -70,19 +121,24 @@ class CourseAdmin(admin.ModelAdmin):
 
 
 class BatchFilter(admin.SimpleListFilter):
+    """Students by batch; lookups come from one cached query"""
     title = 'Batch'
     parameter_name = 'batch'
+    lookup = 'enrollments__batch_id'
 
     def lookups(self, request, model_admin):
-        batches = Batch.objects.all()
-        return [(b.id, str(b)) for b in batches]
+        return get_batch_choices()
 
     def queryset(self, request, queryset):
         if self.value():
-            return queryset.filter(enrollments__batch__id=self.value())
+            return queryset.filter(**{self.lookup: self.value()})
         return queryset
 
 
+class EnrollmentBatchFilter(BatchFilter):
+    lookup = 'batch_id'
+
+
 @admin.action(description='Send Email & WhatsApp to selected Students')
 def send_email_and_whatsapp(modeladmin, request, queryset):
     # If request is POST and 'apply' is clicked (we can use an intermediate page for message content)
@@ -100,9 +156,9 @@ def send_email_and_whatsapp(modeladmin, request, queryset):
             if send_email and student.email:
                 send_professional_email(subject, message, [student.email])
             
-            if send_whatsapp and student.phone:
+            if send_whatsapp and student.phone_e164:
                 # Assuming simple text message
-                send_whatsapp_message(student.phone, message)
+                send_whatsapp_message(student.phone_e164, message)
             
             count += 1
             
@@ -114,7 +170,7 @@ def send_email_and_whatsapp(modeladmin, request, queryset):
 
 
 @admin.register(Student)
-class StudentAdmin(admin.ModelAdmin):
+class StudentAdmin(LargeTableAdmin):
     list_display = ['full_name', 'email', 'phone', 'is_active', 'created_at']
     list_filter = ['is_active', 'created_at', BatchFilter]
     search_fields = ['first_name', 'last_name', 'email', 'phone']
@@ -137,10 +193,98 @@ class StudentAdmin(admin.ModelAdmin):
     )
 
 
+def _transition_action(to_status, label):
+    """Admin action applying one bulk status transition to the selected enrollments"""
+    @admin.action(description=f'Mark selected enrollments as {label}')
+    def action(modeladmin, request, queryset):
+        result = transition_enrollments(queryset, to_status, skip_invalid=True)
+        modeladmin.message_user(request, f"{len(result['updated'])} enrollment(s) marked as {label}.")
+        if result['invalid']:
+            modeladmin.message_user(
+                request,
+                f"{len(result['invalid'])} enrollment(s) skipped: their current status cannot change to {label}.",
+                messages.WARNING
+            )
+        if result['promoted']:
+            modeladmin.message_user(request, f"{len(result['promoted'])} waitlisted enrollment(s) promoted.")
+    action.__name__ = f'mark_{to_status}'
+    return action
+
+
+@admin.action(description='Generate installment plans for selected enrollments')
+def generate_installment_plans(modeladmin, request, queryset):
+    created = create_installment_plans(queryset)
+    modeladmin.message_user(request, f"Installment plans created for {created} enrollment(s); existing plans were left as is.")
+
+
+class EnrollmentAdminForm(forms.ModelForm):
+    class Meta:
+        model = Enrollment
+        fields = '__all__'
+    
+    def clean_status(self):
+        # Same rule as the API; the instance still holds the stored status here
+        status = self.cleaned_data['status']
+        instance = self.instance
+        if instance.pk and status != instance.status and not instance.can_transition_to(status):
+            raise forms.ValidationError(f"Cannot change status from '{instance.status}' to '{status}'.")
+        return status
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        batch, status = cleaned_data.get('batch'), cleaned_data.get('status')
+        # Pending enrollments are waitlisted automatically; others need a free seat.
+        # Enrollment.save() re-checks atomically, this just gives a friendly error.
+        if batch and status in Enrollment.SEAT_STATUSES and status != 'pending' and batch.seats_available == 0:
+            instance = self.instance
+            already_seated = (
+                instance.pk and instance.batch_id == batch.pk
+                and Enrollment.objects.filter(pk=instance.pk, status__in=Enrollment.SEAT_STATUSES).exists()
+            )
+            if not already_seated:
+                raise forms.ValidationError(f'{batch.name} is full ({batch.capacity} seats).')
+        return cleaned_data
+
+
+class PaymentInline(admin.TabularInline):
+    """Read-only view of an enrollment's ledger; record payments from the Payments page"""
+    model = Payment
+    extra = 0
+    can_delete = False
+    fields = ['receipt_number', 'amount', 'mode', 'paid_at', 'note', 'recorded_by']
+    readonly_fields = fields
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class InstallmentInline(admin.TabularInline):
+    """Generated schedule; statuses follow payments and the overdue scan"""
+    model = Installment
+    extra = 0
+    can_delete = False
+    fields = ['sequence', 'due_date', 'amount', 'status', 'paid_at', 'reminded_at']
+    readonly_fields = fields
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Enrollment)
-class EnrollmentAdmin(admin.ModelAdmin):
+class EnrollmentAdmin(LargeTableAdmin):
+    form = EnrollmentAdminForm
+    inlines = [InstallmentInline, PaymentInline]
+    actions = [
+        _transition_action('approved', 'approved'),
+        _transition_action('completed', 'completed'),
+        _transition_action('rejected', 'rejected'),
+        _transition_action('cancelled', 'cancelled'),
+        generate_installment_plans,
+    ]
     list_display = ['student', 'course', 'batch', 'status', 'enrollment_date', 'progress_percentage', 'payment_status']
-    list_filter = ['status', 'payment_status', 'enrollment_date', 'course__category', 'batch']
+    list_filter = ['status', 'payment_status', 'enrollment_date', 'course__category', EnrollmentBatchFilter]
+    list_select_related = ['student', 'course', 'batch__course']
+    raw_id_fields = ['student']
     search_fields = ['student__first_name', 'student__last_name', 'student__email', 'course__name', 'course__code']
     ordering = ['-enrollment_date']
     
@@ -152,7 +296,7 @@ class EnrollmentAdmin(admin.ModelAdmin):
             'fields': ('status', 'progress_percentage')
         }),
         ('Payment', {
-            'fields': ('payment_status', 'amount_paid')
+            'fields': ('fee_due', 'amount_paid', 'balance_due', 'payment_status')
         }),
         ('Remarks', {
             'fields': ('remarks',),
@@ -160,11 +304,50 @@ class EnrollmentAdmin(admin.ModelAdmin):
         }),
     )
     
-    readonly_fields = ['enrollment_date']
+    readonly_fields = ['enrollment_date', 'amount_paid', 'balance_due', 'payment_status']
+    
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # Batch choices are labelled with the course code
+        if db_field.name == 'batch':
+            kwargs['queryset'] = Batch.objects.select_related('course')
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+@admin.register(Payment)
+class PaymentAdmin(LargeTableAdmin):
+    list_display = ['receipt_number', 'enrollment', 'amount', 'mode', 'paid_at', 'recorded_by']
+    list_filter = ['mode', 'paid_at']
+    search_fields = ['receipt_number', 'enrollment__student__email', 'enrollment__student__first_name', 'enrollment__student__last_name']
+    list_select_related = ['enrollment__student', 'enrollment__course', 'recorded_by']
+    raw_id_fields = ['enrollment']
+    ordering = ['-paid_at']
+    fields = ['enrollment', 'amount', 'mode', 'receipt_number', 'paid_at', 'note']
+    
+    # The ledger is append-only: entries can be added and viewed, never edited or deleted
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    def save_model(self, request, obj, form, change):
+        obj.recorded_by = request.user
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(Installment)
+class InstallmentAdmin(LargeTableAdmin):
+    list_display = ['enrollment', 'sequence', 'due_date', 'amount', 'status', 'reminded_at']
+    list_filter = ['status', 'due_date']
+    search_fields = ['enrollment__student__email', 'enrollment__student__first_name', 'enrollment__student__last_name']
+    list_select_related = ['enrollment__student', 'enrollment__course']
+    raw_id_fields = ['enrollment']
+    ordering = ['due_date']
+    readonly_fields = ['status', 'paid_at', 'reminded_at']
 
 
 @admin.register(ContactMessage)
-class ContactMessageAdmin(admin.ModelAdmin):
+class ContactMessageAdmin(LargeTableAdmin):
     list_display = ['name', 'email', 'subject', 'is_read', 'created_at']
     list_filter = ['is_read', 'created_at']
     search_fields = ['name', 'email', 'subject', 'message']
@@ -192,9 +375,77 @@ class SeasonalOfferAdmin(admin.ModelAdmin):
     ordering = ['-priority', '-created_at']
 
 
+class BatchAdminForm(forms.ModelForm):
+    class Meta:
+        model = Batch
+        fields = '__all__'
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        batch = Batch(pk=self.instance.pk, **{
+            field: cleaned_data.get(field) for field in ('course', 'time_slot', 'start_date', 'room', 'is_active')
+        })
+        if batch.is_active and batch.room and batch.course:
+            clashing = Batch.objects.filter(pk__in=room_clashes(batch))
+            if clashing:
+                raise forms.ValidationError(
+                    f'{batch.room} is already booked at this time by: {", ".join(b.name for b in clashing)}'
+                )
+        return cleaned_data
+
+
 @admin.register(Batch)
 class BatchAdmin(admin.ModelAdmin):
-    list_display = ['name', 'course', 'time_slot', 'start_date', 'is_active']
-    list_filter = ['course', 'is_active', 'start_date']
+    form = BatchAdminForm
+    list_display = ['name', 'course', 'time_slot', 'room', 'start_date', 'capacity', 'seats_taken', 'is_active']
+    list_filter = ['course', 'is_active', 'room', 'start_date']
     search_fields = ['name', 'course__name', 'course__code']
+    list_select_related = ['course']
     ordering = ['-start_date']
+    readonly_fields = ['seats_taken', 'template']
+
+
+class BatchTemplateSkipInline(admin.TabularInline):
+    model = BatchTemplateSkip
+    extra = 0
+    fields = ['start_date', 'created_at']
+    readonly_fields = ['created_at']
+
+
+@admin.register(BatchTemplate)
+class BatchTemplateAdmin(admin.ModelAdmin):
+    list_display = ['course', 'label', 'time_slot', 'room', 'capacity', 'every_months', 'first_start_date', 'is_active']
+    list_filter = ['is_active', 'every_months', 'course']
+    list_editable = ['is_active']
+    list_select_related = ['course']
+    search_fields = ['label', 'course__name', 'course__code']
+    inlines = [BatchTemplateSkipInline]
+    actions = ['generate_batches']
+    
+    @admin.action(description='Generate upcoming batches (next 3 months)')
+    def generate_batches(self, request, queryset):
+        created, clashes = rollover_batches(templates=queryset)
+        self.message_user(request, f'Created {created} batch(es).', messages.SUCCESS)
+        for clash in clashes:
+            self.message_user(
+                request,
+                f'Skipped {clash["name"]}: {clash["room"]} is already booked by {", ".join(clash["clashes_with"])}.',
+                messages.WARNING,
+            )
+
+
+@admin.register(BatchReminderRule)
+class BatchReminderRuleAdmin(admin.ModelAdmin):
+    list_display = ['name', 'days_before', 'send_time', 'enrollment_status', 'message_type', 'is_active']
+    list_filter = ['is_active', 'message_type']
+    list_editable = ['is_active']
+    search_fields = ['name', 'subject', 'content']
+
+
+@admin.register(MessageCampaign)
+class MessageCampaignAdmin(admin.ModelAdmin):
+    list_display = ['name', 'message_type', 'send_at', 'status', 'recipient_count', 'sent_at']
+    list_filter = ['status', 'message_type', 'send_at']
+    search_fields = ['name', 'subject']
+    ordering = ['-send_at']
+    readonly_fields = ['reminder_rule', 'batch', 'claimed_at', 'sent_at', 'recipient_count', 'last_error', 'created_at']
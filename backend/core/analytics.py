@@ -0,0 +1,171 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+from .models import Enrollment, EnrollmentDailyStat, Payment, RevenueDailyStat, RollupWatermark
+
+ENROLLMENT_ROLLUP = 'enrollments'
+REVENUE_ROLLUP = 'revenue'
+
+# group_by keys accepted by the query functions, mapped to rollup columns
+ENROLLMENT_DIMENSIONS = {
+    'course': ['course_id', 'course__code', 'course__name'],
+    'category': ['course__category_id', 'course__category__name'],
+    'status': ['status'],
+    'month': ['month'],
+}
+REVENUE_DIMENSIONS = {key: ENROLLMENT_DIMENSIONS[key] for key in ('course', 'category', 'month')}
+
+
+def _overlap():
+    # Rows committed late by long transactions are re-read on the next run;
+    # recounting a bucket is idempotent, so the overlap only costs time
+    return timedelta(seconds=getattr(settings, 'ANALYTICS_ROLLUP_OVERLAP_SECONDS', 300))
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _group_by_day(buckets):
+    days = defaultdict(set)
+    for day, course_id in buckets:
+        days[day].add(course_id)
+    return days
+
+
+def recount_enrollment_buckets(buckets):
+    """
+    Rebuild EnrollmentDailyStat for the given (day, course_id) pairs.
+
+    Each affected day costs one grouped query over that day's enrollments
+    for the affected courses (enrollment_date_course_idx), a delete and a
+    bulk insert.
+    """
+    for day, course_ids in _group_by_day(buckets).items():
+        start, end = _day_bounds(day)
+        counts = (
+            Enrollment.objects.filter(enrollment_date__gte=start, enrollment_date__lt=end, course_id__in=course_ids)
+            .order_by().values('course_id', 'status').annotate(n=Count('id'))
+        )
+        with transaction.atomic():
+            EnrollmentDailyStat.objects.filter(day=day, course_id__in=course_ids).delete()
+            EnrollmentDailyStat.objects.bulk_create([
+                EnrollmentDailyStat(day=day, course_id=row['course_id'], status=row['status'], enrollments=row['n'])
+                for row in counts
+            ])
+
+
+def recount_revenue_buckets(buckets):
+    """Rebuild RevenueDailyStat for the given (day, course_id) pairs, one query per day."""
+    for day, course_ids in _group_by_day(buckets).items():
+        start, end = _day_bounds(day)
+        totals = (
+            Payment.objects.filter(paid_at__gte=start, paid_at__lt=end, enrollment__course_id__in=course_ids)
+            .order_by().values('enrollment__course_id').annotate(amount=Sum('amount'), n=Count('id'))
+        )
+        with transaction.atomic():
+            RevenueDailyStat.objects.filter(day=day, course_id__in=course_ids).delete()
+            RevenueDailyStat.objects.bulk_create([
+                RevenueDailyStat(day=day, course_id=row['enrollment__course_id'], amount=row['amount'], payments=row['n'])
+                for row in totals
+            ])
+
+
+def recount_moved_enrollment(enrollment_id, enrollment_date, course_ids):
+    """
+    Recount the buckets an enrollment left and entered when its course
+    changed: its enrollment-day bucket and the day bucket of each of its
+    payments, for every course given.
+
+    The incremental refresh only sees the new course (through updated_at)
+    and no revenue bucket at all (payments keep their created_at), so the
+    move is recounted here.
+    """
+    day = timezone.localdate(enrollment_date)
+    recount_enrollment_buckets([(day, course_id) for course_id in course_ids])
+    payment_days = {
+        timezone.localdate(paid_at)
+        for paid_at in Payment.objects.filter(enrollment_id=enrollment_id).values_list('paid_at', flat=True)
+    }
+    recount_revenue_buckets([(day, course_id) for day in payment_days for course_id in course_ids])
+
+
+def _refresh(name, changed_rows, changed_field, date_field, course_field, recount):
+    started = timezone.now()
+    watermark = RollupWatermark.objects.filter(name=name).first()
+    if watermark is not None:
+        changed_rows = changed_rows.filter(**{f'{changed_field}__gte': watermark.value - _overlap()})
+    buckets = set(
+        changed_rows.order_by().annotate(day=TruncDate(date_field)).values_list('day', course_field).distinct()
+    )
+    recount(buckets)
+    RollupWatermark.objects.update_or_create(name=name, defaults={'value': started})
+    return len(buckets)
+
+
+def refresh_rollups():
+    """
+    Bring the analytics rollups up to date incrementally.
+
+    Only enrollments updated (and payments created) since the previous
+    run's watermark are read, through enrollment_updated_idx and
+    payment_created_idx. Their (day, course) buckets are recounted from
+    scratch, so a status change moves the enrollment between status
+    buckets correctly. The first run has no watermark and builds
+    everything. Deleted enrollments and enrollments moved to another
+    course are recounted by signal handlers.
+
+    Returns:
+        dict: Number of buckets recounted per rollup.
+    """
+    return {
+        ENROLLMENT_ROLLUP: _refresh(
+            ENROLLMENT_ROLLUP, Enrollment.objects.all(), 'updated_at',
+            'enrollment_date', 'course_id', recount_enrollment_buckets,
+        ),
+        REVENUE_ROLLUP: _refresh(
+            REVENUE_ROLLUP, Payment.objects.all(), 'created_at',
+            'paid_at', 'enrollment__course_id', recount_revenue_buckets,
+        ),
+    }
+
+
+def _breakdown(stats, group_by, dimensions, metrics):
+    fields = []
+    for key in group_by:
+        fields.extend(dimensions[key])
+    if 'month' in group_by:
+        stats = stats.annotate(month=TruncMonth('day'))
+    return list(stats.values(*fields).annotate(**metrics).order_by(*fields))
+
+
+def enrollment_breakdown(start, end, group_by):
+    """
+    Enrollment counts between two dates (inclusive), summed from daily buckets.
+
+    Args:
+        start (date): First enrollment day.
+        end (date): Last enrollment day.
+        group_by (list): Keys of ENROLLMENT_DIMENSIONS.
+
+    Returns:
+        list: One dict per group with the dimension columns and 'enrollments'.
+    """
+    stats = EnrollmentDailyStat.objects.filter(day__gte=start, day__lte=end)
+    return _breakdown(stats, group_by, ENROLLMENT_DIMENSIONS, {'enrollments': Sum('enrollments')})
+
+
+def revenue_breakdown(start, end, group_by):
+    """Ledger revenue between two dates (inclusive), summed from daily buckets."""
+    stats = RevenueDailyStat.objects.filter(day__gte=start, day__lte=end)
+    return _breakdown(stats, group_by, REVENUE_DIMENSIONS, {'amount': Sum('amount'), 'payments': Sum('payments')})
+
+
+def rollup_as_of():
+    """Watermarks of the rollups, i.e. how fresh the answers are."""
+    return dict(RollupWatermark.objects.values_list('name', 'value'))
@@ -1,26 +1,33 @@
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes, authentication_classes
+from rest_framework.decorators import api_view, permission_classes, authentication_classes, throttle_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from django.contrib.auth import authenticate, login as django_login, logout as django_logout
-from .models import Student, OTPVerification
+from django.contrib.auth import login as django_login
+from .models import Student
 from .serializers import StudentSerializer
+from .mail_queue import enqueue_email
+from .utils import normalize_phone
+from .backends import authenticate_identity
+from .caching import get_current_user_payload
+from .throttling import LoginThrottle, OTPRequestThrottle, OTPVerifyThrottle
+from .otp_store import get_otp_store, OTP_VERIFIED, OTP_LOCKED
+from .authentication import (
+    StudentTokenUser, TokenRefreshSerializer, get_tokens_for_student, get_tokens_for_staff
+)
 from django.views.decorators.csrf import csrf_exempt
-from django.core.mail import send_mail
 from django.conf import settings
-from django.utils import timezone
-from datetime import timedelta
-import random
-import string
+from django.utils.cache import patch_cache_control
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginThrottle])
 @authentication_classes([])
 @csrf_exempt
 def student_login(request):
     """
-    Student login with email and password.
+    Student login with email (or phone number) and password; staff log in
+    with their username.
     """
     email = request.data.get('email', '').strip().lower()
     password = request.data.get('password', '')
@@ -31,15 +38,11 @@ def student_login(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    try:
-        student = Student.objects.get(email__iexact=email)
-        
-        # Check password
-        if not student.check_password(password):
-            return Response(
-                {'error': 'Invalid email or password'},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+    # One lookup for Student or staff User, exactly one password hash
+    kind, account = authenticate_identity(email, password)
+    
+    if kind == 'student':
+        student = account
         
         # Check if active (Admin approval)
         if not student.is_active:
@@ -48,46 +51,91 @@ def student_login(request):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Store student info in session
+        # Store student info in session; SessionMiddleware persists it once
+        # when the response goes out
         request.session['student_id'] = student.id
         request.session['is_student'] = True
-        request.session.save()
         
         serializer = StudentSerializer(student)
         return Response({
             'message': 'Login successful',
-            'student': serializer.data,
-            'session_key': request.session.session_key
+            'student': serializer.data
         })
-        
-    except Student.DoesNotExist:
-        # Try Admin/Staff Login
-        user = authenticate(username=email, password=password) # Try email as username first
-        if not user:
-             # Try assuming email was actually a username
-             user = authenticate(username=email, password=password)
-             
-        if user and (user.is_staff or user.is_superuser):
-            django_login(request, user)
-            request.session['is_admin'] = True
-            request.session.save()
-            return Response({
-                'message': 'Admin login successful',
-                'student': {
-                    'id': user.id,
-                    'first_name': 'Admin',
-                    'last_name': 'User',
-                    'email': user.email,
-                    'is_admin': True,
-                    'is_active': True
-                },
-                'is_admin': True
-            })
+    
+    if kind == 'staff':
+        user = account
+        django_login(request, user)
+        request.session['is_admin'] = True
+        return Response({
+            'message': 'Admin login successful',
+            'student': {
+                'id': user.id,
+                'first_name': 'Admin',
+                'last_name': 'User',
+                'email': user.email,
+                'is_admin': True,
+                'is_active': True
+            },
+            'is_admin': True
+        })
+    
+    return Response(
+        {'error': 'Invalid email or password'},
+        status=status.HTTP_401_UNAUTHORIZED
+    )
+
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@authentication_classes([])
+@throttle_classes([LoginThrottle])
+def obtain_token(request):
+    """
+    Token login for API clients (mobile, kiosk): same credentials as
+    student_login, but returns a JWT access/refresh pair instead of a session.
+    """
+    email = request.data.get('email', '').strip().lower()
+    password = request.data.get('password', '')
+    
+    if not email or not password:
         return Response(
-            {'error': 'Invalid email or password'},
-            status=status.HTTP_401_UNAUTHORIZED
+            {'error': 'Email and password are required'},
+            status=status.HTTP_400_BAD_REQUEST
         )
+    
+    kind, account = authenticate_identity(email, password)
+    
+    if kind == 'student':
+        if not account.is_active:
+            return Response(
+                {'error': 'Your account is pending admin approval. Please wait for the institution to verify your details.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return Response({
+            **get_tokens_for_student(account),
+            'student': StudentSerializer(account).data
+        })
+    
+    if kind == 'staff':
+        return Response({
+            **get_tokens_for_staff(account),
+            'is_admin': True
+        })
+    
+    return Response(
+        {'error': 'Invalid email or password'},
+        status=status.HTTP_401_UNAUTHORIZED
+    )
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@authentication_classes([])
+def refresh_token(request):
+    """Rotate a refresh token into a new access/refresh pair"""
+    serializer = TokenRefreshSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return Response(serializer.validated_data)
 
 
 @api_view(['POST'])
@@ -118,19 +166,27 @@ def student_register(request):
         )
     
     # Check if student already exists
-    if Student.objects.filter(email__iexact=email).exists():
+    if Student.objects.filter(email=email).exists():
         return Response(
             {'error': 'A student with this email already exists. Please login instead.'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    phone = request.data.get('phone', '').strip()
+    phone_e164 = normalize_phone(phone)
+    if phone_e164 and Student.objects.filter(phone_e164=phone_e164).exists():
+        return Response(
+            {'error': 'A student with this phone number already exists. Please login instead.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
     try:
         # Create student
         student = Student(
             first_name=request.data.get('first_name').strip(),
             last_name=request.data.get('last_name').strip(),
             email=email,
-            phone=request.data.get('phone', '').strip(),
+            phone=phone,
             date_of_birth=request.data.get('date_of_birth'),
             address=request.data.get('address', '')
         )
@@ -167,8 +223,23 @@ def student_logout(request):
 def get_current_user(request):
     """
     Get current logged-in student or admin info.
+    Bearer-token students are answered from the token claims alone.
     """
-    # Check for Admin/Staff session
+    if isinstance(request.user, StudentTokenUser):
+        claims = request.user.token
+        return Response({
+            'is_authenticated': True,
+            'student': {
+                'id': claims['student_id'],
+                'first_name': claims.get('first_name', ''),
+                'last_name': claims.get('last_name', ''),
+                'full_name': f"{claims.get('first_name', '')} {claims.get('last_name', '')}",
+                'email': claims.get('email', ''),
+                'is_active': True
+            }
+        })
+    
+    # Check for Admin/Staff session (or staff token)
     if request.user.is_authenticated and (request.user.is_staff or request.user.is_superuser):
         return Response({
             'is_authenticated': True,
@@ -191,23 +262,27 @@ def get_current_user(request):
             'student': None
         })
     
-    try:
-        student = Student.objects.get(id=student_id)
-        serializer = StudentSerializer(student)
-        return Response({
-            'is_authenticated': True,
-            'student': serializer.data
-        })
-    except Student.DoesNotExist:
+    payload = get_current_user_payload(student_id)
+    if payload is None:
         request.session.flush()
         return Response({
             'is_authenticated': False,
             'student': None
         })
+    
+    response = Response({
+        'is_authenticated': True,
+        'student': payload
+    })
+    # Let the browser reuse it briefly; Vary: Cookie (set by the session
+    # middleware) keeps it from outliving a login/logout
+    patch_cache_control(response, private=True, max_age=settings.CURRENT_USER_MAX_AGE)
+    return response
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([OTPRequestThrottle])
 def request_otp(request):
     """Generate and send OTP to student's email for password reset"""
     email = request.data.get('email', '').strip().lower()
@@ -216,39 +291,27 @@ def request_otp(request):
         return Response({'error': 'Email is required'}, status=status.HTTP_400_BAD_REQUEST)
     
     # Check if student exists
-    if not Student.objects.filter(email__iexact=email).exists():
+    if not Student.objects.filter(email=email).exists():
         return Response({'error': 'No student found with this email'}, status=status.HTTP_404_NOT_FOUND)
     
-    # Generate 6-digit OTP
-    otp_code = ''.join(random.choices(string.digits, k=6))
+    # Generate and store a 6-digit OTP (database or cache, per OTP_STORE)
+    otp_code = get_otp_store().issue(email, purpose='password_reset')
     
-    # Set expiry (10 minutes)
-    expires_at = timezone.now() + timedelta(minutes=10)
-    
-    # Save to database
-    OTPVerification.objects.create(
-        email=email,
-        code=otp_code,
-        purpose='password_reset',
-        expires_at=expires_at
-    )
+    # Hand the email to the background sender; SMTP latency stays off the request path
+    subject = 'Password Reset OTP - CSC Computer Software College'
+    message = f'Your verification code for password reset is: {otp_code}\n\nThis code will expire in {settings.OTP_TTL_MINUTES} minutes.'
+    if not enqueue_email(subject, message, [email]):
+        return Response(
+            {'error': 'We could not send the OTP email right now. Please try again in a few minutes.'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
     
-    # Send email (In real app, configure SMTP)
-    try:
-        subject = 'Password Reset OTP - CSC Computer Software College'
-        message = f'Your verification code for password reset is: {otp_code}\n\nThis code will expire in 10 minutes.'
-        email_from = settings.EMAIL_HOST_USER or 'noreply@csc.college'
-        
-        # Using fail_silently=False to catch configuration issues during dev
-        send_mail(subject, message, email_from, [email], fail_silently=True)
-        
-        return Response({'message': 'OTP sent successfully to your email'})
-    except Exception as e:
-        return Response({'error': f'Failed to send email: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response({'message': 'OTP sent successfully to your email'})
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([OTPVerifyThrottle])
 def verify_otp(request):
     """Verify the OTP code provided by the user"""
     email = request.data.get('email', '').strip().lower()
@@ -257,21 +320,16 @@ def verify_otp(request):
     if not email or not code:
         return Response({'error': 'Email and code are required'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Look for the latest valid (non-expired, non-verified) OTP
-    otp_record = OTPVerification.objects.filter(
-        email=email,
-        code=code,
-        is_verified=False,
-        expires_at__gt=timezone.now()
-    ).first()
+    result = get_otp_store().verify(email, code)
     
-    if not otp_record:
+    if result == OTP_LOCKED:
+        return Response(
+            {'error': 'Too many incorrect attempts. Please request a new OTP.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if result != OTP_VERIFIED:
         return Response({'error': 'Invalid or expired OTP code'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Mark as verified
-    otp_record.is_verified = True
-    otp_record.save()
-    
     return Response({'message': 'OTP verified successfully'})
 
 
@@ -289,26 +347,21 @@ def reset_password(request):
     if len(new_password) < 6:
         return Response({'error': 'Password must be at least 6 characters'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Verify that the OTP was actually verified in the previous step
-    # For extra security, we check if there's a verified record for this email/code
-    is_verified = OTPVerification.objects.filter(
-        email=email,
-        code=code,
-        is_verified=True,
-        created_at__gt=timezone.now() - timedelta(minutes=15) # Must be recent
-    ).exists()
+    # Verify that the OTP was actually verified in the previous step, recently
+    otp_store = get_otp_store()
+    is_verified = otp_store.is_verified(email, code)
     
     if not is_verified:
         return Response({'error': 'Please verify your OTP first'}, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        student = Student.objects.get(email__iexact=email)
+        student = Student.objects.get(email=email)
         student.set_password(new_password)
         student.save()
         
         # Log out from all sessions? (Optional but recommended)
         # Here we just clean up the OTP records for this email
-        OTPVerification.objects.filter(email=email).delete()
+        otp_store.consume(email)
         
         return Response({'message': 'Password has been reset successfully. You can now login.'})
     except Student.DoesNotExist:
@@ -0,0 +1,118 @@
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework import serializers
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import Student
+
+STUDENT_ID_CLAIM = 'student_id'
+# Profile claims copied into student tokens so identity needs no database lookup
+STUDENT_PROFILE_CLAIMS = ['email', 'first_name', 'last_name']
+
+
+class StudentTokenUser(TokenUser):
+    """Stateless request.user for a student access token"""
+    is_student = True
+
+    @cached_property
+    def id(self):
+        return self.token[STUDENT_ID_CLAIM]
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    @property
+    def student_id(self):
+        return self.id
+
+    def __str__(self):
+        return f"StudentTokenUser {self.id}"
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Bearer-token authentication that never touches the database.
+
+    Student tokens resolve to a StudentTokenUser and staff tokens to
+    simplejwt's TokenUser, both built from the token's claims alone.
+    """
+
+    def get_user(self, validated_token):
+        if STUDENT_ID_CLAIM in validated_token:
+            return StudentTokenUser(validated_token)
+        return super().get_user(validated_token)
+
+
+def _set_student_claims(token, student_id, email, first_name, last_name):
+    token[STUDENT_ID_CLAIM] = student_id
+    token['email'] = email
+    token['first_name'] = first_name
+    token['last_name'] = last_name
+
+
+def get_tokens_for_student(student):
+    """Issue a refresh/access pair carrying the student identity claims."""
+    refresh = RefreshToken()
+    _set_student_claims(refresh, student.id, student.email, student.first_name, student.last_name)
+    return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+
+def get_tokens_for_staff(user):
+    """Issue a refresh/access pair for a staff User."""
+    refresh = RefreshToken.for_user(user)
+    refresh['email'] = user.email
+    refresh['is_staff'] = user.is_staff
+    refresh['is_superuser'] = user.is_superuser
+    return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+
+class TokenRefreshSerializer(serializers.Serializer):
+    """
+    Exchange a refresh token for a new access token (and, with
+    ROTATE_REFRESH_TOKENS, a new refresh token, blacklisting the old one).
+
+    Student tokens are re-checked against the Student row, so deactivated
+    students cannot refresh and renamed students get fresh claims.
+    """
+    refresh = serializers.CharField()
+
+    def validate(self, attrs):
+        try:
+            refresh = RefreshToken(attrs['refresh'])
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+
+        if STUDENT_ID_CLAIM in refresh:
+            student = Student.objects.filter(pk=refresh[STUDENT_ID_CLAIM], is_active=True).values(
+                'id', *STUDENT_PROFILE_CLAIMS
+            ).first()
+            if student is None:
+                raise InvalidToken('No active student found for the given token')
+            _set_student_claims(
+                refresh, student['id'], student['email'], student['first_name'], student['last_name']
+            )
+        else:
+            user_id = refresh.get(api_settings.USER_ID_CLAIM)
+            user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+            if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+                raise InvalidToken('No active account found for the given token')
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # token_blacklist app not installed
+                    pass
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+
+        return data
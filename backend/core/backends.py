@@ -0,0 +1,76 @@
+import functools
+from collections import namedtuple
+from django.contrib.auth.models import User
+from django.db.models import Q
+from .hashers import make_student_password, check_student_password
+from .models import Student
+from .utils import normalize_email, normalize_phone
+
+STAFF_AUTH_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+LoginResult = namedtuple('LoginResult', ['kind', 'account'])
+NO_MATCH = LoginResult(None, None)
+
+
+@functools.lru_cache
+def _dummy_student_hash():
+    # Hashed once per process; verifying against it costs the same as a real check
+    return make_student_password('dummy-password-for-timing')
+
+
+def _find_student(identifier):
+    """
+    The Student an identifier names: an email address, or a phone number
+    in any format normalize_phone() accepts. Each is one lookup on a
+    unique or indexed column. A phone number shared by several students
+    (see report_duplicate_phones) is ambiguous and matches nobody.
+    """
+    if '@' in identifier:
+        return Student.objects.filter(email=normalize_email(identifier)).first()
+    phone_e164 = normalize_phone(identifier)
+    if not phone_e164:
+        return None
+    matches = list(Student.objects.filter(phone_e164=phone_e164)[:2])
+    return matches[0] if len(matches) == 1 else None
+
+
+def _find_staff(identifier):
+    """The active staff User whose username is the identifier (unique index)"""
+    return User.objects.filter(
+        Q(is_staff=True) | Q(is_superuser=True),
+        username=identifier,
+        is_active=True,
+    ).first()
+
+
+def authenticate_identity(identifier, password):
+    """
+    Resolve a Student or staff User and verify exactly one password hash.
+
+    Students (by email or phone) take precedence over staff accounts (by
+    username) with the same identifier, matching the original login flow.
+    Each lookup is one indexed query, and identifiers that are neither an
+    email nor a phone number skip the student lookup. Unknown
+    identifiers are checked against a dummy hash so failures cost the same
+    as a wrong password.
+
+    Returns:
+        LoginResult: kind is 'student' or 'staff' with the matching account,
+        or (None, None) when the identifier or password is wrong.
+    """
+    student = _find_student(identifier)
+    if student is not None:
+        if not student.check_password(password):
+            return NO_MATCH
+        return LoginResult('student', student)
+
+    user = _find_staff(identifier)
+    if user is not None:
+        # User.check_password also upgrades outdated hashes
+        if not user.check_password(password):
+            return NO_MATCH
+        user.backend = STAFF_AUTH_BACKEND
+        return LoginResult('staff', user)
+
+    check_student_password(password, _dummy_student_hash())
+    return NO_MATCH
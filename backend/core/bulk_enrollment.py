@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models import F
+from .caching import invalidate_current_user
+from .models import Batch, Enrollment, Student
+from .timetable import students_clashes
+
+
+def bulk_enroll(course, student_ids, batch=None):
+    """
+    Enroll a list of students into a course (and batch) in one transaction.
+
+    The batch row is locked for the duration, so the free seats read here
+    cannot be taken concurrently. Unknown students, existing (student,
+    course) pairs and timetable clashes are each found with one query;
+    the new rows are inserted with one bulk_create and the batch's
+    seats_taken is raised by a single UPDATE. Students beyond the free
+    seats are waitlisted in list order.
+
+    Course and batch are expected to be validated already (enrollment
+    open, batch active and belonging to the course).
+
+    Args:
+        course (Course): Course to enroll into.
+        student_ids (list): Student IDs; duplicates are ignored.
+        batch (Batch): Optional batch.
+
+    Returns:
+        list: One {'student', 'result', 'enrollment', 'status'} dict per
+        distinct student, in input order. 'result' is 'enrolled',
+        'waitlisted', 'already_enrolled', 'clash' or 'not_found'.
+    """
+    student_ids = list(dict.fromkeys(student_ids))
+    results = {student_id: {'student': student_id, 'result': None, 'enrollment': None, 'status': None}
+               for student_id in student_ids}
+
+    with transaction.atomic():
+        if batch is not None:
+            batch = Batch.objects.select_for_update().select_related('course').get(pk=batch.pk)
+
+        known = set(Student.objects.filter(pk__in=student_ids).values_list('id', flat=True))
+        existing = {
+            student_id: (enrollment_id, status)
+            for student_id, enrollment_id, status in Enrollment.objects.filter(
+                course=course, student_id__in=known
+            ).values_list('student_id', 'id', 'status')
+        }
+        clashes = students_clashes(known - existing.keys(), batch) if batch is not None else {}
+
+        candidates = []
+        for student_id in student_ids:
+            if student_id not in known:
+                results[student_id]['result'] = 'not_found'
+            elif student_id in existing:
+                enrollment_id, status = existing[student_id]
+                results[student_id].update(result='already_enrolled', enrollment=enrollment_id, status=status)
+            elif student_id in clashes:
+                results[student_id]['result'] = 'clash'
+            else:
+                candidates.append(student_id)
+
+        free = len(candidates) if batch is None or batch.seats_available is None else batch.seats_available
+        Enrollment.objects.bulk_create([
+            Enrollment(
+                student_id=student_id, course=course, batch=batch,
+                status='pending' if position < free else 'waitlisted',
+                fee_due=course.fees, balance_due=course.fees,
+                payment_status=Enrollment.payment_status_for(course.fees, 0),
+            )
+            for position, student_id in enumerate(candidates)
+        ], batch_size=500, ignore_conflicts=True)
+
+        # ignore_conflicts leaves primary keys unset and skips rows a
+        # concurrent request inserted first, so read back what is ours
+        created = Enrollment.objects.filter(
+            course=course, student_id__in=candidates, batch=batch
+        ).values_list('student_id', 'id', 'status')
+        seated = 0
+        for student_id, enrollment_id, status in created:
+            results[student_id].update(
+                result='waitlisted' if status == 'waitlisted' else 'enrolled',
+                enrollment=enrollment_id, status=status,
+            )
+            seated += status in Enrollment.SEAT_STATUSES
+        for student_id in candidates:
+            if results[student_id]['result'] is None:
+                results[student_id]['result'] = 'already_enrolled'
+
+        if batch is not None and seated:
+            Batch.objects.filter(pk=batch.pk).update(seats_taken=F('seats_taken') + seated)
+        invalidate_current_user(*candidates)
+
+    return list(results.values())
@@ -0,0 +1,76 @@
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+from .models import Batch, Student
+from .serializers import StudentSerializer
+
+
+def current_user_cache_key(student_id):
+    return f'current-user:{student_id}'
+
+
+def get_current_user_payload(student_id):
+    """
+    Serialized StudentSerializer payload for /auth/me, cached per student.
+
+    Entries are dropped by the signal handlers in core.signals whenever the
+    student's Student or Enrollment rows change, and expire after
+    CURRENT_USER_CACHE_TTL seconds as a backstop (e.g. a course rename).
+    Skipped entirely unless CURRENT_USER_CACHE_ENABLED (the default only
+    with a shared cache backend).
+
+    Returns:
+        dict: The payload, or None if the student no longer exists.
+    """
+    use_cache = getattr(settings, 'CURRENT_USER_CACHE_ENABLED', False)
+    key = current_user_cache_key(student_id)
+    if use_cache:
+        payload = cache.get(key)
+        if payload is not None:
+            return payload
+
+    student = Student.objects.filter(id=student_id).first()
+    if student is None:
+        return None
+    # Round-trip through JSON so dates/decimals are cached as plain values
+    payload = json.loads(json.dumps(StudentSerializer(student).data, cls=JSONEncoder))
+    if use_cache:
+        cache.set(key, payload, timeout=getattr(settings, 'CURRENT_USER_CACHE_TTL', 300))
+    return payload
+
+
+def invalidate_current_user(*student_ids):
+    """
+    Drop cached /auth/me payloads for the given students once the current
+    transaction commits (immediately outside one), so a request running
+    before the commit can't re-cache the old rows.
+    """
+    keys = [current_user_cache_key(student_id) for student_id in student_ids if student_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+BATCH_CHOICES_CACHE_KEY = 'admin:batch-choices'
+
+
+def get_batch_choices():
+    """
+    (id, 'Name (CODE)') pairs for the admin batch filters, newest first.
+
+    Built with one query and cached until a batch or course changes
+    (see core.signals), with ADMIN_FILTER_CACHE_TTL as a backstop.
+    """
+    choices = cache.get(BATCH_CHOICES_CACHE_KEY)
+    if choices is None:
+        choices = [
+            (pk, f'{name} ({code})')
+            for pk, name, code in Batch.objects.order_by('-start_date', '-id').values_list('id', 'name', 'course__code')
+        ]
+        cache.set(BATCH_CHOICES_CACHE_KEY, choices, timeout=getattr(settings, 'ADMIN_FILTER_CACHE_TTL', 600))
+    return choices
+
+
+def invalidate_batch_choices():
+    cache.delete(BATCH_CHOICES_CACHE_KEY)
@@ -0,0 +1,101 @@
+import base64
+import functools
+import hashlib
+from django.conf import settings
+from django.contrib.auth.hashers import ScryptPasswordHasher, UNUSABLE_PASSWORD_PREFIX
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class StudentScryptPasswordHasher(ScryptPasswordHasher):
+    """
+    Stdlib hashlib.scrypt hasher whose cost is tuned from settings.
+
+    STUDENT_SCRYPT_WORK_FACTOR (N), STUDENT_SCRYPT_BLOCK_SIZE (r) and
+    STUDENT_SCRYPT_PARALLELISM (p) are read at startup; existing hashes
+    keep verifying with the parameters they were created with and are
+    upgraded on the next successful login when the settings change.
+    Use `manage.py benchmark_login` to pick a work factor.
+    """
+
+    def __init__(self):
+        self.work_factor = getattr(settings, 'STUDENT_SCRYPT_WORK_FACTOR', 2**14)
+        self.block_size = getattr(settings, 'STUDENT_SCRYPT_BLOCK_SIZE', 8)
+        self.parallelism = getattr(settings, 'STUDENT_SCRYPT_PARALLELISM', 1)
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        self._check_encode_args(password, salt)
+        n = n or self.work_factor
+        r = r or self.block_size
+        p = p or self.parallelism
+        hash_ = hashlib.scrypt(
+            password.encode(),
+            salt=salt.encode(),
+            n=n,
+            r=r,
+            p=p,
+            # OpenSSL's 32 MiB default rejects N >= 2**15; size it to the cost
+            maxmem=128 * r * (n + p + 2) + 1024 * 1024,
+            dklen=64,
+        )
+        hash_ = base64.b64encode(hash_).decode('ascii').strip()
+        return '%s$%d$%s$%d$%d$%s' % (self.algorithm, n, salt, r, p, hash_)
+
+
+@functools.lru_cache
+def get_student_hashers():
+    """Instantiate STUDENT_PASSWORD_HASHERS; the first one is preferred."""
+    return [import_string(path)() for path in settings.STUDENT_PASSWORD_HASHERS]
+
+
+@functools.lru_cache
+def get_student_hashers_by_algorithm():
+    return {hasher.algorithm: hasher for hasher in get_student_hashers()}
+
+
+@receiver(setting_changed)
+def reset_student_hashers(*, setting, **kwargs):
+    if setting in (
+        'STUDENT_PASSWORD_HASHERS', 'STUDENT_SCRYPT_WORK_FACTOR',
+        'STUDENT_SCRYPT_BLOCK_SIZE', 'STUDENT_SCRYPT_PARALLELISM',
+    ):
+        get_student_hashers.cache_clear()
+        get_student_hashers_by_algorithm.cache_clear()
+
+
+def make_student_password(raw_password):
+    """Hash a student password with the preferred student hasher."""
+    hasher = get_student_hashers()[0]
+    return hasher.encode(raw_password, hasher.salt())
+
+
+def check_student_password(raw_password, encoded, setter=None):
+    """
+    Verify a student password against any configured student hasher.
+
+    When the password is correct but was hashed with a non-preferred
+    algorithm or outdated cost, setter(raw_password) is called so the
+    caller can store an upgraded hash.
+
+    Returns:
+        bool: Whether the password matches.
+    """
+    if not raw_password or not encoded or encoded.startswith(UNUSABLE_PASSWORD_PREFIX):
+        return False
+
+    algorithm = encoded.split('$', 1)[0]
+    hasher = get_student_hashers_by_algorithm().get(algorithm)
+    if hasher is None:
+        return False
+
+    preferred = get_student_hashers()[0]
+    is_correct = hasher.verify(raw_password, encoded)
+    must_update = hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+    if not is_correct and hasher.algorithm == preferred.algorithm and must_update:
+        # Keep failed logins as slow as successful ones on outdated hashes
+        hasher.harden_runtime(raw_password, encoded)
+    if setter and is_correct and must_update:
+        setter(raw_password)
+    return is_correct
@@ -0,0 +1,133 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from .models import IdempotencyRecord
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def _fingerprint(request):
+    """Hash of the method, path and payload a key was first used with"""
+    payload = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    raw = f"{request.method}:{request.path}:{payload}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _principal(request):
+    """Who is calling: staff user, student (session or token), or '' when anonymous"""
+    user = request.user
+    if getattr(user, 'is_student', False):
+        return f"student:{user.student_id}"
+    if user.is_authenticated:
+        return f"user:{user.pk}"
+    student_id = request.session.get('student_id')
+    return f"student:{student_id}" if student_id else ''
+
+
+def _replay(record):
+    response = Response(record.response_body, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(scope):
+    """
+    Honor the Idempotency-Key header on a DRF view method.
+
+    The first request with a key runs normally and its response is stored
+    for IDEMPOTENCY_KEY_TTL seconds. Retries with the same key and payload
+    get the stored response replayed instead of redoing the work; the same
+    key with a different payload is rejected with 422. A retry that arrives
+    while the original is still running gets 409; an in-flight record older
+    than IDEMPOTENCY_IN_FLIGHT_TIMEOUT seconds is treated as abandoned (its
+    worker died) and the retry runs for real. Requests without the header
+    are not affected. Keys are scoped to the caller (see _principal), so
+    different users never share a key.
+
+    Args:
+        scope (str): Name of the endpoint, so keys never collide across endpoints.
+    """
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view_method(self, request, *args, **kwargs)
+            if len(key) > 255:
+                return Response(
+                    {'error': f'{IDEMPOTENCY_HEADER} must be at most 255 characters'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            principal = _principal(request)
+            fingerprint = _fingerprint(request)
+            now = timezone.now()
+            ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+
+            lease = getattr(settings, 'IDEMPOTENCY_IN_FLIGHT_TIMEOUT', 5 * 60)
+
+            # Expired keys, and in-flight keys whose worker never finished,
+            # are free to be reused
+            records = IdempotencyRecord.objects.filter(scope=scope, principal=principal, key=key)
+            records.filter(
+                Q(expires_at__lte=now)
+                | Q(status_code__isnull=True, created_at__lte=now - timedelta(seconds=lease))
+            ).delete()
+            try:
+                with transaction.atomic():
+                    record = IdempotencyRecord.objects.create(
+                        scope=scope,
+                        principal=principal,
+                        key=key,
+                        fingerprint=fingerprint,
+                        expires_at=now + timedelta(seconds=ttl),
+                    )
+            except IntegrityError:
+                existing = records.first()
+                if existing is None:
+                    # Raced with an expiry purge; safest is to ask the client to retry
+                    return Response(
+                        {'error': 'Please retry the request'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                if existing.fingerprint != fingerprint:
+                    return Response(
+                        {'error': f'{IDEMPOTENCY_HEADER} was already used with a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                if existing.status_code is None:
+                    response = Response(
+                        {'error': 'A request with this key is still being processed'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                    response['Retry-After'] = '1'
+                    return response
+                return _replay(existing)
+
+            try:
+                response = view_method(self, request, *args, **kwargs)
+            except Exception:
+                record.delete()
+                raise
+
+            if response.status_code >= 500:
+                # Server errors are not final; let the client retry for real
+                record.delete()
+                return response
+
+            # A plain UPDATE: the record is gone if this request outlived its lease
+            IdempotencyRecord.objects.filter(pk=record.pk, status_code__isnull=True).update(
+                status_code=response.status_code,
+                response_body=json.loads(json.dumps(response.data, cls=JSONEncoder)),
+            )
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,192 @@
+from collections import defaultdict
+from decimal import Decimal, ROUND_DOWN
+from django.db import transaction
+from django.utils import timezone
+from .models import Installment
+from .utils import add_months, send_professional_email
+
+OVERDUE_SUBJECT = 'Fee installment overdue - CSC Computer Software College'
+
+
+def build_installment_plan(enrollment, count=None, first_due=None):
+    """
+    Split an enrollment's fee into monthly installments (unsaved).
+
+    Args:
+        enrollment (Enrollment): Enrollment with course (and batch) loaded.
+        count (int): Number of installments; defaults to the course's
+            duration_months.
+        first_due (date): Due date of the first installment; defaults to the
+            enrollment start date, else the batch start date, else today.
+
+    Returns:
+        list: Installment instances; cents left over by the split go on
+        the last one so the plan adds up to fee_due exactly.
+    """
+    total = enrollment.fee_due if enrollment.fee_due is not None else enrollment.course.fees
+    count = max(1, count or enrollment.course.duration_months)
+    first_due = (
+        first_due or enrollment.start_date
+        or (enrollment.batch.start_date if enrollment.batch_id else None)
+        or timezone.localdate()
+    )
+    share = (total / count).quantize(Decimal('0.01'), rounding=ROUND_DOWN)
+    return [
+        Installment(
+            enrollment=enrollment,
+            sequence=number + 1,
+            due_date=add_months(first_due, number),
+            amount=share if number < count - 1 else total - share * (count - 1),
+        )
+        for number in range(count)
+    ]
+
+
+def create_installment_plans(enrollments, count=None, first_due=None):
+    """
+    Generate plans for enrollments that do not have one yet, with one
+    bulk insert, then mark installments already covered by payments.
+
+    Returns:
+        int: Number of enrollments that got a plan.
+    """
+    enrollments = list(
+        enrollments.filter(installments__isnull=True).select_related('course', 'batch')
+    )
+    installments = []
+    for enrollment in enrollments:
+        installments.extend(build_installment_plan(enrollment, count, first_due))
+    with transaction.atomic():
+        Installment.objects.bulk_create(installments, batch_size=1000)
+        settle_installments([e.pk for e in enrollments if e.amount_paid])
+    return len(enrollments)
+
+
+def settle_installments(enrollment_ids):
+    """
+    Bring installment statuses in line with each enrollment's amount_paid.
+
+    Installments are covered in sequence order while the running total
+    fits in amount_paid. A refund can reopen a paid installment as
+    'pending'; marking it overdue is left to the overdue scan, which also
+    sends the reminder. Reads use one query and changes are written with
+    a single bulk_update.
+    """
+    if not enrollment_ids:
+        return
+    now = timezone.now()
+    rows = (
+        Installment.objects.filter(enrollment_id__in=enrollment_ids)
+        .order_by('enrollment_id', 'sequence')
+        .select_related('enrollment')
+        .only('id', 'amount', 'status', 'paid_at', 'enrollment__amount_paid')
+    )
+    covered = defaultdict(Decimal)
+    changed = []
+    for installment in rows:
+        covered[installment.enrollment_id] += installment.amount
+        if covered[installment.enrollment_id] <= installment.enrollment.amount_paid:
+            status, paid_at = 'paid', installment.paid_at or now
+        elif installment.status == 'paid':
+            status, paid_at = 'pending', None
+        else:
+            continue
+        if status != installment.status:
+            installment.status, installment.paid_at = status, paid_at
+            changed.append(installment)
+    Installment.objects.bulk_update(changed, ['status', 'paid_at'], batch_size=1000)
+
+
+def scan_overdue_installments(today=None, limit=1000):
+    """
+    Mark installments that fell due before today as overdue.
+
+    Candidates are found with a single range query on installment_due_idx
+    (status = 'pending' AND due_date < today). The rows are locked with
+    SKIP LOCKED, so overlapping runs split the work. Reminders are sent
+    separately by send_overdue_reminders(). Call repeatedly until it
+    returns 0.
+
+    Returns:
+        int: Number of installments marked overdue.
+    """
+    today = today or timezone.localdate()
+    with transaction.atomic():
+        ids = list(
+            Installment.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', due_date__lt=today)
+            .order_by('due_date', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if ids:
+            Installment.objects.filter(pk__in=ids).update(status='overdue')
+    return len(ids)
+
+
+def send_overdue_reminders(chunk_size=500):
+    """
+    Email each student one reminder listing their overdue installments
+    that have not been reminded about yet, synchronously.
+
+    reminded_at is stamped only after the student's email was sent, so a
+    failed send (or a crashed run) is retried by the next run. Students
+    are walked in ID order, chunk_size at a time; each chunk's rows are
+    locked with SKIP LOCKED while its emails go out, so overlapping runs
+    never remind the same installments twice.
+
+    Returns:
+        tuple: (installments reminded, installments whose email failed).
+    """
+    pending = Installment.objects.filter(status='overdue', reminded_at__isnull=True)
+    reminded = failed = 0
+    last_student_id = 0
+    while True:
+        student_ids = list(
+            pending.filter(enrollment__student_id__gt=last_student_id)
+            .order_by('enrollment__student_id')
+            .values_list('enrollment__student_id', flat=True)
+            .distinct()[:chunk_size]
+        )
+        if not student_ids:
+            return reminded, failed
+        last_student_id = student_ids[-1]
+
+        with transaction.atomic():
+            rows = (
+                pending.select_for_update(skip_locked=True, of=('self',))
+                .filter(enrollment__student_id__in=student_ids)
+                .order_by('enrollment__student_id', 'due_date', 'id')
+                .values_list(
+                    'id', 'enrollment__student_id', 'enrollment__student__email',
+                    'enrollment__student__first_name', 'enrollment__course__name',
+                    'sequence', 'amount', 'due_date'
+                )
+            )
+            reminders = defaultdict(lambda: {'ids': [], 'lines': []})
+            for pk, student_id, email, first_name, course, sequence, amount, due_date in rows:
+                reminder = reminders[student_id]
+                reminder.update(email=email, first_name=first_name)
+                reminder['ids'].append(pk)
+                reminder['lines'].append(
+                    f'- {course}, installment {sequence}: ₹ {amount:,.2f} due {due_date:%d %b %Y}'
+                )
+
+            for reminder in reminders.values():
+                try:
+                    send_professional_email(OVERDUE_SUBJECT, _overdue_message(reminder), [reminder['email']])
+                except Exception:
+                    # Left unreminded for the next run; already logged by the helper
+                    failed += len(reminder['ids'])
+                    continue
+                Installment.objects.filter(pk__in=reminder['ids']).update(reminded_at=timezone.now())
+                reminded += len(reminder['ids'])
+
+
+def _overdue_message(reminder):
+    return (
+        f"Dear {reminder['first_name']},\n\n"
+        'The following fee installments are overdue:\n'
+        + '\n'.join(reminder['lines'])
+        + '\n\nPlease pay at the institute office at the earliest.\n\n'
+        'Regards,\nCSC Computer Software College'
+    )
@@ -0,0 +1,160 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.core.mail import send_mail
+
+logger = logging.getLogger(__name__)
+
+_queue = None
+_workers = []
+_lock = threading.Lock()
+_stats = {
+    'enqueued': 0,
+    'sent': 0,
+    'failed': 0,
+    'retried': 0,
+    'sent_inline': 0,
+    'dropped': 0,
+    'last_latency_ms': None,
+    'max_latency_ms': 0.0,
+    'total_latency_ms': 0.0,
+}
+
+
+def _record(**changes):
+    with _lock:
+        for key, value in changes.items():
+            _stats[key] += value
+
+
+def _record_latency(latency_ms):
+    with _lock:
+        _stats['last_latency_ms'] = latency_ms
+        _stats['max_latency_ms'] = max(_stats['max_latency_ms'], latency_ms)
+        _stats['total_latency_ms'] += latency_ms
+
+
+def _deliver(subject, message, from_email, recipient_list):
+    """Send one email, retrying with exponential backoff. Returns True on success."""
+    max_retries = getattr(settings, 'MAIL_QUEUE_MAX_RETRIES', 3)
+    for attempt in range(max_retries + 1):
+        started = time.monotonic()
+        try:
+            send_mail(subject, message, from_email, recipient_list, fail_silently=False)
+            _record_latency((time.monotonic() - started) * 1000)
+            return True
+        except Exception as e:
+            if attempt == max_retries:
+                logger.error(f"Giving up on email to {recipient_list} after {attempt + 1} attempts: {str(e)}")
+                return False
+            _record(retried=1)
+            logger.warning(f"Email to {recipient_list} failed (attempt {attempt + 1}), retrying: {str(e)}")
+            time.sleep(2 ** attempt)
+    return False
+
+
+def _worker():
+    while True:
+        subject, message, from_email, recipient_list = _queue.get()
+        try:
+            delivered = _deliver(subject, message, from_email, recipient_list)
+        except Exception as e:
+            # Never let one bad message take the worker thread down
+            logger.exception(f"Unexpected error sending email to {recipient_list}: {str(e)}")
+            delivered = False
+        if delivered:
+            _record(sent=1)
+        else:
+            _record(failed=1)
+        _queue.task_done()
+
+
+def _flush():
+    """
+    Give queued emails up to MAIL_QUEUE_EXIT_TIMEOUT seconds to go out when
+    the process exits; the workers are daemon threads and die with it.
+    """
+    if _queue is None:
+        return
+    deadline = time.monotonic() + getattr(settings, 'MAIL_QUEUE_EXIT_TIMEOUT', 30)
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if _queue.unfinished_tasks:
+        logger.error(f"Mail queue exiting with {_queue.unfinished_tasks} email(s) unsent")
+
+
+def _ensure_started():
+    global _queue
+    if _queue is not None:
+        return
+    with _lock:
+        if _queue is not None:
+            return
+        _queue = queue.Queue(maxsize=getattr(settings, 'MAIL_QUEUE_MAXSIZE', 500))
+        for i in range(getattr(settings, 'MAIL_QUEUE_WORKERS', 2)):
+            thread = threading.Thread(target=_worker, name=f'mail-queue-{i}', daemon=True)
+            thread.start()
+            _workers.append(thread)
+        atexit.register(_flush)
+
+
+def enqueue_email(subject, message, recipient_list, from_email=None):
+    """
+    Hand an email to the background sender and return immediately.
+
+    Emails are delivered by a small pool of daemon threads with retry and
+    exponential backoff; at exit the process waits up to
+    MAIL_QUEUE_EXIT_TIMEOUT seconds for the queue to drain. If the bounded
+    queue is full the email is dropped and logged rather than sent on the
+    caller's thread, so a mail backlog never stalls requests. With
+    MAIL_QUEUE_ENABLED off it is sent inline instead. Meant for short-lived,
+    re-requestable messages such as OTPs; scheduled jobs that must not lose
+    mail send synchronously instead.
+
+    Args:
+        subject (str): The subject line of the email.
+        message (str): The body of the email.
+        recipient_list (list): List of recipient email addresses.
+        from_email (str): Sender; defaults to EMAIL_HOST_USER.
+
+    Returns:
+        bool: True if the email was queued (or, with the queue disabled,
+        sent inline); False if it was dropped or the inline send failed,
+        so the caller can tell the user it did not go out.
+    """
+    from_email = from_email or settings.EMAIL_HOST_USER or 'noreply@csc.college'
+    item = (subject, message, from_email, recipient_list)
+
+    if getattr(settings, 'MAIL_QUEUE_ENABLED', True):
+        _ensure_started()
+        try:
+            _queue.put_nowait(item)
+            _record(enqueued=1)
+            return True
+        except queue.Full:
+            _record(dropped=1)
+            logger.error(f"Mail queue full, dropping email to {recipient_list}: {subject}")
+            return False
+
+    _record(sent_inline=1)
+    if _deliver(*item):
+        _record(sent=1)
+        return True
+    _record(failed=1)
+    return False
+
+
+def get_mail_queue_stats():
+    """Snapshot of queue depth, delivery counters and send latency"""
+    with _lock:
+        stats = dict(_stats)
+    delivered = stats['sent']
+    stats['avg_latency_ms'] = stats['total_latency_ms'] / delivered if delivered else None
+    del stats['total_latency_ms']
+    stats['queue_depth'] = _queue.qsize() if _queue is not None else 0
+    stats['queue_maxsize'] = _queue.maxsize if _queue is not None else getattr(settings, 'MAIL_QUEUE_MAXSIZE', 500)
+    stats['workers'] = len(_workers)
+    return stats
@@ -0,0 +1,78 @@
+import statistics
+import time
+from importlib import import_module
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from core.authentication import StatelessJWTAuthentication, get_tokens_for_student
+from core.models import Student
+
+SESSION_ENGINES = [
+    ('session (db)', 'django.contrib.sessions.backends.db'),
+    ('session (cached_db)', 'django.contrib.sessions.backends.cached_db'),
+    ('session (signed_cookies)', 'django.contrib.sessions.backends.signed_cookies'),
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request authentication cost of JWT bearer tokens and session backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='Authentications per method')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        results = []
+        try:
+            with transaction.atomic():
+                student = Student.objects.create(
+                    first_name='Bench', last_name='Mark', email='benchmark-auth@example.invalid', is_active=True
+                )
+                results.append(('jwt (stateless)', self.time_jwt(student, iterations)))
+                for label, engine in SESSION_ENGINES:
+                    results.append((label, self.time_session(engine, student, iterations)))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(f'{iterations} authentications per method\n')
+        self.stdout.write(f'{"method":<28} {"median us":>10} {"p95 us":>10} {"auth/s":>10}')
+        for label, latencies in results:
+            p95 = sorted(latencies)[max(0, int(len(latencies) * 0.95) - 1)]
+            self.stdout.write(
+                f'{label:<28} {statistics.median(latencies):>10.1f} {p95:>10.1f} '
+                f'{1_000_000 / statistics.mean(latencies):>10.0f}'
+            )
+
+    def time_jwt(self, student, iterations):
+        access = get_tokens_for_student(student)['access']
+        request = Request(APIRequestFactory().get('/api/auth/me/', HTTP_AUTHORIZATION=f'Bearer {access}'))
+        authenticator = StatelessJWTAuthentication()
+        latencies = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            user, _token = authenticator.authenticate(request)
+            user.id  # claims are decoded lazily; include the lookup
+            latencies.append((time.perf_counter() - started) * 1_000_000)
+        return latencies
+
+    def time_session(self, engine, student, iterations):
+        """Load a session by key the way SessionMiddleware does on each request."""
+        SessionStore = import_module(engine).SessionStore
+        session = SessionStore()
+        session['student_id'] = student.id
+        session['is_student'] = True
+        session.save()
+        session_key = session.session_key
+
+        latencies = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            SessionStore(session_key).get('student_id')
+            latencies.append((time.perf_counter() - started) * 1_000_000)
+        return latencies
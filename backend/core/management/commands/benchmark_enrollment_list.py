@@ -0,0 +1,106 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from core.models import Batch, Course, CourseCategory, Enrollment, Student
+from core.serializers import EnrollmentReadSerializer, EnrollmentSerializer
+
+COURSES = 5
+STATUSES = ['pending', 'approved', 'completed', 'cancelled']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark enrollment listings: model serializer vs flat read rows for a full listing, '
+        'and the /api/enrollments/?status= endpoint page by page. Seed data is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Enrollments to seed')
+        parser.add_argument('--iterations', type=int, default=5, help='Timed runs per measurement')
+        parser.add_argument('--pages', type=int, default=20, help='Status-filtered pages to request')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        try:
+            with transaction.atomic():
+                self.seed(options['rows'])
+                queryset = Enrollment.objects.select_related('student', 'course', 'batch').order_by('-enrollment_date')
+
+                self.stdout.write(f'Full listing of {options["rows"]} enrollments ({iterations} runs)\n')
+                self.stdout.write(f'{"path":<34} {"median ms":>10} {"queries":>8}')
+                self.report('model serializer (select_related)', iterations, lambda: EnrollmentSerializer(queryset.all(), many=True).data)
+                self.report(
+                    'flat read rows (values)', iterations,
+                    lambda: EnrollmentReadSerializer(EnrollmentReadSerializer.project(queryset), many=True).data,
+                )
+
+                self.stdout.write(f'\nGET /api/enrollments/?status=approved, pages 1-{options["pages"]}')
+                self.benchmark_pages(options['pages'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def seed(self, rows):
+        category = CourseCategory.objects.create(name='Bench', slug='benchmark-enrollments', duration_info='-')
+        courses = [
+            Course.objects.create(
+                name=f'Bench {i}', code=f'BENCH{i}', category=category, duration='1 Month',
+                duration_months=1, fees=1000, objective='-', target_audience='-',
+            )
+            for i in range(COURSES)
+        ]
+        batches = [
+            Batch.objects.create(name=f'Bench {course.code}', course=course, time_slot='10 AM - 11 AM', start_date='2030-01-01')
+            for course in courses
+        ]
+        students = Student.objects.bulk_create([
+            Student(first_name='Bench', last_name=str(i), email=f'benchmark-{i}@example.invalid')
+            for i in range((rows + COURSES - 1) // COURSES)
+        ])
+        if not all(student.pk for student in students):
+            students = list(Student.objects.filter(email__startswith='benchmark-').order_by('pk'))
+        Enrollment.objects.bulk_create([
+            Enrollment(
+                student=students[i // COURSES], course=courses[i % COURSES], batch=batches[i % COURSES],
+                status=STATUSES[i % len(STATUSES)], fee_due=1000, balance_due=1000,
+            )
+            for i in range(rows)
+        ], batch_size=1000)
+
+    def report(self, label, iterations, serialize):
+        latencies = []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                serialize()
+                latencies.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(f'{label:<34} {statistics.median(latencies):>10.1f} {len(queries):>8}')
+
+    def benchmark_pages(self, pages):
+        from core.views import EnrollmentViewSet
+
+        view = EnrollmentViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+        latencies, query_counts = [], []
+        for page in range(1, pages + 1):
+            request = factory.get('/api/enrollments/', {'status': 'approved', 'page': page})
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = view(request)
+                response.render()
+                latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                break
+            query_counts.append(len(queries))
+        if latencies:
+            self.stdout.write(
+                f'  median {statistics.median(latencies):.1f} ms/page, '
+                f'max {max(latencies):.1f} ms, queries per page {max(query_counts or [0])}'
+            )
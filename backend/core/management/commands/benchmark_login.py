@@ -0,0 +1,110 @@
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+from core.hashers import StudentScryptPasswordHasher, get_student_hashers
+
+PASSWORD = 'benchmark-password'
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark student password hashing and login throughput to choose a hasher cost'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--work-factors', type=int, nargs='+', default=[13, 14, 15, 16],
+            help='scrypt work factors to compare, as powers of two (14 means N=2**14)'
+        )
+        parser.add_argument('--iterations', type=int, default=20, help='Password checks per measurement')
+        parser.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='Concurrent checks for throughput')
+        parser.add_argument('--endpoint', action='store_true', help='Also time the full /auth/login/ view')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        threads = options['threads']
+
+        candidates = [('pbkdf2 (Django default)', PBKDF2PasswordHasher())]
+        for exponent in options['work_factors']:
+            hasher = StudentScryptPasswordHasher()
+            hasher.work_factor = 2**exponent
+            candidates.append((f'scrypt N=2**{exponent} r={hasher.block_size} p={hasher.parallelism}', hasher))
+
+        self.stdout.write(f'{iterations} checks per hasher, throughput measured with {threads} thread(s)\n')
+        self.stdout.write(f'{"hasher":<36} {"median ms":>10} {"p95 ms":>8} {"logins/s":>10}')
+        for label, hasher in candidates:
+            encoded = hasher.encode(PASSWORD, hasher.salt())
+            latencies = self.time_checks(hasher, encoded, iterations)
+            throughput = self.measure_throughput(hasher, encoded, iterations, threads)
+            p95 = sorted(latencies)[max(0, int(len(latencies) * 0.95) - 1)]
+            self.stdout.write(
+                f'{label:<36} {statistics.median(latencies):>10.1f} {p95:>8.1f} {throughput:>10.1f}'
+            )
+
+        preferred = get_student_hashers()[0]
+        self.stdout.write(
+            f'\nConfigured preferred hasher: {preferred.algorithm} '
+            f'(work factor {getattr(preferred, "work_factor", "n/a")})'
+        )
+
+        if options['endpoint']:
+            self.benchmark_endpoint(iterations)
+
+    def time_checks(self, hasher, encoded, iterations):
+        latencies = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            hasher.verify(PASSWORD, encoded)
+            latencies.append((time.perf_counter() - started) * 1000)
+        return latencies
+
+    def measure_throughput(self, hasher, encoded, iterations, threads):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(lambda _: hasher.verify(PASSWORD, encoded), range(iterations * threads)))
+        return (iterations * threads) / (time.perf_counter() - started)
+
+    # The login throttle would start answering 429 after a few iterations
+    @override_settings(RATE_LIMIT_ENABLED=False)
+    def benchmark_endpoint(self, iterations):
+        """Time the real login view end-to-end against a throwaway student (rolled back)."""
+        from core.auth_views import student_login
+        from core.models import Student
+
+        factory = APIRequestFactory()
+        latencies = []
+        try:
+            with transaction.atomic():
+                student = Student(first_name='Bench', last_name='Mark', email='benchmark-login@example.invalid', is_active=True)
+                student.set_password(PASSWORD)
+                student.save()
+                for _ in range(iterations):
+                    request = factory.post('/api/auth/login/', {'email': student.email, 'password': PASSWORD}, format='json')
+                    self.attach_session(request)
+                    started = time.perf_counter()
+                    response = student_login(request)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 200:
+                        self.stdout.write(self.style.ERROR(f'Login failed with {response.status_code}'))
+                        break
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if latencies:
+            self.stdout.write(
+                f'/auth/login/ end-to-end: median {statistics.median(latencies):.1f} ms, '
+                f'{1000 / statistics.mean(latencies):.1f} logins/s per worker'
+            )
+
+    def attach_session(self, request):
+        from django.contrib.sessions.middleware import SessionMiddleware
+        SessionMiddleware(lambda r: None).process_request(request)
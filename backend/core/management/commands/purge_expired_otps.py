@@ -0,0 +1,22 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import OTPVerification
+from core.utils import delete_in_batches
+
+
+class Command(BaseCommand):
+    help = 'Delete OTPVerification rows past their reset window in bounded batches (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per query')
+
+    def handle(self, *args, **options):
+        # A verified OTP stays usable for OTP_RESET_WINDOW_MINUTES after creation,
+        # so anything that expired longer ago than that is dead weight
+        cutoff = timezone.now() - timedelta(minutes=settings.OTP_RESET_WINDOW_MINUTES)
+        expired = OTPVerification.objects.filter(expires_at__lt=cutoff)
+        total = delete_in_batches(expired, options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {total} expired OTP record(s)'))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.utils import delete_in_batches
+
+DB_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+class Command(BaseCommand):
+    help = 'Delete expired rows from django_session in bounded batches (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per query')
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE not in DB_SESSION_ENGINES:
+            self.stdout.write(f'{settings.SESSION_ENGINE} does not store sessions in the database; nothing to purge')
+            return
+
+        # expire_date is indexed, so each batch is a cheap range scan
+        expired = Session.objects.filter(expire_date__lt=timezone.now())
+        total = delete_in_batches(expired, options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {total} expired session(s)'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import IdempotencyRecord
+from core.utils import delete_in_batches
+
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per query')
+
+    def handle(self, *args, **options):
+        expired = IdempotencyRecord.objects.filter(expires_at__lte=timezone.now())
+        total = delete_in_batches(expired, options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {total} expired idempotency record(s)'))
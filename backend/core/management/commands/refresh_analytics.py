@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.analytics import refresh_rollups
+from core.models import EnrollmentDailyStat, RevenueDailyStat, RollupWatermark
+
+
+class Command(BaseCommand):
+    help = 'Fold enrollments and payments changed since the last run into the analytics rollups (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Discard the rollups and rebuild them from scratch')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            with transaction.atomic():
+                RollupWatermark.objects.all().delete()
+                EnrollmentDailyStat.objects.all().delete()
+                RevenueDailyStat.objects.all().delete()
+
+        recounted = refresh_rollups()
+        for name, buckets in recounted.items():
+            self.stdout.write(f'{name}: recounted {buckets} day/course bucket(s)')
+
+        self.stdout.write(self.style.SUCCESS('Analytics rollups are up to date'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from core.models import Student
+
+
+class Command(BaseCommand):
+    help = 'List students who share a phone number (compared in E.164 form) so staff can merge or correct them'
+
+    def handle(self, *args, **options):
+        duplicates = list(
+            Student.objects.exclude(phone_e164='')
+            .values('phone_e164')
+            .annotate(students=Count('id'))
+            .filter(students__gt=1)
+            .order_by('phone_e164')
+            .values_list('phone_e164', flat=True)
+        )
+        rows = (
+            Student.objects.filter(phone_e164__in=duplicates)
+            .order_by('phone_e164', 'id')
+            .values_list('phone_e164', 'id', 'first_name', 'last_name', 'email')
+        )
+        for phone_e164, pk, first_name, last_name, email in rows:
+            self.stdout.write(f'{phone_e164}  #{pk} {first_name} {last_name} <{email}>')
+
+        self.stdout.write(self.style.SUCCESS(f'{len(duplicates)} phone number(s) shared by several students'))
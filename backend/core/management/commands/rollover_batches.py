@@ -0,0 +1,40 @@
+import time
+from django.core.management.base import BaseCommand
+from core.models import BatchTemplate
+from core.rollover import plan_batches, rollover_batches
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming batches from the batch templates of active courses (safe to re-run; run monthly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=3, help='How many months ahead to generate')
+        parser.add_argument('--course', action='append', default=[], help='Course code to limit to (repeatable)')
+        parser.add_argument('--dry-run', action='store_true', help='List the batches without creating them')
+
+    def handle(self, *args, **options):
+        templates = BatchTemplate.objects.all()
+        if options['course']:
+            templates = templates.filter(course__code__in=options['course'])
+
+        started = time.perf_counter()
+        if options['dry_run']:
+            batches, clashes = plan_batches(options['months'], templates=templates)
+            for batch in batches:
+                self.stdout.write(f'{batch.start_date}  {batch.name}  ({batch.time_slot})')
+            self.report_clashes(clashes)
+            self.stdout.write(self.style.SUCCESS(f'{len(batches)} batch(es) would be created'))
+            return
+
+        created, clashes = rollover_batches(options['months'], templates=templates)
+        self.report_clashes(clashes)
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} batch(es) through {options["months"]} month(s) ahead '
+            f'in {time.perf_counter() - started:.2f}s'
+        ))
+
+    def report_clashes(self, clashes):
+        for clash in clashes:
+            self.stdout.write(self.style.WARNING(
+                f'Skipped {clash["name"]}: {clash["room"]} is already booked by {", ".join(clash["clashes_with"])}'
+            ))
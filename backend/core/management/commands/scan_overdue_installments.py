@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from core.installments import scan_overdue_installments, send_overdue_reminders
+
+
+class Command(BaseCommand):
+    help = 'Mark installments past their due date as overdue and email reminders (run daily from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Installments processed per transaction')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            marked = scan_overdue_installments(limit=options['chunk_size'])
+            if not marked:
+                break
+            total += marked
+            self.stdout.write(f'Marked {marked} installment(s) overdue')
+
+        self.stdout.write(f'{total} installment(s) newly overdue')
+
+        # Sent here, not through the background mail queue, whose daemon
+        # threads would die with this process
+        reminded, failed = send_overdue_reminders(chunk_size=options['chunk_size'])
+        if failed:
+            self.stdout.write(self.style.ERROR(
+                f'Reminders for {failed} installment(s) failed; they are retried on the next run'
+            ))
+        self.stdout.write(self.style.SUCCESS(f'Sent reminders for {reminded} overdue installment(s)'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from core.messaging import expand_reminder_rules, claim_due_campaigns, send_campaign
+
+
+class Command(BaseCommand):
+    help = 'Expand batch reminder rules and send campaigns that are due (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='Maximum campaigns to send per run')
+        parser.add_argument('--skip-expand', action='store_true', help='Do not expand reminder rules this run')
+
+    def handle(self, *args, **options):
+        if not options['skip_expand']:
+            created = expand_reminder_rules()
+            self.stdout.write(f'Expanded reminder rules into {created} campaign(s)')
+
+        campaigns = claim_due_campaigns(limit=options['limit'])
+        if not campaigns:
+            self.stdout.write('No campaigns due')
+            return
+
+        failed = 0
+        for campaign in campaigns:
+            try:
+                sent = send_campaign(campaign)
+                self.stdout.write(f'Sent "{campaign.name}" to {sent} recipient(s)')
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f'Failed "{campaign.name}": {str(e)}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {len(campaigns)} campaign(s), {failed} failed'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from core.models import Batch, Student
+from core.timetable import clash_report
+
+
+class Command(BaseCommand):
+    help = 'Report room double-bookings and students enrolled in overlapping batches'
+
+    def handle(self, *args, **options):
+        report = clash_report()
+        batches = dict(Batch.objects.values_list('id', 'name'))
+        for clash in report['rooms']:
+            first, second = clash['batches']
+            self.stdout.write(f'Room {clash["room"]}: {batches[first]} overlaps {batches[second]}')
+        students = Student.objects.in_bulk({clash['student_id'] for clash in report['students']})
+        for clash in report['students']:
+            first, second = clash['batches']
+            self.stdout.write(f'{students[clash["student_id"]]}: {batches[first]} overlaps {batches[second]}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(report["rooms"])} room clash(es), {len(report["students"])} student clash(es)'
+        ))
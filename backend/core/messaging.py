@@ -0,0 +1,261 @@
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.mail import EmailMessage, get_connection
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import Student, Enrollment, Batch, BatchReminderRule, MessageCampaign
+from .serializers import BulkAudienceSerializer
+from .utils import send_whatsapp_message
+
+logger = logging.getLogger(__name__)
+
+# Number of recipients fetched (and emailed) per round trip
+AUDIENCE_CHUNK_SIZE = 500
+
+
+def resolve_audience(audience):
+    """
+    Build a Student queryset from a server-side audience filter.
+
+    Args:
+        audience (dict): Validated filter with any of course, batch,
+            enrollment_status, payment_status, is_active,
+            registered_from and registered_to, or all_students set.
+
+    Returns:
+        QuerySet: Students matching every supplied filter.
+    """
+    students = Student.objects.all()
+
+    # Enrollment filters must all match the same enrollment row, so they are
+    # applied together in a subquery instead of chained joins + distinct().
+    enrollment_filters = {}
+    if audience.get('course'):
+        enrollment_filters['course_id'] = audience['course']
+    if audience.get('batch'):
+        enrollment_filters['batch_id'] = audience['batch']
+    if audience.get('enrollment_status'):
+        enrollment_filters['status'] = audience['enrollment_status']
+    if audience.get('payment_status'):
+        enrollment_filters['payment_status'] = audience['payment_status']
+    if enrollment_filters:
+        students = students.filter(
+            id__in=Enrollment.objects.filter(**enrollment_filters).values('student_id')
+        )
+
+    if audience.get('is_active') is not None:
+        students = students.filter(is_active=audience['is_active'])
+    if audience.get('registered_from'):
+        students = students.filter(created_at__date__gte=audience['registered_from'])
+    if audience.get('registered_to'):
+        students = students.filter(created_at__date__lte=audience['registered_to'])
+
+    return students
+
+
+def iter_recipient_chunks(students, fields, chunk_size=AUDIENCE_CHUNK_SIZE):
+    """
+    Stream recipients in primary-key order, one bounded chunk at a time.
+
+    Uses keyset pagination (id > last seen id) so every chunk is an indexed
+    range read and the full audience is never materialized in memory.
+
+    Yields:
+        list: Tuples of (id, *fields) for up to chunk_size students.
+    """
+    last_id = 0
+    while True:
+        rows = list(
+            students.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', *fields)[:chunk_size]
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+def send_bulk_email(students, subject, content, chunk_size=AUDIENCE_CHUNK_SIZE):
+    """
+    Email every student in the queryset, one message per recipient chunk.
+
+    Recipients go in Bcc (the visible To: is the sender itself), so no
+    student sees the others' addresses. All chunks share one SMTP
+    connection.
+
+    Returns:
+        int: Number of recipients the email was sent to.
+    """
+    from_email = settings.EMAIL_HOST_USER or 'admin@csc.college'
+    sent = 0
+    with get_connection(fail_silently=False) as connection:
+        for rows in iter_recipient_chunks(students, ['email'], chunk_size):
+            recipient_list = [email for _, email in rows if email]
+            if not recipient_list:
+                continue
+            EmailMessage(
+                subject, content, from_email, to=[from_email], bcc=recipient_list, connection=connection
+            ).send()
+            sent += len(recipient_list)
+    return sent
+
+
+def collect_whatsapp_recipients(students, chunk_size=AUDIENCE_CHUNK_SIZE):
+    """
+    Build wa.me recipient entries for students with a valid E.164 phone.
+
+    Returns:
+        list: Dicts with 'name' and 'phone' keys.
+    """
+    recipients = []
+    fields = ['first_name', 'last_name', 'phone_e164']
+    for rows in iter_recipient_chunks(students.exclude(phone_e164=''), fields, chunk_size):
+        for _, first_name, last_name, phone_e164 in rows:
+            recipients.append({
+                'name': f"{first_name} {last_name}",
+                # wa.me expects the E.164 digits without the leading '+'
+                'phone': phone_e164[1:],
+            })
+    return recipients
+
+
+def send_bulk_whatsapp(students, content, chunk_size=AUDIENCE_CHUNK_SIZE):
+    """
+    Send a WhatsApp message through Twilio to every student with a valid phone.
+
+    Returns:
+        int: Number of messages accepted by Twilio.
+    """
+    sent = 0
+    for rows in iter_recipient_chunks(students.exclude(phone_e164=''), ['phone_e164'], chunk_size):
+        for _, phone_e164 in rows:
+            if send_whatsapp_message(phone_e164, content):
+                sent += 1
+    return sent
+
+
+class _TemplateContext(dict):
+    """Leave unknown {placeholders} untouched instead of raising KeyError"""
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+
+def expand_reminder_rules(today=None):
+    """
+    Turn active BatchReminderRules into concrete MessageCampaign rows.
+
+    Each rule costs one query over the batches whose reminder window has
+    opened (start_date within the next days_before days) and that have no
+    campaign for the rule yet, plus one bulk insert. The scheduler tick
+    therefore stays flat as the number of batches grows.
+
+    Returns:
+        int: Number of campaigns created.
+    """
+    today = today or timezone.localdate()
+    created = 0
+    for rule in BatchReminderRule.objects.filter(is_active=True):
+        batches = (
+            Batch.objects.filter(
+                is_active=True,
+                start_date__gte=today,
+                start_date__lte=today + timedelta(days=rule.days_before),
+            )
+            .exclude(campaigns__reminder_rule=rule)
+            .values_list('id', 'name', 'start_date', 'time_slot', 'course__name')
+        )
+        campaigns = []
+        for batch_id, batch_name, start_date, time_slot, course_name in batches:
+            context = _TemplateContext(
+                batch_name=batch_name,
+                course_name=course_name,
+                start_date=start_date.strftime('%d %b %Y'),
+                time_slot=time_slot,
+            )
+            send_at = datetime.combine(start_date - timedelta(days=rule.days_before), rule.send_time)
+            campaigns.append(MessageCampaign(
+                name=f"{rule.name} - {batch_name}",
+                message_type=rule.message_type,
+                subject=rule.subject.format_map(context),
+                content=rule.content.format_map(context),
+                audience={'batch': batch_id, 'enrollment_status': rule.enrollment_status},
+                send_at=timezone.make_aware(send_at, dt_timezone.utc),
+                reminder_rule=rule,
+                batch_id=batch_id,
+            ))
+        if not campaigns:
+            continue
+        # ignore_conflicts keeps overlapping scheduler runs from duplicating
+        # rows, so count what is actually there instead of what was sent
+        planned = MessageCampaign.objects.filter(
+            reminder_rule=rule, batch_id__in=[campaign.batch_id for campaign in campaigns]
+        )
+        before = planned.count()
+        MessageCampaign.objects.bulk_create(campaigns, ignore_conflicts=True)
+        created += planned.count() - before
+    return created
+
+
+def claim_due_campaigns(limit=100, now=None):
+    """
+    Atomically move due campaigns from 'scheduled' to 'sending'.
+
+    The due scan is served by the (status, send_at) index. Each row is
+    claimed with a conditional UPDATE so concurrent scheduler runs never
+    send the same campaign twice. A campaign left in 'sending' for longer
+    than CAMPAIGN_CLAIM_TIMEOUT seconds (its run died mid-send) is claimed
+    again; its recipients may then receive the message twice.
+
+    Returns:
+        list: The claimed MessageCampaign instances.
+    """
+    now = now or timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'CAMPAIGN_CLAIM_TIMEOUT', 30 * 60))
+    claimable = (
+        Q(status='scheduled', send_at__lte=now)
+        | Q(status='sending', claimed_at__lt=stale)
+        | Q(status='sending', claimed_at__isnull=True)
+    )
+    due_ids = list(
+        MessageCampaign.objects.filter(claimable)
+        .order_by('send_at')
+        .values_list('id', flat=True)[:limit]
+    )
+    claimed = []
+    for campaign_id in due_ids:
+        if MessageCampaign.objects.filter(claimable, id=campaign_id).update(status='sending', claimed_at=now):
+            claimed.append(campaign_id)
+    return list(MessageCampaign.objects.filter(id__in=claimed).order_by('send_at'))
+
+
+def send_campaign(campaign):
+    """
+    Resolve the campaign audience and deliver it, recording the outcome.
+
+    Returns:
+        int: Number of recipients reached.
+    """
+    try:
+        audience_serializer = BulkAudienceSerializer(data=campaign.audience)
+        audience_serializer.is_valid(raise_exception=True)
+        students = resolve_audience(audience_serializer.validated_data)
+
+        if campaign.message_type == 'whatsapp':
+            sent = send_bulk_whatsapp(students, campaign.content)
+        else:
+            subject = campaign.subject or 'Message from CSC Institute'
+            sent = send_bulk_email(students, subject, campaign.content)
+    except Exception as e:
+        logger.error(f"Campaign {campaign.id} failed: {str(e)}")
+        MessageCampaign.objects.filter(id=campaign.id).update(status='failed', last_error=str(e))
+        raise
+
+    MessageCampaign.objects.filter(id=campaign.id).update(
+        status='sent',
+        sent_at=timezone.now(),
+        recipient_count=sent,
+        last_error='',
+    )
+    return sent
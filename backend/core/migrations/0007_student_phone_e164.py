@@ -0,0 +1,75 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:58
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+# A frozen copy of core.utils.normalize_phone, so later changes to it do
+# not change what this migration writes
+
+E164_PATTERN = re.compile(r'^\+[1-9]\d{7,14}$')
+
+
+def normalize_phone(raw_number):
+    if not raw_number:
+        return ''
+    default_country_code = getattr(settings, 'PHONE_DEFAULT_COUNTRY_CODE', '91')
+
+    number = raw_number.strip()
+    if number.startswith('whatsapp:'):
+        number = number[len('whatsapp:'):]
+    has_plus = number.startswith('+')
+    digits = re.sub(r'\D', '', number)
+
+    if has_plus:
+        candidate = f"+{digits}"
+    elif digits.startswith('00'):
+        candidate = f"+{digits[2:]}"
+    elif len(digits) == 11 and digits.startswith('0'):
+        candidate = f"+{default_country_code}{digits[1:]}"
+    elif len(digits) == 10:
+        candidate = f"+{default_country_code}{digits}"
+    elif digits.startswith(default_country_code) and len(digits) == len(default_country_code) + 10:
+        candidate = f"+{digits}"
+    else:
+        return ''
+
+    return candidate if E164_PATTERN.match(candidate) else ''
+
+
+def backfill_phone_e164(apps, schema_editor):
+    """Populate phone_e164 for existing rows in bounded batches"""
+    for model_name in ('Student', 'ContactMessage'):
+        model = apps.get_model('core', model_name)
+        batch = []
+        for obj in model.objects.exclude(phone='').only('id', 'phone').iterator(chunk_size=1000):
+            obj.phone_e164 = normalize_phone(obj.phone)
+            if obj.phone_e164:
+                batch.append(obj)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, ['phone_e164'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['phone_e164'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_student_bio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactmessage',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Canonical E.164 form of phone', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Canonical E.164 form of phone', max_length=16),
+        ),
+        migrations.RunPython(backfill_phone_e164, migrations.RunPython.noop),
+    ]
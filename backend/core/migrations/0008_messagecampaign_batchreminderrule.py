@@ -0,0 +1,60 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_student_phone_e164'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchReminderRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('days_before', models.PositiveIntegerField(default=3, help_text='Days before Batch.start_date to send')),
+                ('send_time', models.TimeField(default='09:00', help_text='Time of day (UTC) to send')),
+                ('enrollment_status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], default='approved', max_length=20)),
+                ('message_type', models.CharField(choices=[('email', 'Email'), ('whatsapp', 'WhatsApp')], default='email', max_length=20)),
+                ('subject', models.CharField(blank=True, max_length=200)),
+                ('content', models.TextField(help_text='Supports {batch_name}, {course_name}, {start_date} and {time_slot}')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Batch Reminder Rule',
+                'verbose_name_plural': 'Batch Reminder Rules',
+                'ordering': ['days_before', 'name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MessageCampaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('message_type', models.CharField(choices=[('email', 'Email'), ('whatsapp', 'WhatsApp')], default='email', max_length=20)),
+                ('subject', models.CharField(blank=True, max_length=200)),
+                ('content', models.TextField()),
+                ('audience', models.JSONField(default=dict, help_text='Audience filter, same keys as bulk messaging')),
+                ('send_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='scheduled', max_length=20)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('recipient_count', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='campaigns', to='core.batch')),
+                ('reminder_rule', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='campaigns', to='core.batchreminderrule')),
+            ],
+            options={
+                'verbose_name': 'Message Campaign',
+                'verbose_name_plural': 'Message Campaigns',
+                'ordering': ['-send_at'],
+                'indexes': [models.Index(fields=['status', 'send_at'], name='campaign_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('reminder_rule', 'batch'), name='unique_rule_batch_campaign')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_idempotencyrecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='otpverification',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Wrong codes entered for this OTP'),
+        ),
+        migrations.AddIndex(
+            model_name='otpverification',
+            index=models.Index(fields=['email', 'is_verified', 'expires_at'], name='otp_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='otpverification',
+            index=models.Index(fields=['email', 'code', 'is_verified', 'expires_at'], name='otp_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='otpverification',
+            index=models.Index(fields=['expires_at'], name='otp_expiry_idx'),
+        ),
+    ]
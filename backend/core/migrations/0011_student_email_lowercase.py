@@ -0,0 +1,61 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:10
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count, F
+from django.db.models.functions import Lower, Trim
+
+
+def lowercase_student_emails(apps, schema_editor):
+    """
+    Rewrite existing Student emails to their stripped, lowercase form.
+
+    Addresses that only differ by case would violate the new unique index,
+    so they are listed and the migration stops before touching anything;
+    merge or rename those accounts and run migrate again.
+    """
+    Student = apps.get_model('core', 'Student')
+    canonical = Lower(Trim('email'))
+
+    collisions = list(
+        Student.objects.order_by()
+        .values(canonical_email=canonical)
+        .annotate(accounts=Count('id'))
+        .filter(accounts__gt=1)
+        .values_list('canonical_email', flat=True)
+    )
+    if collisions:
+        lines = ['Student emails that collide once lowercased:']
+        rows = (
+            Student.objects.annotate(canonical_email=canonical)
+            .filter(canonical_email__in=collisions)
+            .order_by('canonical_email', 'id')
+            .values_list('canonical_email', 'id', 'email', 'is_active')
+        )
+        for canonical_email, pk, email, is_active in rows:
+            lines.append(f'  {canonical_email}: id={pk} email={email!r} active={is_active}')
+        lines.append('Resolve these duplicates, then re-run migrate.')
+        raise RuntimeError('\n'.join(lines))
+
+    updated = (
+        Student.objects.annotate(canonical_email=canonical)
+        .exclude(email=F('canonical_email'))
+        .update(email=canonical)
+    )
+    if updated:
+        print(f'\n  Lowercased {updated} student email(s)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_otpverification_attempts_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_student_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='student',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='student_email_lower_uniq'),
+        ),
+    ]
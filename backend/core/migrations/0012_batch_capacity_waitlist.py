@@ -0,0 +1,50 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_taken_seats(apps, schema_editor):
+    """Initialize seats_taken from existing pending/approved/completed enrollments"""
+    Batch = apps.get_model('core', 'Batch')
+    Enrollment = apps.get_model('core', 'Enrollment')
+    taken = Enrollment.objects.filter(
+        batch=OuterRef('pk'), status__in=['pending', 'approved', 'completed']
+    ).order_by().values('batch').annotate(n=Count('id')).values('n')
+    Batch.objects.update(seats_taken=Coalesce(Subquery(taken), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_student_email_lowercase'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Maximum students; leave blank for no limit', null=True),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='seats_taken',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Pending, approved and completed enrollments'),
+        ),
+        migrations.AlterField(
+            model_name='batchreminderrule',
+            name='enrollment_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('waitlisted', 'Waitlisted')], default='approved', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='enrollment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('waitlisted', 'Waitlisted')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['batch', 'status', 'enrollment_date'], name='enrollment_batch_status_idx'),
+        ),
+        migrations.RunPython(count_taken_seats, migrations.RunPython.noop),
+    ]
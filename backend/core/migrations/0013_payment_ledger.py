@@ -0,0 +1,110 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, CharField, F, OuterRef, Subquery, Value, When
+
+
+def open_ledger(apps, schema_editor):
+    """
+    Derive fee_due, balance_due and payment_status for existing enrollments
+    and carry each non-zero amount_paid into the ledger as an opening entry,
+    so that the sum of an enrollment's payments always equals amount_paid.
+    payment_status is recomputed from the amounts, replacing free text.
+    """
+    Course = apps.get_model('core', 'Course')
+    Enrollment = apps.get_model('core', 'Enrollment')
+    Payment = apps.get_model('core', 'Payment')
+
+    Enrollment.objects.update(
+        fee_due=Subquery(Course.objects.filter(pk=OuterRef('course_id')).values('fees')[:1])
+    )
+    Enrollment.objects.update(
+        balance_due=F('fee_due') - F('amount_paid'),
+        payment_status=Case(
+            When(amount_paid__gte=F('fee_due'), then=Value('paid')),
+            When(amount_paid__gt=0, then=Value('partial')),
+            default=Value('pending'),
+            output_field=CharField(),
+        ),
+    )
+
+    batch = []
+    for enrollment_id, amount_paid, paid_at in (
+        Enrollment.objects.exclude(amount_paid=0).order_by('pk')
+        .values_list('id', 'amount_paid', 'updated_at').iterator(chunk_size=1000)
+    ):
+        batch.append(Payment(
+            enrollment_id=enrollment_id, amount=amount_paid, mode='adjustment',
+            receipt_number=f'OPENING-{enrollment_id}', paid_at=paid_at,
+            note='Opening balance carried over from amount_paid',
+        ))
+        if len(batch) >= 1000:
+            Payment.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Payment.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_batch_capacity_waitlist'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('mode', models.CharField(choices=[('cash', 'Cash'), ('upi', 'UPI'), ('card', 'Card'), ('bank_transfer', 'Bank Transfer'), ('cheque', 'Cheque'), ('refund', 'Refund'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('receipt_number', models.CharField(blank=True, help_text='Generated if left blank', max_length=40, unique=True)),
+                ('paid_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Payment',
+                'verbose_name_plural': 'Payments',
+                'ordering': ['-paid_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='balance_due',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='fee_due',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Fee charged; defaults to the course fees at enrollment', max_digits=10, null=True),
+        ),
+        migrations.AlterField(
+            model_name='enrollment',
+            name='payment_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('partial', 'Partially Paid'), ('paid', 'Paid')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(condition=models.Q(('balance_due__gt', 0)), fields=['status', '-balance_due'], name='enrollment_dues_idx'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='enrollment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='payments', to='core.enrollment'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='recorded_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['enrollment', 'paid_at'], name='payment_enrollment_idx'),
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
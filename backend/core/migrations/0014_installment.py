@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_payment_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Installment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveSmallIntegerField(help_text='1 for the first installment')),
+                ('due_date', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('overdue', 'Overdue'), ('paid', 'Paid')], default='pending', max_length=20)),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('reminded_at', models.DateTimeField(blank=True, null=True)),
+                ('enrollment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='installments', to='core.enrollment')),
+            ],
+            options={
+                'verbose_name': 'Installment',
+                'verbose_name_plural': 'Installments',
+                'ordering': ['enrollment', 'sequence'],
+                'indexes': [models.Index(fields=['status', 'due_date'], name='installment_due_idx')],
+                'unique_together': {('enrollment', 'sequence')},
+            },
+        ),
+    ]
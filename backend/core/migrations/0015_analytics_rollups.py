@@ -0,0 +1,80 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_installment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnrollmentDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('waitlisted', 'Waitlisted')], max_length=20)),
+                ('enrollments', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RevenueDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payments', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['updated_at'], name='enrollment_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['enrollment_date', 'course'], name='enrollment_date_course_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['created_at'], name='payment_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='enrollmentdailystat',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.course'),
+        ),
+        migrations.AddField(
+            model_name='revenuedailystat',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.course'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollmentdailystat',
+            index=models.Index(fields=['day'], name='enrollment_stat_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='enrollmentdailystat',
+            unique_together={('day', 'course', 'status')},
+        ),
+        migrations.AddIndex(
+            model_name='revenuedailystat',
+            index=models.Index(fields=['day'], name='revenue_stat_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='revenuedailystat',
+            unique_together={('day', 'course')},
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:28
+
+import re
+
+from django.db import migrations, models
+
+# A frozen copy of core.utils.parse_time_slot, so later parser changes do
+# not change what this migration writes
+
+WEEKDAY_NAMES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+DEFAULT_WEEKDAYS = 0b0111111
+WEEKDAY_WORDS = {'daily': 0b1111111, 'weekdays': 0b0011111, 'weekends': 0b1100000, 'weekend': 0b1100000}
+_DAY = r'(mon(?:day)?|tue(?:s(?:day)?)?|wed(?:nesday)?|thu(?:r(?:s(?:day)?)?)?|fri(?:day)?|sat(?:urday)?|sun(?:day)?)\b\.?'
+DAY_PATTERN = re.compile(rf'\b{_DAY}(?:\s*(?:-|–|to)\s*{_DAY})?', re.IGNORECASE)
+TIME_RANGE_PATTERN = re.compile(
+    r'(\d{1,2})(?:[:.](\d{2}))?\s*([ap])?\.?\s*m?\.?\s*(?:-|–|to)\s*(\d{1,2})(?:[:.](\d{2}))?\s*([ap])?\.?\s*m?\.?',
+    re.IGNORECASE,
+)
+
+
+def _minutes(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            raise ValueError
+        hour = hour % 12 + (12 if meridiem.lower() == 'p' else 0)
+    if hour > 23 or minute > 59:
+        raise ValueError
+    return hour * 60 + minute
+
+
+def parse_time_slot(time_slot):
+    match = TIME_RANGE_PATTERN.search(time_slot or '')
+    if not match:
+        return None
+    start_hour, start_minute, start_meridiem, end_hour, end_minute, end_meridiem = match.groups()
+    try:
+        end = _minutes(end_hour, end_minute, end_meridiem)
+        start = None
+        if end_meridiem and not start_meridiem:
+            start = _minutes(start_hour, start_minute, end_meridiem)
+            if start >= end:
+                start = _minutes(start_hour, start_minute, 'a' if end_meridiem.lower() == 'p' else None)
+        if start is None:
+            start = _minutes(start_hour, start_minute, start_meridiem)
+    except ValueError:
+        return None
+    if start >= end:
+        return None
+
+    days_text = time_slot[:match.start()] + ' ' + time_slot[match.end():]
+    weekdays = 0
+    for word, mask in WEEKDAY_WORDS.items():
+        if re.search(rf'\b{word}\b', days_text, re.IGNORECASE):
+            weekdays |= mask
+    for first, last in DAY_PATTERN.findall(days_text):
+        first = WEEKDAY_NAMES.index(first[:3].lower())
+        last = WEEKDAY_NAMES.index(last[:3].lower()) if last else first
+        day = first
+        while True:
+            weekdays |= 1 << day
+            if day == last:
+                break
+            day = (day + 1) % 7
+    return weekdays or DEFAULT_WEEKDAYS, start, end
+
+
+def parse_time_slots(apps, schema_editor):
+    """Fill the structured schedule of existing batches from their free-text time_slot"""
+    Batch = apps.get_model('core', 'Batch')
+    batches = list(Batch.objects.only('id', 'time_slot'))
+    for batch in batches:
+        batch.weekdays, batch.start_minute, batch.end_minute = parse_time_slot(batch.time_slot) or (0, None, None)
+    Batch.objects.bulk_update(batches, ['weekdays', 'start_minute', 'end_minute'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='end_minute',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='room',
+            field=models.CharField(blank=True, help_text='Classroom or lab; used to detect double bookings', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='start_minute',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='weekdays',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Bitmask, Monday = 1'),
+        ),
+        migrations.AlterField(
+            model_name='batch',
+            name='time_slot',
+            field=models.CharField(help_text="e.g., 'Mon-Fri 10:00 AM - 12:00 PM'", max_length=100),
+        ),
+        migrations.RunPython(parse_time_slots, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['room', 'start_minute', 'end_minute'], name='batch_room_slot_idx'),
+        ),
+    ]
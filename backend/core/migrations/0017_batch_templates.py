@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:34
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_batch_timetable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(help_text="e.g., 'Morning'; batches are named 'Jan 2026 Morning Batch'", max_length=50)),
+                ('time_slot', models.CharField(help_text="e.g., 'Mon-Fri 10:00 AM - 12:00 PM'", max_length=100)),
+                ('room', models.CharField(blank=True, max_length=50)),
+                ('capacity', models.PositiveIntegerField(blank=True, help_text='Maximum students; leave blank for no limit', null=True)),
+                ('first_start_date', models.DateField(help_text='Start date of the first batch; later ones follow the cadence')),
+                ('every_months', models.PositiveSmallIntegerField(default=1, help_text='A new batch starts every N months', validators=[django.core.validators.MinValueValidator(1)])),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batch_templates', to='core.course')),
+            ],
+            options={
+                'ordering': ['course', 'label'],
+            },
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='template',
+            field=models.ForeignKey(blank=True, help_text='Template this batch was generated from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='batches', to='core.batchtemplate'),
+        ),
+        migrations.AddConstraint(
+            model_name='batch',
+            constraint=models.UniqueConstraint(fields=('template', 'start_date'), name='batch_template_start_uniq'),
+        ),
+    ]
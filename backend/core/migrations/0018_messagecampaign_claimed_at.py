@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_batch_templates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagecampaign',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
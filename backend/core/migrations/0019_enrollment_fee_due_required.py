@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:05
+
+from django.db import migrations, models
+from django.db.models import Case, CharField, F, OuterRef, Subquery, Value, When
+
+
+def fill_fee_due(apps, schema_editor):
+    """Blank fees fall back to the course fees, and their balances follow"""
+    Course = apps.get_model('core', 'Course')
+    Enrollment = apps.get_model('core', 'Enrollment')
+
+    blank = Enrollment.objects.filter(fee_due__isnull=True)
+    ids = list(blank.values_list('id', flat=True))
+    if not ids:
+        return
+    blank.update(fee_due=Subquery(Course.objects.filter(pk=OuterRef('course_id')).values('fees')[:1]))
+    Enrollment.objects.filter(pk__in=ids).update(
+        balance_due=F('fee_due') - F('amount_paid'),
+        payment_status=Case(
+            When(amount_paid__gte=F('fee_due'), then=Value('paid')),
+            When(amount_paid__gt=0, then=Value('partial')),
+            default=Value('pending'),
+            output_field=CharField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_messagecampaign_claimed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_fee_due, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='enrollment',
+            name='fee_due',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Fee charged; defaults to the course fees when left blank', max_digits=10),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:20
+
+from importlib import import_module
+
+from django.db import migrations
+
+# The frozen parser of 0016, which now only accepts whole day tokens
+parse_time_slot = import_module('core.migrations.0016_batch_timetable').parse_time_slot
+
+
+def reparse_time_slots(apps, schema_editor):
+    """Re-derive schedules that read words like 'Sunrise' or 'Monthly' as days"""
+    Batch = apps.get_model('core', 'Batch')
+    changed = []
+    for batch in Batch.objects.only('id', 'time_slot', 'weekdays', 'start_minute', 'end_minute').iterator(chunk_size=1000):
+        schedule = parse_time_slot(batch.time_slot) or (0, None, None)
+        if schedule != (batch.weekdays, batch.start_minute, batch.end_minute):
+            batch.weekdays, batch.start_minute, batch.end_minute = schedule
+            changed.append(batch)
+    Batch.objects.bulk_update(changed, ['weekdays', 'start_minute', 'end_minute'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_enrollment_fee_due_required'),
+    ]
+
+    operations = [
+        migrations.RunPython(reparse_time_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_reparse_batch_time_slots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchTemplateSkip',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skips', to='core.batchtemplate')),
+            ],
+            options={
+                'ordering': ['start_date'],
+                'constraints': [models.UniqueConstraint(fields=('template', 'start_date'), name='batch_template_skip_uniq')],
+            },
+        ),
+    ]
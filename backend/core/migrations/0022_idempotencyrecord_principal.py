@@ -0,0 +1,26 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_batchtemplateskip'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='idempotencyrecord',
+            name='unique_idempotency_scope_key',
+        ),
+        migrations.AddField(
+            model_name='idempotencyrecord',
+            name='principal',
+            field=models.CharField(blank=True, default='', help_text="Caller the key belongs to, e.g. 'user:3' or 'student:7'; blank for anonymous", max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencyrecord',
+            constraint=models.UniqueConstraint(fields=('scope', 'principal', 'key'), name='unique_idempotency_principal_key'),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 import json
 
@@ -105,6 +107,7 @@ class Student(models.Model):
     last_name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=15, blank=True)
+    phone_e164 = models.CharField(max_length=16, blank=True, db_index=True, editable=False, help_text="Canonical E.164 form of phone")
     password = models.CharField(max_length=128, default='')  # Hashed password
     
     # Profile Details
@@ -126,21 +129,43 @@ class Student(models.Model):
         verbose_name = "Student"
         verbose_name_plural = "Students"
         ordering = ['-created_at']
+        constraints = [
+            # Emails are stored lowercase; this also rejects case-only duplicates
+            # written around save(), e.g. by queryset.update() or raw SQL
+            models.UniqueConstraint(Lower('email'), name='student_email_lower_uniq'),
+        ]
     
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
     
+    def save(self, *args, **kwargs):
+        from .utils import normalize_email, normalize_phone
+        # Canonical lowercase email keeps auth lookups on the unique index
+        self.email = normalize_email(self.email)
+        self.phone_e164 = normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_e164'}
+        return super().save(*args, **kwargs)
+    
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
     
     def set_password(self, raw_password):
-        from django.contrib.auth.hashers import make_password
-        self.password = make_password(raw_password)
+        from .hashers import make_student_password
+        self.password = make_student_password(raw_password)
     
     def check_password(self, raw_password):
-        from django.contrib.auth.hashers import check_password
-        return check_password(raw_password, self.password)
+        """Verify the password, upgrading the stored hash if its hasher or cost is outdated"""
+        from .hashers import check_student_password
+        
+        def setter(raw_password):
+            self.set_password(raw_password)
+            if self.pk:
+                Student.objects.filter(pk=self.pk).update(password=self.password)
+        
+        return check_student_password(raw_password, self.password, setter)
 
 
 class Enrollment(models.Model):
@@ -151,7 +176,27 @@ class Enrollment(models.Model):
         ('rejected', 'Rejected'),
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
+        ('waitlisted', 'Waitlisted'),
+    ]
+    PAYMENT_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('partial', 'Partially Paid'),
+        ('paid', 'Paid'),
     ]
+    # Maintained from the Payment ledger, never written back by save()
+    LEDGER_FIELDS = ('amount_paid', 'balance_due', 'payment_status')
+    # Statuses that occupy a seat in the enrollment's batch
+    SEAT_STATUSES = ('pending', 'approved', 'completed')
+    # Status changes allowed through the API and bulk transitions. Waitlisted
+    # enrollments only become pending by promotion, when a seat frees up.
+    ALLOWED_TRANSITIONS = {
+        'pending': {'approved', 'rejected', 'cancelled'},
+        'waitlisted': {'rejected', 'cancelled'},
+        'approved': {'completed', 'cancelled'},
+        'rejected': set(),
+        'completed': set(),
+        'cancelled': set(),
+    }
     
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='enrollments')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
@@ -164,9 +209,12 @@ class Enrollment(models.Model):
     
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     
-    # Payment
-    payment_status = models.CharField(max_length=20, default='pending')
+    # Payment; amount_paid, balance_due and payment_status are maintained
+    # from the Payment ledger by core.payments.record_payment
+    payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
+    fee_due = models.DecimalField(max_digits=10, decimal_places=2, blank=True, help_text="Fee charged; defaults to the course fees when left blank")
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    balance_due = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     
     # Progress
     progress_percentage = models.IntegerField(default=0, validators=[MinValueValidator(0)])
@@ -182,9 +230,219 @@ class Enrollment(models.Model):
         verbose_name_plural = "Enrollments"
         ordering = ['-enrollment_date']
         unique_together = ['student', 'course']
+        indexes = [
+            # Seat counts and first-come waitlist order per batch
+            models.Index(fields=['batch', 'status', 'enrollment_date'], name='enrollment_batch_status_idx'),
+            # Dues report: only enrollments that still owe money, largest first
+            models.Index(
+                fields=['status', '-balance_due'], name='enrollment_dues_idx',
+                condition=models.Q(balance_due__gt=0)
+            ),
+            # Analytics rollup: rows changed since the last refresh, and per-day recounts
+            models.Index(fields=['updated_at'], name='enrollment_updated_idx'),
+            models.Index(fields=['enrollment_date', 'course'], name='enrollment_date_course_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.full_name} - {self.course.code}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets save() skip recomputing the balance when the fee is unchanged,
+        # and the analytics signal spot a course change without a query
+        if 'fee_due' in field_names:
+            instance._loaded_fee_due = instance.fee_due
+        if 'course_id' in field_names:
+            instance._loaded_course_id = instance.course_id
+        return instance
+    
+    @staticmethod
+    def payment_status_for(balance_due, amount_paid):
+        """payment_status of a new enrollment with these totals"""
+        if balance_due <= 0:
+            return 'paid'
+        return 'partial' if amount_paid > 0 else 'pending'
+    
+    def can_transition_to(self, status):
+        return status in self.ALLOWED_TRANSITIONS.get(self.status, ())
+    
+    @property
+    def seat_batch_id(self):
+        """The batch this enrollment occupies a seat in, or None"""
+        return self.batch_id if self.status in self.SEAT_STATUSES else None
+    
+    def save(self, *args, **kwargs):
+        """
+        Reserve a batch seat when the enrollment starts occupying one and
+        give it back (promoting the waitlist) when it stops, in the same
+        transaction as the row itself. A pending enrollment for a full batch
+        is waitlisted; any other status raises BatchFullError.
+        
+        The ledger totals (amount_paid, balance_due, payment_status) are only
+        written on insert; afterwards core.payments maintains them, and
+        recomputes the balance when fee_due changes. A blank fee_due falls
+        back to the course fees.
+        """
+        from .payments import refresh_balance
+        from .seats import claim_seat, release_seat
+        deferred = self.get_deferred_fields()
+        if 'fee_due' not in deferred and self.fee_due is None:
+            self.fee_due = self.course.fees
+        if self._state.adding:
+            self.balance_due = self.fee_due - self.amount_paid
+            self.payment_status = self.payment_status_for(self.balance_due, self.amount_paid)
+        elif kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.LEDGER_FIELDS and f.attname not in deferred
+            ]
+        update_fields = kwargs.get('update_fields')
+        fee_changed = (
+            update_fields is not None and 'fee_due' in update_fields
+            and self.fee_due != getattr(self, '_loaded_fee_due', None)
+        )
+        
+        with transaction.atomic():
+            released_batch_id = None
+            if update_fields is None or {'status', 'batch', 'batch_id'} & set(update_fields):
+                status = self.status
+                released_batch_id = claim_seat(self)
+                if update_fields is not None and self.status != status:
+                    kwargs['update_fields'] = {*update_fields, 'status'}
+            super().save(*args, **kwargs)
+            if released_batch_id:
+                release_seat(released_batch_id)
+            if fee_changed:
+                refresh_balance(self)
+        if 'fee_due' not in deferred:
+            self._loaded_fee_due = self.fee_due
+        if 'course_id' not in deferred:
+            self._loaded_course_id = self.course_id
+
+
+class Payment(models.Model):
+    """Append-only payment ledger; corrections are recorded as new (negative) entries"""
+    MODE_CHOICES = [
+        ('cash', 'Cash'),
+        ('upi', 'UPI'),
+        ('card', 'Card'),
+        ('bank_transfer', 'Bank Transfer'),
+        ('cheque', 'Cheque'),
+        ('refund', 'Refund'),
+        ('adjustment', 'Adjustment'),
+    ]
+    # Modes that may carry a negative amount
+    CREDIT_MODES = ('refund', 'adjustment')
+    
+    enrollment = models.ForeignKey(Enrollment, on_delete=models.PROTECT, related_name='payments')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES)
+    receipt_number = models.CharField(max_length=40, unique=True, blank=True, help_text="Generated if left blank")
+    paid_at = models.DateTimeField(default=timezone.now, db_index=True)
+    note = models.CharField(max_length=255, blank=True)
+    recorded_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Payment"
+        verbose_name_plural = "Payments"
+        ordering = ['-paid_at']
+        indexes = [
+            models.Index(fields=['enrollment', 'paid_at'], name='payment_enrollment_idx'),
+            # Analytics rollup: entries added since the last refresh
+            models.Index(fields=['created_at'], name='payment_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.receipt_number} - ₹ {self.amount:,.2f}"
+    
+    def save(self, *args, **kwargs):
+        """Insert the entry and apply it to the enrollment's balances in one transaction"""
+        from .payments import apply_payment, generate_receipt_number
+        if not self._state.adding:
+            raise ValueError("Payments are append-only; record an adjustment instead")
+        if not self.receipt_number:
+            self.receipt_number = generate_receipt_number(self.paid_at)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            apply_payment(self)
+    
+    def delete(self, *args, **kwargs):
+        raise ValueError("Payments are append-only; record an adjustment instead")
+
+
+class Installment(models.Model):
+    """One scheduled part-payment of an enrollment's fee"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('overdue', 'Overdue'),
+        ('paid', 'Paid'),
+    ]
+    
+    enrollment = models.ForeignKey(Enrollment, on_delete=models.CASCADE, related_name='installments')
+    sequence = models.PositiveSmallIntegerField(help_text="1 for the first installment")
+    due_date = models.DateField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    paid_at = models.DateTimeField(null=True, blank=True)
+    reminded_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Installment"
+        verbose_name_plural = "Installments"
+        ordering = ['enrollment', 'sequence']
+        unique_together = ['enrollment', 'sequence']
+        indexes = [
+            # Overdue scan: status = 'pending' AND due_date < today is one range
+            models.Index(fields=['status', 'due_date'], name='installment_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.enrollment} - installment {self.sequence}"
+
+
+class EnrollmentDailyStat(models.Model):
+    """Rollup: enrollments per enrollment day, course and status (maintained by core.analytics)"""
+    day = models.DateField()
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20, choices=Enrollment.STATUS_CHOICES)
+    enrollments = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['day', 'course', 'status']
+        indexes = [
+            models.Index(fields=['day'], name='enrollment_stat_day_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.course_id} {self.status}: {self.enrollments}"
+
+
+class RevenueDailyStat(models.Model):
+    """Rollup: ledger payments per payment day and course (maintained by core.analytics)"""
+    day = models.DateField()
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payments = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['day', 'course']
+        indexes = [
+            models.Index(fields=['day'], name='revenue_stat_day_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.course_id}: {self.amount}"
+
+
+class RollupWatermark(models.Model):
+    """Source rows changed at or before `value` are reflected in the named rollup"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.name} @ {self.value}"
 
 
 class ContactMessage(models.Model):
@@ -192,6 +450,7 @@ class ContactMessage(models.Model):
     name = models.CharField(max_length=200)
     email = models.EmailField()
     phone = models.CharField(max_length=15, blank=True)
+    phone_e164 = models.CharField(max_length=16, blank=True, db_index=True, editable=False, help_text="Canonical E.164 form of phone")
     subject = models.CharField(max_length=200, blank=True)
     message = models.TextField()
     
@@ -205,6 +464,11 @@ class ContactMessage(models.Model):
     
     def __str__(self):
         return f"{self.name} - {self.subject}"
+    
+    def save(self, *args, **kwargs):
+        from .utils import normalize_phone
+        self.phone_e164 = normalize_phone(self.phone)
+        return super().save(*args, **kwargs)
 
 
 class SeasonalOffer(models.Model):
@@ -226,23 +490,102 @@ class SeasonalOffer(models.Model):
         return self.title
 
 
+class BatchTemplate(models.Model):
+    """Recurring batch of a course; upcoming Batch rows are generated from it by rollover_batches"""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='batch_templates')
+    label = models.CharField(max_length=50, help_text="e.g., 'Morning'; batches are named 'Jan 2026 Morning Batch'")
+    time_slot = models.CharField(max_length=100, help_text="e.g., 'Mon-Fri 10:00 AM - 12:00 PM'")
+    room = models.CharField(max_length=50, blank=True)
+    capacity = models.PositiveIntegerField(null=True, blank=True, help_text="Maximum students; leave blank for no limit")
+    first_start_date = models.DateField(help_text="Start date of the first batch; later ones follow the cadence")
+    every_months = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)], help_text="A new batch starts every N months")
+    is_active = models.BooleanField(default=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['course', 'label']
+    
+    def __str__(self):
+        return f"{self.course.code} {self.label} (every {self.every_months} month(s))"
+
+
+class BatchTemplateSkip(models.Model):
+    """A start date rollover must not generate again, e.g. a cancelled intake whose batch was deleted"""
+    template = models.ForeignKey(BatchTemplate, on_delete=models.CASCADE, related_name='skips')
+    start_date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['start_date']
+        constraints = [
+            models.UniqueConstraint(fields=['template', 'start_date'], name='batch_template_skip_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.template} - {self.start_date}"
+
+
 class Batch(models.Model):
     """Batches for courses"""
     name = models.CharField(max_length=100, help_text="e.g., 'Jan 2026 Morning Batch'")
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='batches')
-    time_slot = models.CharField(max_length=100, help_text="e.g., '10:00 AM - 12:00 PM'")
+    time_slot = models.CharField(max_length=100, help_text="e.g., 'Mon-Fri 10:00 AM - 12:00 PM'")
     start_date = models.DateField()
     is_active = models.BooleanField(default=True)
+    room = models.CharField(max_length=50, blank=True, help_text="Classroom or lab; used to detect double bookings")
+    
+    # Weekly schedule parsed from time_slot (empty when it cannot be parsed)
+    weekdays = models.PositiveSmallIntegerField(default=0, editable=False, help_text="Bitmask, Monday = 1")
+    start_minute = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    end_minute = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
     
+    # Seats
+    capacity = models.PositiveIntegerField(null=True, blank=True, help_text="Maximum students; leave blank for no limit")
+    seats_taken = models.PositiveIntegerField(default=0, editable=False, help_text="Pending, approved and completed enrollments")
+    
+    template = models.ForeignKey(
+        BatchTemplate, on_delete=models.SET_NULL, null=True, blank=True, related_name='batches',
+        help_text="Template this batch was generated from"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         verbose_name = "Batch"
         verbose_name_plural = "Batches"
         ordering = ['-start_date']
+        indexes = [
+            # Interval lookups for room double-booking checks
+            models.Index(fields=['room', 'start_minute', 'end_minute'], name='batch_room_slot_idx'),
+        ]
+        constraints = [
+            # Makes batch rollover idempotent, even when runs overlap
+            models.UniqueConstraint(fields=['template', 'start_date'], name='batch_template_start_uniq'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.course.code})"
+    
+    def save(self, *args, **kwargs):
+        from .utils import parse_time_slot
+        self.weekdays, self.start_minute, self.end_minute = parse_time_slot(self.time_slot) or (0, None, None)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'time_slot' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'weekdays', 'start_minute', 'end_minute'}
+        # seats_taken is maintained by atomic F() updates in core.seats;
+        # never write back a copy that may be stale by now
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'seats_taken'
+            ]
+        return super().save(*args, **kwargs)
+    
+    @property
+    def seats_available(self):
+        if self.capacity is None:
+            return None
+        return max(0, self.capacity - self.seats_taken)
 
 
 class OTPVerification(models.Model):
@@ -251,11 +594,120 @@ class OTPVerification(models.Model):
     code = models.CharField(max_length=6)
     purpose = models.CharField(max_length=20, default='password_reset') # or 'login', 'registration'
     is_verified = models.BooleanField(default=False)
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Wrong codes entered for this OTP")
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Latest pending OTP for an email (verify_otp)
+            models.Index(fields=['email', 'is_verified', 'expires_at'], name='otp_pending_idx'),
+            # Verified email/code pair lookups (reset_password)
+            models.Index(fields=['email', 'code', 'is_verified', 'expires_at'], name='otp_code_idx'),
+            # Expired-row purge
+            models.Index(fields=['expires_at'], name='otp_expiry_idx'),
+        ]
 
     def __str__(self):
         return f"{self.email} - {self.code} ({self.purpose})"
+
+
+class BatchReminderRule(models.Model):
+    """Recurring rule, e.g. message enrolled students N days before each batch starts"""
+    MESSAGE_TYPE_CHOICES = [
+        ('email', 'Email'),
+        ('whatsapp', 'WhatsApp'),
+    ]
+    
+    name = models.CharField(max_length=200)
+    days_before = models.PositiveIntegerField(default=3, help_text="Days before Batch.start_date to send")
+    send_time = models.TimeField(default='09:00', help_text="Time of day (UTC) to send")
+    enrollment_status = models.CharField(max_length=20, choices=Enrollment.STATUS_CHOICES, default='approved')
+    
+    message_type = models.CharField(max_length=20, choices=MESSAGE_TYPE_CHOICES, default='email')
+    subject = models.CharField(max_length=200, blank=True)
+    content = models.TextField(help_text="Supports {batch_name}, {course_name}, {start_date} and {time_slot}")
+    
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Batch Reminder Rule"
+        verbose_name_plural = "Batch Reminder Rules"
+        ordering = ['days_before', 'name']
+    
+    def __str__(self):
+        return f"{self.name} ({self.days_before} days before)"
+
+
+class MessageCampaign(models.Model):
+    """A message plus an audience filter, sent once at send_at"""
+    STATUS_CHOICES = [
+        ('scheduled', 'Scheduled'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    
+    name = models.CharField(max_length=200)
+    message_type = models.CharField(max_length=20, choices=BatchReminderRule.MESSAGE_TYPE_CHOICES, default='email')
+    subject = models.CharField(max_length=200, blank=True)
+    content = models.TextField()
+    audience = models.JSONField(default=dict, help_text="Audience filter, same keys as bulk messaging")
+    send_at = models.DateTimeField()
+    
+    # Set when the campaign was expanded from a reminder rule
+    reminder_rule = models.ForeignKey(BatchReminderRule, on_delete=models.SET_NULL, null=True, blank=True, related_name='campaigns')
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, null=True, blank=True, related_name='campaigns')
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
+    # When a scheduler run moved it to 'sending'; stale claims are retried
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    recipient_count = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Message Campaign"
+        verbose_name_plural = "Message Campaigns"
+        ordering = ['-send_at']
+        indexes = [
+            # Scheduler tick: status='scheduled' AND send_at <= now
+            models.Index(fields=['status', 'send_at'], name='campaign_due_idx'),
+        ]
+        constraints = [
+            # A rule expands into at most one campaign per batch
+            models.UniqueConstraint(fields=['reminder_rule', 'batch'], name='unique_rule_batch_campaign'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} @ {self.send_at:%Y-%m-%d %H:%M}"
+
+
+class IdempotencyRecord(models.Model):
+    """Stored response for a POST carrying an Idempotency-Key header"""
+    key = models.CharField(max_length=255)
+    scope = models.CharField(max_length=100, help_text="Endpoint the key was used on")
+    principal = models.CharField(max_length=100, blank=True, default='', help_text="Caller the key belongs to, e.g. 'user:3' or 'student:7'; blank for anonymous")
+    fingerprint = models.CharField(max_length=64, help_text="SHA-256 of the request payload")
+    
+    # Null while the original request is still being processed
+    status_code = models.IntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        constraints = [
+            # Keys are per caller, so two users sending the same key never
+            # see each other's responses
+            models.UniqueConstraint(fields=['scope', 'principal', 'key'], name='unique_idempotency_principal_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.scope}: {self.principal or 'anonymous'} {self.key}"
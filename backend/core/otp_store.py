@@ -0,0 +1,136 @@
+import hashlib
+import secrets
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from .models import OTPVerification
+
+# verify() outcomes
+OTP_VERIFIED = 'verified'
+OTP_INVALID = 'invalid'
+OTP_LOCKED = 'locked'
+
+
+def generate_otp_code():
+    """Six random digits from a CSPRNG"""
+    return f'{secrets.randbelow(10**6):06d}'
+
+
+def _ttl():
+    return timedelta(minutes=getattr(settings, 'OTP_TTL_MINUTES', 10))
+
+
+def _reset_window():
+    return timedelta(minutes=getattr(settings, 'OTP_RESET_WINDOW_MINUTES', 15))
+
+
+def _max_attempts():
+    return getattr(settings, 'OTP_MAX_ATTEMPTS', 5)
+
+
+class DatabaseOTPStore:
+    """OTPs as OTPVerification rows (the default)."""
+
+    def issue(self, email, purpose='password_reset'):
+        code = generate_otp_code()
+        OTPVerification.objects.create(
+            email=email,
+            code=code,
+            purpose=purpose,
+            expires_at=timezone.now() + _ttl(),
+        )
+        return code
+
+    def verify(self, email, code):
+        # Only the latest pending OTP counts; wrong guesses are charged to it
+        otp_record = OTPVerification.objects.filter(
+            email=email,
+            is_verified=False,
+            expires_at__gt=timezone.now()
+        ).first()
+
+        if not otp_record:
+            return OTP_INVALID
+        if otp_record.attempts >= _max_attempts():
+            return OTP_LOCKED
+        if not constant_time_compare(otp_record.code, code):
+            OTPVerification.objects.filter(pk=otp_record.pk).update(attempts=F('attempts') + 1)
+            return OTP_INVALID
+
+        updated = OTPVerification.objects.filter(
+            pk=otp_record.pk, is_verified=False, attempts__lt=_max_attempts()
+        ).update(is_verified=True)
+        return OTP_VERIFIED if updated else OTP_LOCKED
+
+    def is_verified(self, email, code):
+        # created_at > now - window, expressed on expires_at so otp_code_idx is used
+        return OTPVerification.objects.filter(
+            email=email,
+            code=code,
+            is_verified=True,
+            expires_at__gt=timezone.now() - _reset_window() + _ttl()
+        ).exists()
+
+    def consume(self, email):
+        OTPVerification.objects.filter(email=email).delete()
+
+
+class CacheOTPStore:
+    """
+    OTPs kept only in the cache, expiring through the cache's native TTL.
+
+    Verification never touches the database. Attempts are counted with an
+    atomic cache.incr(), so concurrent guesses cannot exceed the limit.
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'OTP_CACHE', 'default')]
+
+    def _key(self, kind, email):
+        return f'otp:{kind}:{hashlib.sha256(email.encode()).hexdigest()[:32]}'
+
+    def issue(self, email, purpose='password_reset'):
+        code = generate_otp_code()
+        timeout = int(_ttl().total_seconds())
+        # A new OTP replaces the old one and resets its attempt counter
+        self.cache.set_many({
+            self._key('code', email): code,
+            self._key('attempts', email): 0,
+        }, timeout=timeout)
+        return code
+
+    def verify(self, email, code):
+        stored = self.cache.get(self._key('code', email))
+        if stored is None:
+            return OTP_INVALID
+        try:
+            attempts = self.cache.incr(self._key('attempts', email))
+        except ValueError:
+            return OTP_INVALID
+        if attempts > _max_attempts():
+            return OTP_LOCKED
+        if not constant_time_compare(stored, code):
+            return OTP_INVALID
+
+        self.cache.delete_many([self._key('code', email), self._key('attempts', email)])
+        self.cache.set(self._key('verified', email), code, timeout=int(_reset_window().total_seconds()))
+        return OTP_VERIFIED
+
+    def is_verified(self, email, code):
+        verified = self.cache.get(self._key('verified', email))
+        return verified is not None and constant_time_compare(verified, code)
+
+    def consume(self, email):
+        self.cache.delete_many([
+            self._key('code', email), self._key('attempts', email), self._key('verified', email)
+        ])
+
+
+def get_otp_store():
+    """Return the store selected by OTP_STORE ('db' or 'cache')."""
+    if getattr(settings, 'OTP_STORE', 'db') == 'cache':
+        return CacheOTPStore()
+    return DatabaseOTPStore()
@@ -0,0 +1,107 @@
+import secrets
+from decimal import Decimal
+from django.db.models import Case, CharField, F, Value, When
+from django.utils import timezone
+from .caching import invalidate_current_user
+from .installments import settle_installments
+from .models import Enrollment, Payment
+
+
+def generate_receipt_number(paid_at=None):
+    """Receipt numbers like 'R20260115-9F3A1C'; uniqueness is enforced by the database"""
+    paid_at = paid_at or timezone.now()
+    return f'R{timezone.localtime(paid_at):%Y%m%d}-{secrets.token_hex(3).upper()}'
+
+
+def payment_status_after(amount):
+    """
+    UPDATE expression for Enrollment.payment_status once `amount` is added.
+
+    F() references in an UPDATE see the old row, so the new totals are
+    spelled out as old value +/- amount.
+    """
+    return Case(
+        When(balance_due__lte=Value(amount), then=Value('paid')),
+        When(amount_paid__gt=Value(-amount), then=Value('partial')),
+        default=Value('pending'),
+        output_field=CharField(),
+    )
+
+
+def apply_payment(payment):
+    """
+    Add a new ledger entry to its enrollment's materialized totals.
+
+    Called by Payment.save() inside the insert's transaction. The UPDATE
+    is relative (F() expressions), so concurrent payments against the
+    same enrollment cannot overwrite each other. Installments the new
+    total covers are marked paid.
+    """
+    Enrollment.objects.filter(pk=payment.enrollment_id).update(
+        amount_paid=F('amount_paid') + payment.amount,
+        balance_due=F('balance_due') - payment.amount,
+        payment_status=payment_status_after(payment.amount),
+        updated_at=timezone.now(),
+    )
+    settle_installments([payment.enrollment_id])
+    invalidate_current_user(payment.enrollment.student_id)
+
+
+def record_payment(enrollment, amount, mode, receipt_number='', paid_at=None, note='', recorded_by_id=None):
+    """
+    Append a payment to the ledger and update the enrollment's balances.
+
+    Corrections are new entries with a negative amount (refund or
+    adjustment mode); existing entries are never changed.
+
+    Args:
+        enrollment (Enrollment): Enrollment being paid for.
+        amount (Decimal): Amount received; negative for refunds/adjustments.
+        mode (str): One of Payment.MODE_CHOICES.
+        receipt_number (str): Receipt number; generated if omitted.
+        paid_at (datetime): When the money was received; defaults to now.
+        note (str): Free-text remark.
+        recorded_by_id (int): Staff User entering the payment.
+
+    Returns:
+        Payment: The ledger entry.
+    """
+    return Payment.objects.create(
+        enrollment=enrollment,
+        amount=Decimal(amount),
+        mode=mode,
+        receipt_number=receipt_number,
+        paid_at=paid_at or timezone.now(),
+        note=note,
+        recorded_by_id=recorded_by_id,
+    )
+
+
+def refresh_balance(enrollment):
+    """Recompute balance_due and payment_status after fee_due changes, and reload them."""
+    Enrollment.objects.filter(pk=enrollment.pk).update(
+        balance_due=F('fee_due') - F('amount_paid'),
+        payment_status=Case(
+            When(amount_paid__gte=F('fee_due'), then=Value('paid')),
+            When(amount_paid__gt=0, then=Value('partial')),
+            default=Value('pending'),
+            output_field=CharField(),
+        ),
+    )
+    enrollment.refresh_from_db(fields=Enrollment.LEDGER_FIELDS)
+
+
+def dues_queryset(**filters):
+    """
+    Enrollments that still owe money, largest balance first.
+
+    Matches the partial enrollment_dues_idx index (status, balance_due
+    where balance_due > 0), so the report reads materialized balances
+    instead of recomputing fees minus payments.
+
+    Args:
+        **filters: Extra Enrollment filters, e.g. course_id or batch_id.
+    """
+    return Enrollment.objects.filter(
+        balance_due__gt=0, status__in=Enrollment.SEAT_STATUSES, **filters
+    ).order_by('-balance_due', 'id')
@@ -0,0 +1,157 @@
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from .caching import invalidate_batch_choices
+from .models import Batch, BatchTemplate, BatchTemplateSkip
+from .timetable import room_timetables, slot_for, slots_clash
+from .utils import add_months, parse_time_slot
+
+
+def template_start_dates(template, first_day, last_day):
+    """
+    Start dates of a template's batches between two dates (inclusive),
+    following its cadence from first_start_date.
+    """
+    step = template.every_months
+    start = template.first_start_date
+    # Jump close to first_day instead of walking from the first batch
+    elapsed = (first_day.year - start.year) * 12 + first_day.month - start.month
+    number = max(0, elapsed // step - 1)
+    dates = []
+    while True:
+        day = add_months(start, number * step)
+        if day > last_day:
+            return dates
+        if day >= first_day:
+            dates.append(day)
+        number += 1
+
+
+def plan_batches(horizon_months=3, today=None, templates=None):
+    """
+    Unsaved Batch rows that active templates of active courses should have
+    from today through the horizon and do not have yet.
+
+    Existing batches, skipped dates and the rooms' timetables are read with
+    one query each. A date is left out when the template already generated
+    it, when its batch was deleted (recorded as a BatchTemplateSkip), or
+    when staff created a batch for the same course, start date and time
+    slot by hand. A date whose batch would double-book its room, against
+    an existing batch or one planned earlier in this run (older templates
+    first), is left out and reported instead.
+
+    Args:
+        horizon_months (int): How far ahead to plan.
+        today (date): First possible start date; defaults to today.
+        templates (QuerySet): Templates to plan for; all by default.
+
+    Returns:
+        tuple: (list of Batch instances ready for bulk_create, list of
+        {'name', 'room', 'clashes_with'} dicts for the room clashes left out).
+    """
+    today = today or timezone.localdate()
+    last_day = add_months(today, horizon_months)
+    if templates is None:
+        templates = BatchTemplate.objects.all()
+    templates = list(
+        templates.filter(is_active=True, course__is_active=True).select_related('course').order_by('pk')
+    )
+    if not templates:
+        return [], []
+
+    existing = set()
+    for template_id, course_id, start_date, time_slot in Batch.objects.filter(
+        course_id__in={template.course_id for template in templates},
+        start_date__gte=today, start_date__lte=last_day,
+    ).values_list('template_id', 'course_id', 'start_date', 'time_slot'):
+        existing.add(('template', template_id, start_date))
+        existing.add(('slot', course_id, start_date, time_slot.strip().lower()))
+    existing.update(
+        ('template', template_id, start_date)
+        for template_id, start_date in BatchTemplateSkip.objects.filter(
+            template__in=templates, start_date__gte=today, start_date__lte=last_day,
+        ).values_list('template_id', 'start_date')
+    )
+    timetables = room_timetables({template.room for template in templates if template.room})
+
+    batches, clashes = [], []
+    planned = defaultdict(list)
+    for template in templates:
+        weekdays, start_minute, end_minute = parse_time_slot(template.time_slot) or (0, None, None)
+        for start_date in template_start_dates(template, today, last_day):
+            if ('template', template.pk, start_date) in existing or (
+                'slot', template.course_id, start_date, template.time_slot.strip().lower()
+            ) in existing:
+                continue
+            # bulk_create skips Batch.save(), so the schedule is parsed here
+            batch = Batch(
+                name=f'{start_date:%b %Y} {template.label} Batch',
+                course=template.course,
+                template=template,
+                time_slot=template.time_slot,
+                weekdays=weekdays,
+                start_minute=start_minute,
+                end_minute=end_minute,
+                room=template.room,
+                capacity=template.capacity,
+                start_date=start_date,
+            )
+            slot = slot_for(batch) if template.room else None
+            if slot is not None:
+                clashing = timetables[template.room].clashes(slot) if template.room in timetables else []
+                clashing_planned = [other for other, other_slot in planned[template.room] if slots_clash(slot, other_slot)]
+                if clashing or clashing_planned:
+                    clashes.append({
+                        'name': batch.name,
+                        'room': template.room,
+                        'clashes_with': [
+                            *Batch.objects.filter(pk__in=clashing).values_list('name', flat=True),
+                            *(other.name for other in clashing_planned),
+                        ],
+                    })
+                    continue
+                planned[template.room].append((batch, slot))
+            batches.append(batch)
+    return batches, clashes
+
+
+def rollover_batches(horizon_months=3, today=None, templates=None):
+    """
+    Create the batches planned by plan_batches() with one bulk insert.
+
+    Idempotent: dates that already have a batch are not planned again,
+    and batch_template_start_uniq makes the insert skip rows a concurrent
+    run created first.
+
+    Returns:
+        tuple: (number of batches actually inserted, the room clashes
+        reported by plan_batches()).
+    """
+    batches, clashes = plan_batches(horizon_months, today, templates)
+    if not batches:
+        return 0, clashes
+    generated = Batch.objects.filter(
+        template_id__in={batch.template_id for batch in batches},
+        start_date__in={batch.start_date for batch in batches},
+    )
+    with transaction.atomic():
+        before = generated.count()
+        Batch.objects.bulk_create(batches, batch_size=1000, ignore_conflicts=True)
+        created = generated.count() - before
+    if created:
+        # bulk_create sends no post_save signals
+        invalidate_batch_choices()
+    return created, clashes
+
+
+def skip_template_date(template_id, start_date):
+    """
+    Remember that a template's batch for start_date was deleted, so
+    rollover does not create it again. Does nothing if the template is
+    gone as well.
+    """
+    BatchTemplateSkip.objects.bulk_create(
+        [BatchTemplateSkip(template_id=template_id, start_date=start_date)]
+        if BatchTemplate.objects.filter(pk=template_id).exists() else [],
+        ignore_conflicts=True,
+    )
@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from .models import Enrollment
+
+# Enrollments shown on a roster: everyone holding or waiting for a seat
+ROSTER_STATUSES = (*Enrollment.SEAT_STATUSES, 'waitlisted')
+
+ROSTER_COLUMNS = [
+    ('enrollment_id', 'Enrollment ID'),
+    ('student_id', 'Student ID'),
+    ('name', 'Name'),
+    ('email', 'Email'),
+    ('phone', 'Phone'),
+    ('status', 'Status'),
+    ('start_date', 'Start Date'),
+    ('progress_percentage', 'Progress %'),
+    ('payment_status', 'Payment Status'),
+    ('fee_due', 'Fee'),
+    ('amount_paid', 'Paid'),
+    ('balance_due', 'Balance'),
+]
+
+
+def _fingerprint(batch_id):
+    """
+    Changes whenever an enrollment of the batch (or its student) is added,
+    removed or updated, since every enrollment write path stamps updated_at.
+    """
+    state = Enrollment.objects.filter(batch_id=batch_id).aggregate(
+        n=Count('id'), enrollments=Max('updated_at'), students=Max('student__updated_at')
+    )
+    stamps = [f'{value.timestamp():.6f}' if value else '0' for value in (state['enrollments'], state['students'])]
+    return ':'.join([str(state['n']), *stamps])
+
+
+def batch_roster(batch):
+    """
+    Students of a batch with contact details, status, progress and
+    payment, cached per batch.
+
+    The cache key includes a fingerprint of the batch's enrollments
+    (count and latest updated_at of enrollments and students), so a hit
+    costs one aggregate query and any enrollment change rebuilds the
+    roster with one joined query. Stale entries simply expire after
+    BATCH_ROSTER_CACHE_TTL seconds.
+
+    Args:
+        batch (Batch): The batch, with its course loaded.
+
+    Returns:
+        dict: 'batch' details and 'students', a list of dicts keyed by
+        the ROSTER_COLUMNS names, ordered by name.
+    """
+    key = f'batch-roster:{batch.pk}:{_fingerprint(batch.pk)}'
+    students = cache.get(key)
+    if students is None:
+        rows = (
+            Enrollment.objects.filter(batch_id=batch.pk, status__in=ROSTER_STATUSES)
+            .order_by('student__first_name', 'student__last_name', 'id')
+            .values(
+                'id', 'student_id', 'status', 'start_date', 'progress_percentage',
+                'payment_status', 'fee_due', 'amount_paid', 'balance_due',
+                'student__first_name', 'student__last_name', 'student__email', 'student__phone',
+            )
+        )
+        students = [
+            {
+                'enrollment_id': row['id'],
+                'student_id': row['student_id'],
+                'name': f"{row['student__first_name']} {row['student__last_name']}",
+                'email': row['student__email'],
+                'phone': row['student__phone'],
+                'status': row['status'],
+                'start_date': row['start_date'].isoformat() if row['start_date'] else None,
+                'progress_percentage': row['progress_percentage'],
+                'payment_status': row['payment_status'],
+                # Same decimal strings as the other enrollment endpoints
+                **{
+                    name: None if row[name] is None else f'{row[name]:.2f}'
+                    for name in ('fee_due', 'amount_paid', 'balance_due')
+                },
+            }
+            for row in rows
+        ]
+        cache.set(key, students, timeout=getattr(settings, 'BATCH_ROSTER_CACHE_TTL', 3600))
+
+    return {
+        'batch': {
+            'id': batch.pk,
+            'name': batch.name,
+            'course': batch.course.name,
+            'course_code': batch.course.code,
+            'time_slot': batch.time_slot,
+            'room': batch.room,
+            'start_date': batch.start_date,
+            'capacity': batch.capacity,
+            'seats_taken': batch.seats_taken,
+        },
+        'students': students,
+    }
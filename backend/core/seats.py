@@ -0,0 +1,128 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .caching import invalidate_current_user
+from .models import Batch, Enrollment
+
+
+class BatchFullError(ValidationError):
+    default_detail = 'This batch has no free seats.'
+    default_code = 'batch_full'
+
+
+def reserve_seat(batch_id):
+    """
+    Take one seat in a batch if it has room.
+
+    A single conditional UPDATE: the capacity check and the increment
+    happen atomically on the batch row, so concurrent requests can never
+    push seats_taken past capacity.
+
+    Returns:
+        bool: True if a seat was reserved.
+    """
+    return Batch.objects.filter(
+        Q(capacity__isnull=True) | Q(seats_taken__lt=F('capacity')),
+        pk=batch_id,
+    ).update(seats_taken=F('seats_taken') + 1) == 1
+
+
+def promote_waitlist(batch_id):
+    """
+    Move waitlisted enrollments into free seats, oldest request first.
+
+    Returns:
+        list: IDs of the promoted enrollments.
+    """
+    promoted = []
+    with transaction.atomic():
+        while True:
+            # skip_locked lets concurrent promotions take different rows
+            candidate = Enrollment.objects.select_for_update(skip_locked=True).filter(
+                batch_id=batch_id, status='waitlisted'
+            ).order_by('enrollment_date', 'id').values_list('id', 'student_id').first()
+            if candidate is None or not reserve_seat(batch_id):
+                break
+            enrollment_id, student_id = candidate
+            Enrollment.objects.filter(pk=enrollment_id).update(status='pending', updated_at=timezone.now())
+            invalidate_current_user(student_id)
+            promoted.append(enrollment_id)
+    return promoted
+
+
+def release_seat(batch_id):
+    """Give a seat back and hand it to the waitlist in the same transaction."""
+    with transaction.atomic():
+        Batch.objects.filter(pk=batch_id, seats_taken__gt=0).update(seats_taken=F('seats_taken') - 1)
+        return promote_waitlist(batch_id)
+
+
+def release_seats(released):
+    """
+    Give back seats freed by a bulk status change, one UPDATE per batch,
+    then hand them to each batch's waitlist.
+
+    Args:
+        released (dict): Number of seats freed, keyed by batch ID.
+
+    Returns:
+        list: IDs of the promoted enrollments.
+    """
+    promoted = []
+    with transaction.atomic():
+        for batch_id, count in released.items():
+            Batch.objects.filter(pk=batch_id).update(seats_taken=Greatest(F('seats_taken') - count, 0))
+            promoted.extend(promote_waitlist(batch_id))
+    return promoted
+
+
+def claim_seat(enrollment):
+    """
+    Reconcile the seat an enrollment is about to occupy with the one it
+    holds in the database. Called from Enrollment.save() inside its
+    transaction; the stored row is locked so concurrent edits of the same
+    enrollment cannot both release its seat.
+
+    A pending enrollment for a full batch is switched to 'waitlisted';
+    any other seat-holding status raises BatchFullError.
+
+    Returns:
+        int: ID of the batch whose seat the caller must release after
+        saving, or None.
+    """
+    held = None
+    if not enrollment._state.adding:
+        stored = Enrollment.objects.select_for_update().filter(pk=enrollment.pk).values_list(
+            'batch_id', 'status'
+        ).first()
+        if stored and stored[1] in Enrollment.SEAT_STATUSES:
+            held = stored[0]
+
+    wanted = enrollment.seat_batch_id
+    if wanted == held:
+        return None
+    if wanted is not None and not reserve_seat(wanted):
+        if enrollment.status != 'pending':
+            raise BatchFullError()
+        enrollment.status = 'waitlisted'
+    return held
+
+
+def sync_seat_counts(batch_ids=None):
+    """
+    Recompute Batch.seats_taken from enrollments, e.g. after queryset
+    updates that bypassed Enrollment.save().
+
+    Args:
+        batch_ids (list): Batches to recount; all batches if None.
+
+    Returns:
+        int: Number of batches updated.
+    """
+    taken = Enrollment.objects.filter(
+        batch=OuterRef('pk'), status__in=Enrollment.SEAT_STATUSES
+    ).order_by().values('batch').annotate(n=Count('id')).values('n')
+    batches = Batch.objects.all() if batch_ids is None else Batch.objects.filter(pk__in=batch_ids)
+    return batches.update(seats_taken=Coalesce(Subquery(taken), 0))
@@ -1,5 +1,14 @@
+from functools import cached_property
 from rest_framework import serializers
-from .models import InstituteProfile, CourseCategory, Course, Student, Enrollment, ContactMessage, SeasonalOffer, Batch
+from rest_framework.validators import UniqueValidator
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from .models import (
+    InstituteProfile, CourseCategory, Course, Student, Enrollment, ContactMessage, SeasonalOffer, Batch,
+    BatchReminderRule, MessageCampaign, Payment, Installment
+)
+from .utils import normalize_email, normalize_phone
+from .timetable import room_clashes, student_clashes
 
 
 class InstituteProfileSerializer(serializers.ModelSerializer):
@@ -64,7 +73,18 @@ class CourseDetailSerializer(serializers.ModelSerializer):
         return obj.enrollments.filter(status__in=['approved', 'completed']).count()
 
 
+class NormalizedEmailField(serializers.EmailField):
+    """EmailField that lowercases before validators (e.g. uniqueness) run"""
+    
+    def to_internal_value(self, data):
+        return normalize_email(super().to_internal_value(data))
+
+
 class StudentSerializer(serializers.ModelSerializer):
+    email = NormalizedEmailField(
+        max_length=254,
+        validators=[UniqueValidator(queryset=Student.objects.all(), message='A student with this email already exists.')]
+    )
     full_name = serializers.CharField(read_only=True)
     enrolled_courses = serializers.SerializerMethodField()
     
@@ -76,14 +96,27 @@ class StudentSerializer(serializers.ModelSerializer):
             'date_of_birth', 'address', 'is_active', 'enrolled_courses'
         ]
     
+    def validate_phone(self, value):
+        # Compared in canonical form, so '98765 43210' and '+91 9876543210' collide
+        phone_e164 = normalize_phone(value)
+        others = Student.objects.filter(phone_e164=phone_e164)
+        if self.instance is not None:
+            others = others.exclude(pk=self.instance.pk)
+        if phone_e164 and others.exists():
+            raise serializers.ValidationError('A student with this phone number already exists.')
+        return value
+    
     def get_enrolled_courses(self, obj):
-        enrollments = obj.enrollments.filter(status__in=['approved', 'pending'])
-        return EnrollmentSerializer(enrollments, many=True).data
+        enrollments = EnrollmentReadSerializer.project(obj.enrollments.filter(status__in=['approved', 'pending']))
+        return EnrollmentReadSerializer(enrollments, many=True).data
 
 
 class EnrollmentSerializer(serializers.ModelSerializer):
-    batch_name = serializers.CharField(source='batch.name', read_only=True)
-    batch_time = serializers.CharField(source='batch.time_slot', read_only=True)
+    student_name = serializers.CharField(source='student.full_name', read_only=True)
+    course_name = serializers.CharField(source='course.name', read_only=True)
+    course_code = serializers.CharField(source='course.code', read_only=True)
+    batch_name = serializers.CharField(source='batch.name', read_only=True, default=None)
+    batch_time = serializers.CharField(source='batch.time_slot', read_only=True, default=None)
     
     class Meta:
         model = Enrollment
@@ -91,23 +124,109 @@ class EnrollmentSerializer(serializers.ModelSerializer):
             'id', 'student', 'student_name', 'course', 'course_name', 'course_code',
             'batch', 'batch_name', 'batch_time',
             'enrollment_date', 'start_date', 'end_date', 'status',
-            'payment_status', 'amount_paid', 'progress_percentage', 'remarks'
+            'payment_status', 'fee_due', 'amount_paid', 'balance_due', 'progress_percentage', 'remarks'
+        ]
+        # Payment totals come from the Payment ledger
+        read_only_fields = ['enrollment_date', 'payment_status', 'amount_paid', 'balance_due']
+    
+    def validate_status(self, value):
+        if self.instance is not None and value != self.instance.status and not self.instance.can_transition_to(value):
+            raise serializers.ValidationError(
+                f"Cannot change status from '{self.instance.status}' to '{value}'"
+            )
+        return value
+
+
+class EnrollmentReadSerializer(serializers.Serializer):
+    """
+    Read-only enrollment rows for listings, with the same output as
+    EnrollmentSerializer.
+
+    project() fetches exactly these fields as dicts with one query that
+    joins student, course and batch, so listings build no model
+    instances and load no relation per row.
+    """
+    id = serializers.IntegerField()
+    student = serializers.IntegerField(source='student_id')
+    student_name = serializers.CharField()
+    course = serializers.IntegerField(source='course_id')
+    course_name = serializers.CharField()
+    course_code = serializers.CharField()
+    batch = serializers.IntegerField(source='batch_id', allow_null=True)
+    batch_name = serializers.CharField(allow_null=True)
+    batch_time = serializers.CharField(allow_null=True)
+    enrollment_date = serializers.DateTimeField()
+    start_date = serializers.DateField(allow_null=True)
+    end_date = serializers.DateField(allow_null=True)
+    status = serializers.CharField()
+    payment_status = serializers.CharField()
+    fee_due = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    amount_paid = serializers.DecimalField(max_digits=10, decimal_places=2)
+    balance_due = serializers.DecimalField(max_digits=10, decimal_places=2)
+    progress_percentage = serializers.IntegerField()
+    remarks = serializers.CharField()
+    
+    @cached_property
+    def _columns(self):
+        # (output name, row key, formatter); only dates and decimals need formatting
+        formatted = (serializers.DateField, serializers.DateTimeField, serializers.DecimalField)
+        return [
+            (name, field.source, field.to_representation if isinstance(field, formatted) else None)
+            for name, field in self.fields.items()
         ]
-        read_only_fields = ['enrollment_date']
+    
+    def to_representation(self, row):
+        data = {}
+        for name, key, formatter in self._columns:
+            value = row[key]
+            data[name] = formatter(value) if formatter is not None and value is not None else value
+        return data
+    
+    @staticmethod
+    def project(queryset):
+        """Narrow an Enrollment queryset to the listed columns, joined in one query"""
+        return queryset.values(
+            'id', 'student_id', 'course_id', 'batch_id', 'enrollment_date', 'start_date', 'end_date',
+            'status', 'payment_status', 'fee_due', 'amount_paid', 'balance_due', 'progress_percentage', 'remarks',
+            student_name=Concat('student__first_name', Value(' '), 'student__last_name'),
+            course_name=F('course__name'),
+            course_code=F('course__code'),
+            batch_name=F('batch__name'),
+            batch_time=F('batch__time_slot'),
+        )
+
+
+class EnrollmentTransitionSerializer(serializers.Serializer):
+    """Bulk status change for explicit enrollment IDs and/or a batch/course filter"""
+    status = serializers.ChoiceField(choices=[
+        choice for choice in Enrollment.STATUS_CHOICES
+        if any(choice[0] in targets for targets in Enrollment.ALLOWED_TRANSITIONS.values())
+    ])
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    batch = serializers.IntegerField(required=False)
+    course = serializers.IntegerField(required=False)
+    from_status = serializers.ChoiceField(choices=Enrollment.STATUS_CHOICES, required=False)
+    skip_invalid = serializers.BooleanField(default=False)
+    notify = serializers.BooleanField(default=True)
+    
+    def validate(self, data):
+        if not any(key in data for key in ('ids', 'batch', 'course')):
+            raise serializers.ValidationError("Provide ids, batch or course to select enrollments")
+        return data
 
 
 class EnrollmentCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating new enrollments"""
     class Meta:
         model = Enrollment
-        fields = ['student', 'course']
+        fields = ['student', 'course', 'batch']
     
     def validate(self, data):
         # Check if student is already enrolled in this course
         if Enrollment.objects.filter(
             student=data['student'],
             course=data['course'],
-            status__in=['pending', 'approved']
+            status__in=['pending', 'approved', 'waitlisted']
         ).exists():
             raise serializers.ValidationError("Student is already enrolled in this course")
         
@@ -115,6 +234,34 @@ class EnrollmentCreateSerializer(serializers.ModelSerializer):
         if not data['course'].enrollment_open:
             raise serializers.ValidationError("Enrollment is not open for this course")
         
+        # Seats are reserved (or the enrollment waitlisted) atomically on save
+        batch = data.get('batch')
+        if batch is not None and (batch.course_id != data['course'].id or not batch.is_active):
+            raise serializers.ValidationError("Batch is not open for this course")
+        
+        if batch is not None:
+            clashing = student_clashes(data['student'].pk, batch)
+            if clashing:
+                names = ', '.join(Batch.objects.filter(pk__in=clashing).values_list('name', flat=True))
+                raise serializers.ValidationError(f"Batch timing clashes with the student's other batch: {names}")
+        
+        return data
+
+
+class BulkEnrollmentSerializer(serializers.Serializer):
+    """A list of students for one course (and batch); checked once for the whole list"""
+    course = serializers.PrimaryKeyRelatedField(queryset=Course.objects.all())
+    batch = serializers.PrimaryKeyRelatedField(queryset=Batch.objects.all(), required=False, allow_null=True)
+    students = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000
+    )
+    
+    def validate(self, data):
+        if not data['course'].enrollment_open:
+            raise serializers.ValidationError("Enrollment is not open for this course")
+        batch = data.get('batch')
+        if batch is not None and (batch.course_id != data['course'].id or not batch.is_active):
+            raise serializers.ValidationError("Batch is not open for this course")
         return data
 
 
@@ -134,15 +281,132 @@ class SeasonalOfferSerializer(serializers.ModelSerializer):
 class BatchSerializer(serializers.ModelSerializer):
     course_name = serializers.CharField(source='course.name', read_only=True)
     course_code = serializers.CharField(source='course.code', read_only=True)
+    seats_available = serializers.IntegerField(read_only=True)
     student_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Batch
         fields = [
             'id', 'name', 'course', 'course_name', 'course_code',
-            'time_slot', 'start_date', 'is_active', 'student_count', 'created_at'
+            'time_slot', 'weekdays', 'start_minute', 'end_minute', 'room', 'start_date', 'is_active',
+            'capacity', 'seats_taken', 'seats_available', 'student_count', 'created_at'
         ]
-        read_only_fields = ['created_at']
+        read_only_fields = ['weekdays', 'start_minute', 'end_minute', 'seats_taken', 'created_at']
         
     def get_student_count(self, obj):
         return obj.enrollments.count()
+    
+    def validate(self, data):
+        # Check the room is free, against the batch as it would be saved
+        batch = Batch(pk=self.instance.pk if self.instance else None)
+        for field in ('course', 'time_slot', 'start_date', 'room', 'is_active'):
+            setattr(batch, field, data.get(field, getattr(self.instance, field, None)))
+        if batch.is_active is not False and batch.room:
+            clashing = room_clashes(batch)
+            if clashing:
+                names = ', '.join(Batch.objects.filter(pk__in=clashing).values_list('name', flat=True))
+                raise serializers.ValidationError({'room': f"{batch.room} is already booked at this time by: {names}"})
+        return data
+
+
+class BatchProgressSerializer(serializers.Serializer):
+    """Either explicit {enrollment_id: progress} values or one increment for the whole batch"""
+    progress = serializers.DictField(
+        child=serializers.IntegerField(min_value=0, max_value=100), required=False, allow_empty=False
+    )
+    increment = serializers.IntegerField(min_value=-100, max_value=100, required=False)
+    
+    def validate_progress(self, value):
+        try:
+            return {int(enrollment_id): progress for enrollment_id, progress in value.items()}
+        except (TypeError, ValueError):
+            raise serializers.ValidationError("Keys must be enrollment IDs")
+    
+    def validate(self, data):
+        if ('progress' in data) == ('increment' in data):
+            raise serializers.ValidationError("Provide either progress or increment")
+        return data
+
+
+class PaymentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Payment
+        fields = ['id', 'enrollment', 'amount', 'mode', 'receipt_number', 'paid_at', 'note', 'recorded_by', 'created_at']
+        read_only_fields = ['recorded_by', 'created_at']
+        extra_kwargs = {
+            'receipt_number': {'required': False},
+            'paid_at': {'required': False},
+        }
+    
+    def validate(self, data):
+        if data['amount'] == 0:
+            raise serializers.ValidationError("Amount cannot be zero")
+        if data['amount'] < 0 and data['mode'] not in Payment.CREDIT_MODES:
+            raise serializers.ValidationError("Negative amounts are only allowed for refunds and adjustments")
+        if data['mode'] == 'refund' and data['amount'] > 0:
+            raise serializers.ValidationError("Refunds must be negative amounts")
+        return data
+
+
+class InstallmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Installment
+        fields = ['id', 'enrollment', 'sequence', 'due_date', 'amount', 'status', 'paid_at', 'reminded_at']
+        read_only_fields = fields
+
+
+class InstallmentPlanSerializer(serializers.Serializer):
+    """Options for generating an enrollment's installment plan"""
+    count = serializers.IntegerField(min_value=1, max_value=60, required=False)
+    first_due = serializers.DateField(required=False)
+
+
+class BulkAudienceSerializer(serializers.Serializer):
+    """Server-side audience filter for bulk messaging"""
+    course = serializers.IntegerField(required=False)
+    batch = serializers.IntegerField(required=False)
+    enrollment_status = serializers.ChoiceField(choices=Enrollment.STATUS_CHOICES, required=False)
+    payment_status = serializers.ChoiceField(choices=Enrollment.PAYMENT_STATUS_CHOICES, required=False)
+    is_active = serializers.BooleanField(required=False, allow_null=True, default=None)
+    registered_from = serializers.DateField(required=False)
+    registered_to = serializers.DateField(required=False)
+    all_students = serializers.BooleanField(required=False, default=False)
+    
+    FILTER_FIELDS = ['course', 'batch', 'enrollment_status', 'payment_status',
+                     'is_active', 'registered_from', 'registered_to']
+    
+    def validate(self, data):
+        start, end = data.get('registered_from'), data.get('registered_to')
+        if start and end and start > end:
+            raise serializers.ValidationError("registered_from must be on or before registered_to")
+        # An empty filter matches every student; make that explicit
+        if not data['all_students'] and all(data.get(name) is None for name in self.FILTER_FIELDS):
+            raise serializers.ValidationError("Set at least one filter, or all_students: true to message every student")
+        return data
+
+
+class MessageCampaignSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MessageCampaign
+        fields = [
+            'id', 'name', 'message_type', 'subject', 'content', 'audience', 'send_at',
+            'reminder_rule', 'batch', 'status', 'sent_at', 'recipient_count', 'last_error', 'created_at'
+        ]
+        read_only_fields = [
+            'reminder_rule', 'batch', 'status', 'sent_at', 'recipient_count', 'last_error', 'created_at'
+        ]
+    
+    def validate_audience(self, value):
+        # Stored as raw JSON; re-validated by the scheduler at send time
+        BulkAudienceSerializer(data=value).is_valid(raise_exception=True)
+        return value
+
+
+class BatchReminderRuleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BatchReminderRule
+        fields = [
+            'id', 'name', 'days_before', 'send_time', 'enrollment_status',
+            'message_type', 'subject', 'content', 'is_active', 'created_at'
+        ]
+        read_only_fields = ['created_at']
@@ -0,0 +1,66 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .analytics import recount_enrollment_buckets, recount_moved_enrollment
+from .caching import invalidate_batch_choices, invalidate_current_user
+from .models import Course, Student, Enrollment, Batch
+from .rollover import skip_template_date
+from .seats import promote_waitlist, release_seat
+
+
+@receiver([post_save, post_delete], sender=Student)
+def student_changed(sender, instance, **kwargs):
+    invalidate_current_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def enrollment_changed(sender, instance, **kwargs):
+    invalidate_current_user(instance.student_id)
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    if instance.seat_batch_id:
+        release_seat(instance.seat_batch_id)
+    # A deleted row leaves no updated_at for the incremental rollup to find
+    bucket = (timezone.localdate(instance.enrollment_date), instance.course_id)
+    transaction.on_commit(lambda: recount_enrollment_buckets([bucket]))
+
+
+@receiver(pre_save, sender=Enrollment)
+def enrollment_course_changing(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding or (update_fields is not None and not {'course', 'course_id'} & set(update_fields)):
+        return
+    old_course_id = getattr(instance, '_loaded_course_id', None)
+    if old_course_id is None:
+        old_course_id = Enrollment.objects.filter(pk=instance.pk).values_list('course_id', flat=True).first()
+    if old_course_id is None or old_course_id == instance.course_id:
+        return
+    # The old course's buckets would otherwise keep counting this enrollment
+    args = (instance.pk, instance.enrollment_date, [old_course_id, instance.course_id])
+    transaction.on_commit(lambda: recount_moved_enrollment(*args))
+
+
+@receiver([post_save, post_delete], sender=Batch)
+@receiver([post_save, post_delete], sender=Course)
+def batch_choices_changed(sender, instance, **kwargs):
+    # Admin batch filters show "name (course code)"
+    invalidate_batch_choices()
+
+
+@receiver(post_delete, sender=Batch)
+def batch_deleted(sender, instance, **kwargs):
+    # Rollover would otherwise generate the deleted intake again
+    if instance.template_id:
+        args = (instance.template_id, instance.start_date)
+        transaction.on_commit(lambda: skip_template_date(*args))
+
+
+@receiver(post_save, sender=Batch)
+def batch_changed(sender, instance, created, **kwargs):
+    # Batch name/time slot appear in the enrolled students' payloads
+    if not created:
+        invalidate_current_user(*instance.enrollments.values_list('student_id', flat=True))
+        # Capacity may have been raised
+        promote_waitlist(instance.pk)
@@ -1,3 +1,1311 @@
-from django.test import TestCase
+import importlib
+import os
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.hashers import MD5PasswordHasher, PBKDF2PasswordHasher
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from institute_system import settings as project_settings
+from . import mail_queue
+from .admin import EnrollmentAdminForm
+from .analytics import refresh_rollups
+from .backends import authenticate_identity
+from .bulk_enrollment import bulk_enroll
+from .caching import current_user_cache_key, get_current_user_payload
+from .hashers import check_student_password, make_student_password
+from .installments import create_installment_plans, scan_overdue_installments, send_overdue_reminders
+from .messaging import (
+    claim_due_campaigns, expand_reminder_rules, resolve_audience, send_bulk_email, send_campaign,
+)
+from .models import (
+    Batch, BatchReminderRule, BatchTemplate, BatchTemplateSkip, Course, CourseCategory, Enrollment,
+    EnrollmentDailyStat, IdempotencyRecord, Installment, MessageCampaign, OTPVerification, RevenueDailyStat,
+    Student,
+)
+from .otp_store import OTP_VERIFIED, get_otp_store
+from .payments import record_payment
+from .rollover import rollover_batches
+from .roster import batch_roster
+from .seats import BatchFullError, sync_seat_counts
+from .serializers import (
+    EnrollmentCreateSerializer, EnrollmentReadSerializer, EnrollmentSerializer, StudentSerializer
+)
+from .throttling import LoginThrottle
+from .transitions import transition_enrollments
+from .utils import add_months, normalize_phone, parse_time_slot
 
-# Create your tests here.
+
+def make_course(code='TST', fees=1000, **extra):
+    category, _ = CourseCategory.objects.get_or_create(
+        slug='test', defaults={'name': 'Test', 'duration_info': '3 Months'}
+    )
+    return Course.objects.create(
+        name=f'Course {code}', code=code, category=category, duration='3 Months', duration_months=3,
+        fees=fees, objective='-', target_audience='-', **extra
+    )
+
+
+def make_batch(course, capacity=None, **extra):
+    return Batch.objects.create(**{
+        'name': f'{course.code} batch', 'course': course, 'time_slot': 'Mon-Fri 10:00 AM - 12:00 PM',
+        'start_date': timezone.localdate() + timedelta(days=30), 'capacity': capacity, **extra,
+    })
+
+
+def make_students(count, prefix='student'):
+    return [
+        Student.objects.create(first_name='Test', last_name=str(i), email=f'{prefix}{i}@example.com')
+        for i in range(count)
+    ]
+
+
+def seat_state(batch):
+    """(seats_taken, seated enrollments, waitlisted enrollments) of a batch"""
+    batch.refresh_from_db()
+    counts = Counter(Enrollment.objects.filter(batch=batch).values_list('status', flat=True))
+    return batch.seats_taken, sum(counts[s] for s in Enrollment.SEAT_STATUSES), counts['waitlisted']
+
+
+class BulkMessagingTests(TestCase):
+    def test_chunks_are_sent_in_bcc(self):
+        students = make_students(5)
+        sent = send_bulk_email(Student.objects.all(), 'Hello', 'Body', chunk_size=2)
+        self.assertEqual(sent, 5)
+        self.assertEqual([len(message.bcc) for message in mail.outbox], [2, 2, 1])
+        self.assertEqual(
+            sorted(email for message in mail.outbox for email in message.bcc),
+            sorted(student.email for student in students),
+        )
+        for message in mail.outbox:
+            self.assertEqual(message.to, [message.from_email])
+            self.assertNotIn('@example.com', message.message()['To'])
+            self.assertIsNone(message.message()['Bcc'])
+
+    def test_audience_filters_select_matching_students(self):
+        course, other = make_course(), make_course(code='OTH')
+        students = make_students(3)
+        Enrollment.objects.create(student=students[0], course=course)
+        Enrollment.objects.create(student=students[1], course=other)
+        Student.objects.filter(pk__in=[students[0].pk, students[1].pk]).update(is_active=True)
+        self.assertEqual(list(resolve_audience({'course': course.pk})), [students[0]])
+        self.assertEqual(set(resolve_audience({'is_active': True})), set(students[:2]))
+
+
+class PhoneNormalizationTests(TestCase):
+    def test_normalize_phone(self):
+        cases = {
+            '98765 43210': '+919876543210',
+            '+91 98765-43210': '+919876543210',
+            '09876543210': '+919876543210',
+            '919876543210': '+919876543210',
+            '0091 98765 43210': '+919876543210',
+            'whatsapp:+14155238886': '+14155238886',
+            '12345': '',
+            'call me': '',
+            '': '',
+        }
+        for raw, e164 in cases.items():
+            self.assertEqual(normalize_phone(raw), e164, raw)
+        self.assertEqual(normalize_phone('020 7946 0958', default_country_code='44'), '+442079460958')
+
+    def test_duplicate_phone_is_rejected(self):
+        student = make_students(1)[0]
+        student.phone = '98765 43210'
+        student.save()
+        data = {'first_name': 'New', 'last_name': 'Student', 'email': 'new@example.com', 'phone': '+91 9876543210'}
+        serializer = StudentSerializer(data=data)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('phone', serializer.errors)
+        # Saving the student's own number again is fine
+        self.assertTrue(StudentSerializer(student, data={'phone': '09876543210'}, partial=True).is_valid())
+
+        response = APIClient().post('/api/auth/register/', {**data, 'password': 'secret123'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Student.objects.filter(email='new@example.com').exists())
+
+    def test_duplicate_report(self):
+        students = make_students(3)
+        for student, phone in zip(students, ['9876543210', '+91 98765 43210', '9123456780']):
+            student.phone = phone
+            student.save()
+        out = StringIO()
+        call_command('report_duplicate_phones', stdout=out)
+        self.assertIn(f'+919876543210  #{students[0].pk}', out.getvalue())
+        self.assertIn(f'+919876543210  #{students[1].pk}', out.getvalue())
+        self.assertNotIn('+919123456780', out.getvalue())
+        self.assertIn('1 phone number(s)', out.getvalue())
+
+
+@override_settings(CAMPAIGN_CLAIM_TIMEOUT=600)
+class CampaignSchedulerTests(TestCase):
+    def setUp(self):
+        self.course = make_course()
+        self.batch = make_batch(self.course, start_date=timezone.localdate() + timedelta(days=3))
+        self.student = make_students(1)[0]
+        Enrollment.objects.create(student=self.student, course=self.course, batch=self.batch, status='approved')
+
+    def campaign(self, **extra):
+        return MessageCampaign.objects.create(**{
+            'name': 'Welcome', 'subject': 'Hi', 'content': 'Body', 'audience': {'batch': self.batch.pk},
+            'send_at': timezone.now() - timedelta(minutes=1), **extra,
+        })
+
+    def test_reminder_rules_expand_once_per_batch(self):
+        BatchReminderRule.objects.create(
+            name='Starts soon', days_before=5, subject='{course_name} starts {start_date}', content='See you',
+        )
+        self.assertEqual(expand_reminder_rules(), 1)
+        self.assertEqual(expand_reminder_rules(), 0)
+        campaign = MessageCampaign.objects.get()
+        self.assertEqual(campaign.subject, f'{self.course.name} starts {self.batch.start_date:%d %b %Y}')
+        self.assertEqual(campaign.audience, {'batch': self.batch.pk, 'enrollment_status': 'approved'})
+
+    def test_due_campaigns_are_claimed_once(self):
+        due = self.campaign()
+        self.campaign(send_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(claim_due_campaigns(), [due])
+        self.assertEqual(claim_due_campaigns(), [])
+
+    def test_stale_claims_are_claimed_again(self):
+        stale = self.campaign(status='sending', claimed_at=timezone.now() - timedelta(minutes=11))
+        self.campaign(status='sending', claimed_at=timezone.now() - timedelta(minutes=9))
+        self.assertEqual(claim_due_campaigns(), [stale])
+
+    def test_send_records_the_outcome(self):
+        campaign = self.campaign()
+        self.assertEqual(send_campaign(campaign), 1)
+        campaign.refresh_from_db()
+        self.assertEqual((campaign.status, campaign.recipient_count), ('sent', 1))
+        self.assertEqual(mail.outbox[0].bcc, [self.student.email])
+
+        failing = self.campaign(name='Failing')
+        with mock.patch('core.messaging.send_bulk_email', side_effect=OSError('SMTP down')):
+            with self.assertRaises(OSError), self.assertLogs('core.messaging', 'ERROR'):
+                send_campaign(failing)
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.last_error), ('failed', 'SMTP down'))
+
+    def test_campaign_api_is_staff_only(self):
+        client = APIClient()
+        data = {'name': 'All', 'content': 'Body', 'audience': {'all_students': True}, 'send_at': timezone.now()}
+        self.assertIn(client.post('/api/campaigns/', data, format='json').status_code, (401, 403))
+        self.assertIn(client.get('/api/reminder-rules/').status_code, (401, 403))
+        self.assertFalse(MessageCampaign.objects.exists())
+
+        client.force_authenticate(User.objects.create_user('staff', password='x', is_staff=True))
+        self.assertEqual(client.post('/api/campaigns/', data, format='json').status_code, 201)
+
+
+@override_settings(MAIL_QUEUE_ENABLED=False)
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.course = make_course()
+        self.student = make_students(1)[0]
+        self.data = {'student': self.student.pk, 'course': self.course.pk}
+
+    def post(self, data, key='key-1'):
+        return self.client.post('/api/enrollments/', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.post(self.data)
+        retry = self.post(self.data)
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Enrollment.objects.count(), 1)
+
+    def test_key_reused_with_a_different_payload_is_rejected(self):
+        self.post(self.data)
+        other = make_course(code='OTH')
+        response = self.post({**self.data, 'course': other.pk})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Enrollment.objects.count(), 1)
+
+    def test_in_flight_key_conflicts_until_its_lease_expires(self):
+        self.post(self.data)
+        IdempotencyRecord.objects.update(status_code=None, response_body=None)
+        self.assertEqual(self.post(self.data).status_code, 409)
+
+        # The worker died mid-request; once the lease is over the retry runs for real
+        IdempotencyRecord.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        Enrollment.objects.all().delete()
+        response = self.post(self.data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyRecord.objects.get().status_code, 201)
+        self.assertEqual(Enrollment.objects.count(), 1)
+
+    def test_requests_without_a_key_are_not_recorded(self):
+        self.client.post('/api/enrollments/', self.data, format='json')
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+    def test_keys_are_scoped_to_the_caller(self):
+        staff = [User.objects.create_user(name, password='x', is_staff=True) for name in ('first', 'second')]
+        other = make_students(1, prefix='other')[0]
+        self.client.force_authenticate(staff[0])
+        first = self.post(self.data)
+        # The same key from another user is a new request, not a replay
+        self.client.force_authenticate(staff[1])
+        second = self.post({**self.data, 'student': other.pk})
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertNotIn('Idempotent-Replayed', second)
+        self.assertEqual(
+            sorted(IdempotencyRecord.objects.values_list('principal', flat=True)),
+            [f'user:{staff[0].pk}', f'user:{staff[1].pk}'],
+        )
+        self.assertEqual(Enrollment.objects.count(), 2)
+
+
+@override_settings(MAIL_QUEUE_ENABLED=True, MAIL_QUEUE_MAX_RETRIES=0, RATE_LIMIT_ENABLED=False)
+class MailQueueTests(TestCase):
+    def setUp(self):
+        # A fresh queue per test; workers started by earlier tests stay
+        # blocked on their own queue
+        for name, value in (('_queue', None), ('_workers', []), ('_stats', dict(mail_queue._stats))):
+            patcher = mock.patch.object(mail_queue, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('core.mail_queue.atexit.register')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stats(self, *names):
+        stats = mail_queue.get_mail_queue_stats()
+        return tuple(stats[name] for name in names)
+
+    def test_queued_emails_are_delivered(self):
+        sent_before, = self.stats('sent')
+        self.assertTrue(mail_queue.enqueue_email('Hello', 'Body', ['a@example.com']))
+        mail_queue._queue.join()
+        self.assertEqual([message.to for message in mail.outbox], [['a@example.com']])
+        self.assertEqual(self.stats('sent'), (sent_before + 1,))
+
+    @override_settings(MAIL_QUEUE_WORKERS=0, MAIL_QUEUE_MAXSIZE=1)
+    def test_full_queue_drops_the_email(self):
+        dropped_before, = self.stats('dropped')
+        self.assertTrue(mail_queue.enqueue_email('First', 'Body', ['a@example.com']))
+        with self.assertLogs('core.mail_queue', 'ERROR'):
+            self.assertFalse(mail_queue.enqueue_email('Second', 'Body', ['b@example.com']))
+        self.assertEqual(self.stats('dropped', 'queue_depth'), (dropped_before + 1, 1))
+
+    @override_settings(MAIL_QUEUE_WORKERS=0, MAIL_QUEUE_MAXSIZE=1)
+    def test_otp_request_fails_when_the_email_is_dropped(self):
+        make_students(1)
+        mail_queue.enqueue_email('Backlog', 'Body', ['a@example.com'])
+        with self.assertLogs('core.mail_queue', 'ERROR'):
+            response = APIClient().post('/api/auth/request-otp/', {'email': 'student0@example.com'}, format='json')
+        self.assertEqual(response.status_code, 503)
+
+    def test_worker_survives_a_failed_send(self):
+        sent_before, failed_before = self.stats('sent', 'failed')
+        with mock.patch('core.mail_queue.send_mail', side_effect=[OSError('SMTP down'), 1]) as send_mail:
+            with self.assertLogs('core.mail_queue', 'ERROR'):
+                mail_queue.enqueue_email('First', 'Body', ['a@example.com'])
+                mail_queue.enqueue_email('Second', 'Body', ['b@example.com'])
+                mail_queue._queue.join()
+        self.assertEqual(send_mail.call_count, 2)
+        self.assertEqual(self.stats('sent', 'failed'), (sent_before + 1, failed_before + 1))
+
+    def test_unexpected_errors_do_not_kill_the_worker(self):
+        with mock.patch('core.mail_queue._deliver', side_effect=[RuntimeError('bug'), True]):
+            with self.assertLogs('core.mail_queue', 'ERROR'):
+                mail_queue.enqueue_email('First', 'Body', ['a@example.com'])
+                mail_queue.enqueue_email('Second', 'Body', ['b@example.com'])
+                mail_queue._queue.join()
+        self.assertTrue(all(worker.is_alive() for worker in mail_queue._workers))
+
+
+@override_settings(STUDENT_SCRYPT_WORK_FACTOR=2**4)
+class StudentPasswordHashingTests(TestCase):
+    def setUp(self):
+        self.student = make_students(1)[0]
+
+    def test_round_trip(self):
+        encoded = make_student_password('secret123')
+        self.assertTrue(encoded.startswith('scrypt$16$'))
+        self.assertTrue(check_student_password('secret123', encoded))
+        self.assertFalse(check_student_password('wrong', encoded))
+        self.assertFalse(check_student_password('secret123', '!unusable'))
+
+    def test_legacy_hash_is_upgraded_on_login(self):
+        legacy = PBKDF2PasswordHasher().encode('secret123', 'saltsalt', iterations=1000)
+        Student.objects.filter(pk=self.student.pk).update(password=legacy)
+        self.assertEqual(authenticate_identity('student0@example.com', 'wrong'), (None, None))
+        self.assertEqual(Student.objects.get(pk=self.student.pk).password, legacy)
+
+        kind, account = authenticate_identity('student0@example.com', 'secret123')
+        self.assertEqual((kind, account), ('student', self.student))
+        upgraded = Student.objects.get(pk=self.student.pk).password
+        self.assertTrue(upgraded.startswith('scrypt$16$'))
+        self.assertEqual(authenticate_identity('student0@example.com', 'secret123').kind, 'student')
+
+    def test_raised_work_factor_upgrades_on_login(self):
+        self.student.set_password('secret123')
+        self.student.save()
+        with self.settings(STUDENT_SCRYPT_WORK_FACTOR=2**5):
+            self.assertTrue(self.student.check_password('secret123'))
+        self.assertTrue(Student.objects.get(pk=self.student.pk).password.startswith('scrypt$32$'))
+
+
+@override_settings(
+    STUDENT_SCRYPT_WORK_FACTOR=2**4, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']
+)
+class IdentityResolutionTests(TestCase):
+    def setUp(self):
+        self.student = make_students(1)[0]
+        self.student.phone = '98765 43210'
+        self.student.set_password('student-pass')
+        self.student.save()
+        self.staff = User.objects.create_user('admin', password='staff-pass', is_staff=True)
+
+    def test_student_by_email_or_phone(self):
+        for identifier in ('Student0@Example.com', '9876543210', '+91 98765-43210', '09876543210'):
+            with self.assertNumQueries(1):
+                result = authenticate_identity(identifier, 'student-pass')
+            self.assertEqual(result, ('student', self.student), identifier)
+        self.assertEqual(authenticate_identity('9876543210', 'wrong'), (None, None))
+
+    def test_shared_phone_matches_nobody(self):
+        other = make_students(1, prefix='sibling')[0]
+        Student.objects.filter(pk=other.pk).update(phone_e164=self.student.phone_e164)
+        self.assertEqual(authenticate_identity('9876543210', 'student-pass'), (None, None))
+
+    def test_staff_by_username(self):
+        # Not an email or phone number, so no student lookup
+        with self.assertNumQueries(1):
+            self.assertEqual(authenticate_identity('admin', 'staff-pass'), ('staff', self.staff))
+        self.assertEqual(authenticate_identity('admin', 'wrong'), (None, None))
+        User.objects.create_user('plain', password='user-pass')
+        self.assertEqual(authenticate_identity('plain', 'user-pass'), (None, None))
+
+    def test_student_takes_precedence_over_staff(self):
+        User.objects.create_user('student0@example.com', password='staff-pass', is_staff=True)
+        self.assertEqual(authenticate_identity('student0@example.com', 'staff-pass'), (None, None))
+        self.assertEqual(authenticate_identity('student0@example.com', 'student-pass').kind, 'student')
+
+    def test_unknown_identifier_checks_one_dummy_hash(self):
+        with mock.patch('core.backends.check_student_password', return_value=False) as check:
+            self.assertEqual(authenticate_identity('nobody@example.com', 'pass'), (None, None))
+        check.assert_called_once()
+
+
+@override_settings(RATE_LIMITS={'login': {'ip': '4/60', 'identity': '2/60'}})
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        caches['ratelimit'].clear()
+        self.client = APIClient()
+
+    def login(self, email, ip='10.0.0.1', **extra):
+        return self.client.post(
+            '/api/auth/login/', {'email': email, 'password': 'wrong'}, format='json', REMOTE_ADDR=ip, **extra
+        )
+
+    def test_identity_limit(self):
+        self.assertEqual([self.login('a@example.com').status_code for _ in range(2)], [401, 401])
+        response = self.login('A@Example.com ', ip='10.0.0.2')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(self.login('b@example.com').status_code, 401)
+
+    def test_ip_limit(self):
+        statuses = [self.login(f'user{i}@example.com').status_code for i in range(5)]
+        self.assertEqual(statuses, [401, 401, 401, 401, 429])
+        self.assertEqual(self.login('other@example.com', ip='10.0.0.2').status_code, 401)
+
+    def test_forwarded_client_ip_behind_one_proxy(self):
+        with self.settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            for i in range(4):
+                self.login(f'user{i}@example.com', HTTP_X_FORWARDED_FOR='203.0.113.1')
+            self.assertEqual(self.login('x@example.com', HTTP_X_FORWARDED_FOR='203.0.113.1').status_code, 429)
+            # Same proxy address, different client
+            self.assertEqual(self.login('y@example.com', HTTP_X_FORWARDED_FOR='203.0.113.2').status_code, 401)
+
+    @override_settings(RATE_LIMITS={'login': {'identity': '2/60'}})
+    def test_window_slides(self):
+        factory = APIRequestFactory()
+
+        def allowed(email, at):
+            request = Request(factory.post('/', {'email': email}, format='json'), parsers=[JSONParser()])
+            with mock.patch('core.throttling.time.time', return_value=at):
+                throttle = LoginThrottle()
+                return throttle.allow_request(request, None), throttle.wait()
+
+        start = 6000.0  # a window boundary for 60-second windows
+        self.assertEqual([allowed('a@example.com', start)[0], allowed('a@example.com', start + 1)[0]], [True, True])
+        # Over the limit until the third request decays out of the window (~41s)
+        is_allowed, wait = allowed('a@example.com', start + 59)
+        self.assertFalse(is_allowed)
+        self.assertAlmostEqual(wait, 41, delta=1)
+        self.assertTrue(allowed('a@example.com', start + 110)[0])
+
+        # A burst at the end of one window still counts just after the boundary,
+        # where a fixed window would have reset
+        self.assertEqual([allowed('b@example.com', start + 58)[0], allowed('b@example.com', start + 59)[0]], [True, True])
+        self.assertFalse(allowed('b@example.com', start + 61)[0])
+
+    @override_settings(STUDENT_SCRYPT_WORK_FACTOR=2**4)
+    def test_login_benchmark_is_not_throttled(self):
+        out = StringIO()
+        with mock.patch('core.management.commands.benchmark_login.PBKDF2PasswordHasher', MD5PasswordHasher):
+            call_command(
+                'benchmark_login', '--work-factors', '4', '--iterations', '12', '--threads', '1', '--endpoint',
+                stdout=out,
+            )
+        self.assertNotIn('Login failed', out.getvalue())
+        self.assertIn('/auth/login/ end-to-end', out.getvalue())
+
+
+class SessionSettingsTests(TestCase):
+    def load_settings(self, **env):
+        """Re-evaluate the settings module under the given environment"""
+        self.addCleanup(importlib.reload, project_settings)
+        with mock.patch.dict(os.environ, env):
+            return importlib.reload(project_settings)
+
+    def test_cached_db_sessions_only_with_a_shared_cache(self):
+        local = self.load_settings(CACHE_BACKEND='django.core.cache.backends.locmem.LocMemCache')
+        self.assertEqual(local.SESSION_ENGINE, 'django.contrib.sessions.backends.db')
+        shared = self.load_settings(CACHE_BACKEND='django.core.cache.backends.redis.RedisCache')
+        self.assertEqual(shared.SESSION_ENGINE, 'django.contrib.sessions.backends.cached_db')
+        explicit = self.load_settings(
+            CACHE_BACKEND='django.core.cache.backends.redis.RedisCache',
+            SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+        )
+        self.assertEqual(explicit.SESSION_ENGINE, 'django.contrib.sessions.backends.signed_cookies')
+
+    def test_purge_deletes_only_expired_sessions(self):
+        now = timezone.now()
+        for key, days in (('old1', -1), ('old2', -2), ('live', 1)):
+            Session.objects.create(session_key=key, session_data='', expire_date=now + timedelta(days=days))
+        out = StringIO()
+        call_command('purge_expired_sessions', '--batch-size', '1', stdout=out)
+        self.assertIn('Deleted 2 expired session(s)', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+
+
+@override_settings(
+    MAIL_QUEUE_ENABLED=False, RATE_LIMIT_ENABLED=False, OTP_MAX_ATTEMPTS=3, STUDENT_SCRYPT_WORK_FACTOR=2**4
+)
+class PasswordResetOTPTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.client = APIClient()
+        self.student = make_students(1)[0]
+        self.email = self.student.email
+
+    def request_code(self):
+        response = self.client.post('/api/auth/request-otp/', {'email': self.email}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return re.search(r'\b(\d{6})\b', mail.outbox[-1].body).group(1)
+
+    def verify(self, code):
+        return self.client.post('/api/auth/verify-otp/', {'email': self.email, 'code': code}, format='json')
+
+    def reset(self, code):
+        data = {'email': self.email, 'code': code, 'new_password': 'new-secret'}
+        return self.client.post('/api/auth/reset-password/', data, format='json')
+
+    def wrong_code(self, code):
+        return f'{(int(code) + 1) % 10**6:06d}'
+
+    def check_reset_flow(self):
+        code = self.request_code()
+        self.assertEqual(self.reset(code).status_code, 403)
+        self.assertEqual(self.verify(self.wrong_code(code)).status_code, 400)
+        self.assertEqual(self.verify(code).status_code, 200)
+        self.assertEqual(self.reset(code).status_code, 200)
+        self.assertTrue(Student.objects.get(pk=self.student.pk).check_password('new-secret'))
+        # Consumed with the reset
+        self.assertEqual(self.reset(code).status_code, 403)
+
+    def check_lockout(self):
+        code = self.request_code()
+        for _ in range(3):
+            self.assertEqual(self.verify(self.wrong_code(code)).status_code, 400)
+        response = self.verify(code)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Too many', response.data['error'])
+        # A new code starts over
+        self.assertEqual(self.verify(self.request_code()).status_code, 200)
+
+    def test_database_store(self):
+        self.check_reset_flow()
+        self.assertFalse(OTPVerification.objects.exists())
+
+    def test_database_store_lockout(self):
+        self.check_lockout()
+
+    @override_settings(OTP_STORE='cache')
+    def test_cache_store(self):
+        self.check_reset_flow()
+        self.assertFalse(OTPVerification.objects.exists())
+
+    @override_settings(OTP_STORE='cache')
+    def test_cache_store_lockout(self):
+        self.check_lockout()
+
+    @override_settings(OTP_STORE='cache')
+    def test_cache_store_verifies_without_the_database(self):
+        store = get_otp_store()
+        code = store.issue(self.email)
+        with self.assertNumQueries(0):
+            self.assertEqual(store.verify(self.email, code), OTP_VERIFIED)
+            self.assertTrue(store.is_verified(self.email, code))
+
+    def test_purge_keeps_rows_inside_the_reset_window(self):
+        now = timezone.now()
+        for minutes in (-60, -5, 5):
+            OTPVerification.objects.create(
+                email=self.email, code='123456', expires_at=now + timedelta(minutes=minutes)
+            )
+        out = StringIO()
+        call_command('purge_expired_otps', '--batch-size', '1', stdout=out)
+        self.assertIn('Deleted 1 expired OTP record(s)', out.getvalue())
+        self.assertEqual(OTPVerification.objects.count(), 2)
+
+
+@override_settings(
+    RATE_LIMIT_ENABLED=False, STUDENT_SCRYPT_WORK_FACTOR=2**4,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class TokenAuthenticationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.student = make_students(1)[0]
+        self.student.set_password('secret123')
+        self.student.is_active = True
+        self.student.save()
+
+    def obtain(self, email='student0@example.com', password='secret123'):
+        return self.client.post('/api/auth/token/', {'email': email, 'password': password}, format='json')
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/token/refresh/', {'refresh': token}, format='json')
+
+    def test_current_user_is_answered_from_the_token(self):
+        tokens = self.obtain().data
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/me/')
+        self.assertEqual(response.data['student']['id'], self.student.pk)
+        self.assertEqual(response.data['student']['email'], self.student.email)
+
+    def test_inactive_students_and_wrong_passwords_get_no_token(self):
+        self.assertEqual(self.obtain(password='wrong').status_code, 401)
+        Student.objects.filter(pk=self.student.pk).update(is_active=False)
+        self.assertEqual(self.obtain().status_code, 403)
+
+    def test_refresh_rotates_and_blacklists(self):
+        tokens = self.obtain().data
+        rotated = self.refresh(tokens['refresh'])
+        self.assertEqual(rotated.status_code, 200)
+        self.assertNotEqual(rotated.data['refresh'], tokens['refresh'])
+        # The view has no authenticators, so DRF reports InvalidToken as 403
+        self.assertIn(self.refresh(tokens['refresh']).status_code, (401, 403))
+
+        Student.objects.filter(pk=self.student.pk).update(is_active=False)
+        self.assertIn(self.refresh(rotated.data['refresh']).status_code, (401, 403))
+
+    def test_staff_token_reaches_staff_endpoints(self):
+        User.objects.create_user('admin', password='staff-pass', is_staff=True)
+        tokens = self.obtain('admin', 'staff-pass').data
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        self.assertEqual(self.client.get('/api/payments/').status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.obtain().data["access"]}')
+        self.assertEqual(self.client.get('/api/payments/').status_code, 403)
+
+
+@override_settings(CURRENT_USER_CACHE_ENABLED=True)
+class CurrentUserCacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.course = make_course()
+        self.batch = make_batch(self.course, capacity=1)
+        self.student = make_students(1)[0]
+
+    def test_payload_is_cached(self):
+        get_current_user_payload(self.student.pk)
+        with self.assertNumQueries(0):
+            payload = get_current_user_payload(self.student.pk)
+        self.assertEqual(payload['email'], self.student.email)
+
+    def test_profile_and_enrollment_writes_invalidate(self):
+        get_current_user_payload(self.student.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.first_name = 'Renamed'
+            self.student.save()
+        self.assertEqual(get_current_user_payload(self.student.pk)['first_name'], 'Renamed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(student=self.student, course=self.course, status='pending')
+        self.assertEqual(len(get_current_user_payload(self.student.pk)['enrolled_courses']), 1)
+
+    def test_waitlist_promotion_invalidates_after_commit(self):
+        seated, waiting = make_students(2, prefix='seat')
+        first = Enrollment.objects.create(student=seated, course=self.course, batch=self.batch)
+        Enrollment.objects.create(student=waiting, course=self.course, batch=self.batch)
+        get_current_user_payload(waiting.pk)
+        key = current_user_cache_key(waiting.pk)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+            # Promoted, but the old payload stays until the transaction commits
+            self.assertIsNotNone(caches['default'].get(key))
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(caches['default'].get(key))
+        self.assertEqual(len(get_current_user_payload(waiting.pk)['enrolled_courses']), 1)
+
+    @override_settings(CURRENT_USER_CACHE_ENABLED=False)
+    def test_disabled_without_a_shared_cache(self):
+        get_current_user_payload(self.student.pk)
+        self.assertIsNone(caches['default'].get(current_user_cache_key(self.student.pk)))
+
+
+@override_settings(
+    RATE_LIMIT_ENABLED=False,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class EmailCaseTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.student = Student(first_name='Mixed', last_name='Case', email='  Mixed@Example.COM ', is_active=True)
+        self.student.set_password('secret123')
+        self.student.save()
+
+    def test_email_is_stored_lowercase(self):
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.email, 'mixed@example.com')
+
+    def test_login_and_register_ignore_case(self):
+        response = self.client.post(
+            '/api/auth/login/', {'email': 'MIXED@example.com', 'password': 'secret123'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post('/api/auth/register/', {
+            'first_name': 'Dup', 'last_name': 'Licate', 'email': 'mixed@EXAMPLE.com', 'password': 'secret123',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Student.objects.count(), 1)
+
+    def test_database_rejects_case_only_duplicates(self):
+        other = make_students(1)[0]
+        # update() skips save(), so only the lower(email) constraint stands in the way
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Student.objects.filter(pk=other.pk).update(email='MIXED@example.com')
+
+
+@override_settings(MAIL_QUEUE_ENABLED=False)
+class SeatReservationTests(TestCase):
+    def setUp(self):
+        self.course = make_course()
+        self.batch = make_batch(self.course, capacity=2)
+        self.students = make_students(3)
+
+    def enroll(self, student, **extra):
+        return Enrollment.objects.create(student=student, course=self.course, batch=self.batch, **extra)
+
+    def test_enrollments_beyond_capacity_are_waitlisted(self):
+        statuses = [self.enroll(student).status for student in self.students]
+        self.assertEqual(statuses, ['pending', 'pending', 'waitlisted'])
+        self.assertEqual(seat_state(self.batch), (2, 2, 1))
+
+    def test_seat_holding_status_in_full_batch_is_rejected(self):
+        self.enroll(self.students[0])
+        self.enroll(self.students[1])
+        with self.assertRaises(BatchFullError):
+            self.enroll(self.students[2], status='approved')
+        self.assertEqual(seat_state(self.batch), (2, 2, 0))
+
+    def test_freed_seat_goes_to_oldest_waitlisted(self):
+        first, _, waitlisted = [self.enroll(student) for student in self.students]
+        first.status = 'cancelled'
+        first.save()
+        waitlisted.refresh_from_db()
+        self.assertEqual(waitlisted.status, 'pending')
+        self.assertEqual(seat_state(self.batch), (2, 2, 0))
+
+    def test_moving_to_another_batch_moves_the_seat(self):
+        enrollment = self.enroll(self.students[0])
+        other = make_batch(self.course, capacity=1)
+        enrollment.batch = other
+        enrollment.save()
+        self.assertEqual(seat_state(self.batch)[0], 0)
+        self.assertEqual(seat_state(other)[0], 1)
+
+    def test_sync_seat_counts_repairs_drift(self):
+        self.enroll(self.students[0])
+        Batch.objects.filter(pk=self.batch.pk).update(seats_taken=7)
+        sync_seat_counts([self.batch.pk])
+        self.assertEqual(seat_state(self.batch), (1, 1, 0))
+
+
+class BulkEnrollmentTests(TestCase):
+    def test_fills_free_seats_then_waitlists(self):
+        course = make_course()
+        batch = make_batch(course, capacity=2)
+        students = make_students(3)
+        Enrollment.objects.create(student=students[0], course=course)
+        results = bulk_enroll(course, [s.pk for s in students] + [999999], batch=batch)
+        self.assertEqual(
+            [row['result'] for row in results], ['already_enrolled', 'enrolled', 'enrolled', 'not_found']
+        )
+        extra = make_students(1, prefix='late')[0]
+        self.assertEqual(bulk_enroll(course, [extra.pk], batch=batch)[0]['result'], 'waitlisted')
+        self.assertEqual(seat_state(batch), (2, 2, 1))
+
+    def test_payment_status_follows_the_fee(self):
+        free, paid = make_course(code='FREE', fees=0), make_course(code='PAID', fees=500)
+        student = make_students(1)[0]
+        for course in (free, paid):
+            bulk_enroll(course, [student.pk])
+        self.assertEqual(
+            dict(Enrollment.objects.values_list('course__code', 'payment_status')),
+            {'FREE': 'paid', 'PAID': 'pending'},
+        )
+
+
+@override_settings(MAIL_QUEUE_ENABLED=False)
+class ConcurrentSeatReservationTests(TransactionTestCase):
+    """
+    Many simultaneous enrollments into one small batch, each on its own
+    database connection, must never oversubscribe it.
+
+    On the SQLite fallback, IMMEDIATE transactions run the writers one at
+    a time, so this only checks the capacity and waitlist arithmetic. The
+    conditional seat update and skip_locked waitlist promotion only race
+    for real when the tests run against PostgreSQL (DATABASE_URL).
+    """
+    STUDENTS = 40
+    CAPACITY = 10
+    CANCELLATIONS = 5
+    THREADS = 16
+
+    def run_concurrently(self, tasks):
+        """Run tasks on a thread pool, releasing them all at once."""
+        start = threading.Barrier(min(self.THREADS, len(tasks)))
+
+        def run(task):
+            try:
+                try:
+                    start.wait(timeout=10)
+                except threading.BrokenBarrierError:
+                    pass
+                return task()
+            except Exception as e:
+                return f'error: {type(e).__name__}: {e}'
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            return list(pool.map(run, tasks))
+
+    def enroll(self, student_id):
+        """The same path as POST /api/enrollments/"""
+        serializer = EnrollmentCreateSerializer(
+            data={'student': student_id, 'course': self.course.pk, 'batch': self.batch.pk}
+        )
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            return serializer.save().status
+
+    def cancel(self, enrollment_id):
+        enrollment = Enrollment.objects.get(pk=enrollment_id)
+        enrollment.status = 'cancelled'
+        enrollment.save()
+        return 'cancelled'
+
+    def test_concurrent_enrollments_never_oversubscribe(self):
+        self.course = make_course(fees=0)
+        self.batch = make_batch(self.course, capacity=self.CAPACITY)
+        students = make_students(self.STUDENTS)
+
+        outcomes = self.run_concurrently([lambda pk=s.pk: self.enroll(pk) for s in students])
+        self.assertEqual(
+            Counter(outcomes),
+            {'pending': self.CAPACITY, 'waitlisted': self.STUDENTS - self.CAPACITY},
+        )
+        self.assertEqual(seat_state(self.batch), (self.CAPACITY, self.CAPACITY, self.STUDENTS - self.CAPACITY))
+
+        seated = list(
+            Enrollment.objects.filter(batch=self.batch, status='pending')
+            .values_list('id', flat=True)[:self.CANCELLATIONS]
+        )
+        outcomes = self.run_concurrently([lambda pk=pk: self.cancel(pk) for pk in seated])
+        self.assertEqual(outcomes, ['cancelled'] * self.CANCELLATIONS)
+        self.assertEqual(
+            seat_state(self.batch),
+            (self.CAPACITY, self.CAPACITY, self.STUDENTS - self.CAPACITY - self.CANCELLATIONS),
+        )
+
+
+@override_settings(MAIL_QUEUE_ENABLED=False)
+class EnrollmentTransitionTests(TestCase):
+    def setUp(self):
+        self.course = make_course()
+        self.batch = make_batch(self.course, capacity=2)
+        students = make_students(3)
+        self.enrollments = [
+            Enrollment.objects.create(student=student, course=self.course, batch=self.batch)
+            for student in students
+        ]
+
+    def test_allowed_transitions(self):
+        pending = self.enrollments[0]
+        self.assertTrue(pending.can_transition_to('approved'))
+        self.assertFalse(pending.can_transition_to('completed'))
+        self.assertFalse(self.enrollments[2].can_transition_to('approved'))
+
+    def test_invalid_row_blocks_the_whole_transition(self):
+        result = transition_enrollments(Enrollment.objects.filter(batch=self.batch), 'approved')
+        self.assertEqual(result['invalid'], [{'id': self.enrollments[2].pk, 'status': 'waitlisted'}])
+        self.assertEqual(result['updated'], [])
+        self.assertFalse(Enrollment.objects.filter(status='approved').exists())
+
+    def test_skip_invalid_applies_the_valid_rows_and_notifies(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = transition_enrollments(
+                Enrollment.objects.filter(batch=self.batch), 'approved', skip_invalid=True
+            )
+        self.assertEqual(sorted(result['updated']), [e.pk for e in self.enrollments[:2]])
+        self.assertEqual(Enrollment.objects.filter(status='approved').count(), 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_cancelling_stamps_end_date_and_promotes_waitlist(self):
+        first = self.enrollments[0]
+        result = transition_enrollments(Enrollment.objects.filter(pk=first.pk), 'cancelled', notify=False)
+        self.assertEqual(result['promoted'], [self.enrollments[2].pk])
+        first.refresh_from_db()
+        self.assertEqual(first.end_date, timezone.localdate())
+        self.assertEqual(seat_state(self.batch), (2, 2, 0))
+
+    def test_bulk_transition_api_is_staff_only(self):
+        client = APIClient()
+        data = {'batch': self.batch.pk, 'status': 'cancelled', 'skip_invalid': True, 'notify': False}
+        self.assertIn(client.post('/api/enrollments/bulk_transition/', data, format='json').status_code, (401, 403))
+        self.assertFalse(Enrollment.objects.filter(status='cancelled').exists())
+
+        client.force_authenticate(User.objects.create_user('staff', password='x', is_staff=True))
+        response = client.post('/api/enrollments/bulk_transition/', data, format='json')
+        self.assertEqual((response.status_code, response.data['updated']), (200, 3))
+
+    def test_admin_form_rejects_disallowed_status_change(self):
+        enrollment = self.enrollments[0]
+        data = {
+            'student': enrollment.student_id, 'course': enrollment.course_id, 'batch': self.batch.pk,
+            'status': 'completed', 'fee_due': '1000', 'progress_percentage': 0,
+            'payment_status': 'pending', 'amount_paid': '0', 'balance_due': '1000',
+        }
+        form = EnrollmentAdminForm(data, instance=enrollment)
+        self.assertFalse(form.is_valid())
+        self.assertIn('status', form.errors)
+        form = EnrollmentAdminForm({**data, 'status': 'approved'}, instance=enrollment)
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_api_rejects_disallowed_status_change(self):
+        response = APIClient().patch(
+            f'/api/enrollments/{self.enrollments[0].pk}/', {'status': 'completed'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', response.data)
+
+
+class BatchProgressTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('staff', password='x', is_staff=True))
+        self.course = make_course()
+        self.batch = make_batch(self.course)
+        self.enrollments = [
+            Enrollment.objects.create(student=student, course=self.course, batch=self.batch, status='approved')
+            for student in make_students(3)
+        ]
+        Enrollment.objects.filter(pk=self.enrollments[2].pk).update(progress_percentage=95)
+        self.url = f'/api/batches/{self.batch.pk}/progress/'
+
+    def progress_of(self):
+        return dict(Enrollment.objects.filter(batch=self.batch).values_list('id', 'progress_percentage'))
+
+    def test_per_student_progress_writes_only_changed_rows(self):
+        first, second, _ = self.enrollments
+        response = self.client.post(
+            self.url, {'progress': {str(first.pk): 40, str(second.pk): 0}}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['changes'], {first.pk: [0, 40]})
+        self.assertEqual(self.progress_of()[first.pk], 40)
+
+    def test_increment_is_clamped(self):
+        response = self.client.post(self.url, {'increment': 10}, format='json')
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(sorted(self.progress_of().values()), [10, 10, 100])
+
+    def test_rejects_enrollments_from_another_batch(self):
+        other_batch = make_batch(make_course('OTH'))
+        stranger = Enrollment.objects.create(
+            student=make_students(1, prefix='other')[0], course=other_batch.course, batch=other_batch, status='approved'
+        )
+        response = self.client.post(
+            self.url, {'progress': {str(self.enrollments[0].pk): 50, str(stranger.pk): 50}}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['ids'], [stranger.pk])
+        self.assertEqual(sorted(self.progress_of().values()), [0, 0, 95])
+
+    def test_staff_only(self):
+        response = APIClient().post(self.url, {'increment': 10}, format='json')
+        self.assertIn(response.status_code, (401, 403))
+        self.assertEqual(sorted(self.progress_of().values()), [0, 0, 95])
+
+
+@override_settings(MAIL_QUEUE_ENABLED=False)
+class PaymentLedgerTests(TestCase):
+    def setUp(self):
+        self.course = make_course(fees=1000)
+        self.student = make_students(1)[0]
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+
+    def assertBalances(self, amount_paid, balance_due, payment_status):
+        self.enrollment.refresh_from_db()
+        self.assertEqual(
+            (self.enrollment.amount_paid, self.enrollment.balance_due, self.enrollment.payment_status),
+            (Decimal(amount_paid), Decimal(balance_due), payment_status),
+        )
+
+    def test_new_enrollment_owes_the_course_fee(self):
+        self.assertEqual(self.enrollment.fee_due, Decimal('1000'))
+        self.assertBalances('0', '1000', 'pending')
+
+    def test_payments_and_refunds_update_materialized_balances(self):
+        record_payment(self.enrollment, '400', 'cash')
+        self.assertBalances('400', '600', 'partial')
+        record_payment(self.enrollment, '600', 'upi')
+        self.assertBalances('1000', '0', 'paid')
+        record_payment(self.enrollment, '-250', 'refund')
+        self.assertBalances('750', '250', 'partial')
+        self.assertEqual(
+            sum(self.enrollment.payments.values_list('amount', flat=True)), self.enrollment.amount_paid
+        )
+
+    def test_ledger_entries_are_append_only(self):
+        payment = record_payment(self.enrollment, '100', 'cash')
+        self.assertTrue(payment.receipt_number)
+        payment.amount = Decimal('1')
+        with self.assertRaises(ValueError):
+            payment.save()
+        with self.assertRaises(ValueError):
+            payment.delete()
+
+    def test_saving_an_enrollment_keeps_ledger_totals(self):
+        record_payment(self.enrollment, '400', 'cash')
+        self.enrollment.remarks = 'Stale instance, loaded before the payment'
+        self.enrollment.save()
+        self.assertBalances('400', '600', 'partial')
+
+    def test_fee_change_recomputes_the_balance_only_when_it_changes(self):
+        record_payment(self.enrollment, '400', 'cash')
+        enrollment = Enrollment.objects.get(pk=self.enrollment.pk)
+        with CaptureQueriesContext(connection) as queries:
+            enrollment.remarks = 'Same fee'
+            enrollment.save()
+        self.assertEqual(sum(q['sql'].startswith('UPDATE') for q in queries.captured_queries), 1)
+
+        enrollment.fee_due = Decimal('300')
+        enrollment.save()
+        self.assertBalances('400', '-100', 'paid')
+
+        # A cleared fee falls back to the course fees
+        enrollment.fee_due = None
+        enrollment.save()
+        self.assertEqual(enrollment.fee_due, Decimal('1000'))
+        self.assertBalances('400', '600', 'partial')
+
+    def test_students_and_enrollments_with_payments_are_not_deleted(self):
+        record_payment(self.enrollment, '100', 'cash')
+        client = APIClient()
+        response = client.delete(f'/api/enrollments/{self.enrollment.pk}/')
+        self.assertEqual(response.status_code, 409)
+        response = client.delete(f'/api/students/{self.student.pk}/')
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(Enrollment.objects.filter(pk=self.enrollment.pk).exists())
+
+    def test_payment_api_is_staff_only_and_validates_signs(self):
+        client = APIClient()
+        data = {'enrollment': self.enrollment.pk, 'amount': '100', 'mode': 'cash'}
+        self.assertIn(client.post('/api/payments/', data, format='json').status_code, (401, 403))
+
+        client.force_authenticate(User.objects.create_user('staff', password='x', is_staff=True))
+        response = client.post('/api/payments/', {**data, 'amount': '-100'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post('/api/payments/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertBalances('100', '900', 'partial')
+
+
+class OverdueInstallmentTests(TestCase):
+    def setUp(self):
+        course = make_course(fees=900)
+        self.enrollments = [
+            Enrollment.objects.create(student=student, course=course) for student in make_students(2)
+        ]
+        create_installment_plans(
+            Enrollment.objects.all(), count=3, first_due=timezone.localdate() - timedelta(days=40)
+        )
+
+    def test_overdue_installments_get_one_reminder_per_student(self):
+        self.assertEqual(scan_overdue_installments(), 4)
+        self.assertEqual(send_overdue_reminders(), (4, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(Installment.objects.filter(status='overdue', reminded_at__isnull=True).count(), 0)
+        self.assertEqual(send_overdue_reminders(), (0, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failed_reminders_are_retried(self):
+        scan_overdue_installments()
+        with mock.patch('core.installments.send_professional_email', side_effect=OSError('SMTP down')):
+            self.assertEqual(send_overdue_reminders(), (0, 4))
+        self.assertEqual(Installment.objects.filter(reminded_at__isnull=False).count(), 0)
+        self.assertEqual(send_overdue_reminders(), (4, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+
+class InstallmentPlanApiTests(TestCase):
+    def setUp(self):
+        self.enrollment = Enrollment.objects.create(student=make_students(1)[0], course=make_course(fees=900))
+        self.url = f'/api/enrollments/{self.enrollment.pk}/installments/'
+
+    def test_only_staff_create_plans(self):
+        client = APIClient()
+        self.assertIn(client.post(self.url, {'count': 3}, format='json').status_code, (401, 403))
+        self.assertFalse(Installment.objects.exists())
+
+        client.force_authenticate(User.objects.create_user('staff', password='x', is_staff=True))
+        response = client.post(self.url, {'count': 3}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(client.post(self.url, {'count': 3}, format='json').status_code, 400)
+
+    def test_schedule_is_readable(self):
+        create_installment_plans(Enrollment.objects.all(), count=3)
+        response = APIClient().get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+
+
+class AnalyticsRollupTests(TestCase):
+    def setUp(self):
+        self.old, self.new = make_course(code='OLD'), make_course(code='NEW')
+        self.enrollment = Enrollment.objects.create(student=make_students(1)[0], course=self.old)
+        record_payment(self.enrollment, '500', 'cash')
+        refresh_rollups()
+
+    def totals(self):
+        enrollments = dict(EnrollmentDailyStat.objects.values_list('course__code', 'enrollments'))
+        revenue = dict(RevenueDailyStat.objects.values_list('course__code', 'amount'))
+        return enrollments, revenue
+
+    def test_refresh_builds_daily_buckets(self):
+        self.assertEqual(self.totals(), ({'OLD': 1}, {'OLD': Decimal('500')}))
+
+    def test_course_change_moves_both_rollups(self):
+        enrollment = Enrollment.objects.get(pk=self.enrollment.pk)
+        enrollment.course = self.new
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment.save()
+        self.assertEqual(self.totals(), ({'NEW': 1}, {'NEW': Decimal('500')}))
+        # The incremental refresh agrees
+        refresh_rollups()
+        self.assertEqual(self.totals(), ({'NEW': 1}, {'NEW': Decimal('500')}))
+
+
+class EnrollmentListingTests(TestCase):
+    def setUp(self):
+        self.course = make_course()
+        self.batch = make_batch(self.course)
+
+    def enroll(self, count, prefix):
+        for i, student in enumerate(make_students(count, prefix=prefix)):
+            Enrollment.objects.create(
+                student=student, course=self.course, batch=self.batch if i % 2 else None, fee_due=Decimal('1000')
+            )
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get('/api/enrollments/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_rows_match_the_model_serializer(self):
+        self.enroll(2, 'row')
+        rows = EnrollmentReadSerializer.project(Enrollment.objects.order_by('id'))
+        expected = EnrollmentSerializer(Enrollment.objects.order_by('id'), many=True).data
+        self.assertEqual(EnrollmentReadSerializer(rows, many=True).data, expected)
+        self.assertEqual(expected[1]['batch_name'], self.batch.name)
+        self.assertIsNone(expected[0]['batch_name'])
+
+    def test_listing_query_count_does_not_grow_with_rows(self):
+        self.enroll(5, 'first')
+        small = self.list_queries()
+        self.enroll(5, 'second')
+        self.assertEqual(self.list_queries(), small)
+
+
+class BatchRosterTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.course = make_course()
+        self.batch = Batch.objects.select_related('course').get(pk=make_batch(self.course).pk)
+        self.student = make_students(1)[0]
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course, batch=self.batch)
+
+    def test_cache_hit_costs_only_the_fingerprint_query(self):
+        batch_roster(self.batch)
+        with self.assertNumQueries(1):
+            roster = batch_roster(self.batch)
+        self.assertEqual([row['enrollment_id'] for row in roster['students']], [self.enrollment.pk])
+
+    def test_student_and_enrollment_changes_rebuild_the_roster(self):
+        batch_roster(self.batch)
+        self.student.first_name = 'Renamed'
+        self.student.save()
+        self.assertEqual(batch_roster(self.batch)['students'][0]['name'], 'Renamed 0')
+
+        self.enrollment.progress_percentage = 60
+        self.enrollment.save()
+        self.assertEqual(batch_roster(self.batch)['students'][0]['progress_percentage'], 60)
+
+        Enrollment.objects.create(student=make_students(1, prefix='late')[0], course=self.course, batch=self.batch)
+        self.assertEqual(len(batch_roster(self.batch)['students']), 2)
+
+    def test_csv_export_is_staff_only(self):
+        url = f'/api/batches/{self.batch.pk}/roster/?export=csv'
+        self.assertIn(APIClient().get(url).status_code, (401, 403))
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('staff', password='x', is_staff=True))
+        lines = client.get(url).content.decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['Enrollment ID', 'Student ID', 'Name'])
+        self.assertEqual(len(lines), 2)
+
+
+class RolloverTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate().replace(day=1)
+        # Quarterly, so a three-month batch ends before the next one starts
+        self.template = BatchTemplate.objects.create(
+            course=make_course(), label='Morning', time_slot='Mon-Fri 10:00 AM - 12:00 PM', room='Lab 1',
+            first_start_date=self.today, every_months=3,
+        )
+        self.names = [f'{day:%b %Y} Morning Batch' for day in (self.today, add_months(self.today, 3))]
+
+    def test_rerun_inserts_nothing(self):
+        self.assertEqual(rollover_batches(today=self.today), (2, []))
+        self.assertEqual(rollover_batches(today=self.today), (0, []))
+        self.assertEqual(
+            sorted(Batch.objects.filter(template=self.template).values_list('name', flat=True)), sorted(self.names)
+        )
+
+    def test_deleted_batch_is_not_recreated(self):
+        rollover_batches(today=self.today)
+        batch = Batch.objects.get(template=self.template, start_date=self.today)
+        with self.captureOnCommitCallbacks(execute=True):
+            batch.delete()
+        self.assertTrue(BatchTemplateSkip.objects.filter(template=self.template, start_date=self.today).exists())
+        self.assertEqual(rollover_batches(today=self.today), (0, []))
+        self.assertFalse(Batch.objects.filter(template=self.template, start_date=self.today).exists())
+
+    def test_room_clash_with_existing_batch_is_skipped(self):
+        Batch.objects.create(
+            name='Booked', course=make_course(code='OTH'), time_slot='Mon 11:00 AM - 1:00 PM', room='Lab 1',
+            start_date=self.today,
+        )
+        created, clashes = rollover_batches(today=self.today)
+        self.assertEqual(created, 1)
+        self.assertEqual(clashes, [{'name': self.names[0], 'room': 'Lab 1', 'clashes_with': ['Booked']}])
+        self.assertFalse(Batch.objects.filter(template=self.template, start_date=self.today).exists())
+
+    def test_planned_batches_do_not_clash_with_each_other(self):
+        BatchTemplate.objects.create(
+            course=make_course(code='OTH'), label='Late', time_slot='Mon 11:00 AM - 1:00 PM', room='Lab 1',
+            first_start_date=self.today, every_months=3,
+        )
+        created, clashes = rollover_batches(today=self.today)
+        self.assertEqual(created, 2)
+        self.assertEqual([clash['clashes_with'] for clash in clashes], [[name] for name in self.names])
+        self.assertFalse(Batch.objects.filter(course__code='OTH').exists())
+
+
+class AdminChangelistQueryTests(TestCase):
+    MODELS = ['student', 'enrollment', 'payment', 'installment', 'batch', 'course', 'coursecategory']
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        self.rows = 0
+
+    def add_rows(self, count):
+        """count more students, each with a course, batch, enrollment, payment and installments"""
+        for i in range(self.rows, self.rows + count):
+            course = make_course(f'C{i}', fees=900)
+            batch = make_batch(course)
+            student = Student.objects.create(first_name='Admin', last_name=str(i), email=f'admin{i}@example.com')
+            enrollment = Enrollment.objects.create(student=student, course=course, batch=batch)
+            record_payment(enrollment, Decimal('100'), 'cash')
+        create_installment_plans(Enrollment.objects.filter(installments__isnull=True), count=2)
+        self.rows += count
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        self.add_rows(5)
+        counts = {}
+        for model in self.MODELS:
+            url = f'/admin/core/{model}/'
+            self.client.get(url)  # warms the cached filter choices
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            counts[url] = len(queries)
+
+        self.add_rows(5)
+        for url, expected in counts.items():
+            # New batches dropped the cached choices; warm them again
+            self.client.get(url)
+            with self.subTest(url=url), self.assertNumQueries(expected):
+                self.client.get(url)
+
+
+class TimeSlotParsingTests(TestCase):
+    def test_day_tokens(self):
+        cases = {
+            'Mon, Wed, Fri 10:00 AM - 12:00 PM': (0b0010101, 600, 720),
+            'Mon-Fri 9-11 am': (0b0011111, 540, 660),
+            'Tues & Thurs 5-7 pm': (0b0001010, 1020, 1140),
+            'Fri - Mon 3-5pm': (0b1110001, 900, 1020),
+            'Weekends 10-12': (0b1100000, 600, 720),
+        }
+        for time_slot, schedule in cases.items():
+            self.assertEqual(parse_time_slot(time_slot), schedule, time_slot)
+
+    def test_words_starting_with_a_day_are_not_days(self):
+        for time_slot in ('Sunrise batch 6-8 AM', 'Monthly test 10-12 PM', 'Satellite lab 2-4 PM'):
+            self.assertEqual(parse_time_slot(time_slot)[0], 0b0111111, time_slot)
+
+    def test_unparseable_slots(self):
+        for time_slot in ('', 'TBD', '6 PM - 4 PM', '25:00 - 26:00'):
+            self.assertIsNone(parse_time_slot(time_slot), time_slot)
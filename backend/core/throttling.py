@@ -0,0 +1,134 @@
+import hashlib
+import math
+import time
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+from .utils import normalize_phone
+
+
+def parse_rate(rate):
+    """Parse 'count/seconds' (e.g. '10/300') into (count, seconds)."""
+    count, seconds = rate.split('/')
+    return int(count), int(seconds)
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Per-IP and per-identity sliding-window rate limit backed by the cache.
+
+    Each key keeps one counter per fixed window, bumped with an atomic
+    cache.incr(). The effective count is the current window plus the
+    previous window weighted by how much of it still overlaps the sliding
+    window, which avoids the burst-at-boundary problem of fixed windows
+    without storing per-request timestamps.
+
+    Limits come from RATE_LIMITS[scope], e.g. {'ip': '20/300', 'identity': '5/300'};
+    counters live in the RATE_LIMIT_CACHE cache alias. With the default
+    in-process cache nothing touches the network or database, and
+    throttled requests are rejected before any password hashing or OTP
+    rows are created.
+    """
+    scope = None
+    # Request body field that identifies the account being targeted
+    identity_field = None
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+        self.retry_after = None
+
+    def get_identity(self, request):
+        if not self.identity_field:
+            return None
+        try:
+            value = request.data.get(self.identity_field, '')
+        except AttributeError:
+            return None
+        value = self.canonical_identity(str(value))
+        if not value:
+            return None
+        # Hash so raw emails never end up in cache keys
+        return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+    def canonical_identity(self, value):
+        """The form an identity is counted under, so spelling variants share a limit"""
+        return value.strip().lower()
+
+    def hit(self, key, window, now):
+        """Count one request against key; return (previous window count, current window count)."""
+        current_window = int(now // window)
+        current_key = f'{key}:{current_window}'
+        previous_key = f'{key}:{current_window - 1}'
+
+        self.cache.add(current_key, 0, timeout=window * 2)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # Evicted between add() and incr()
+            self.cache.set(current_key, 1, timeout=window * 2)
+            current = 1
+        return self.cache.get(previous_key, 0), current
+
+    @staticmethod
+    def seconds_until_allowed(previous, current, limit, window, elapsed):
+        """How long until one more request would fit under the limit."""
+        remaining = window - elapsed
+        if current < limit:
+            # The previous window's share has to decay far enough
+            return max(0, remaining - window * (limit - 1 - current) / previous)
+        # Wait for this window to roll over and then decay in turn
+        return remaining + window * (1 - (limit - 1) / current)
+
+    def allow_request(self, request, view):
+        if not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+            return True
+
+        rates = getattr(settings, 'RATE_LIMITS', {}).get(self.scope, {})
+        checks = []
+        if 'ip' in rates:
+            checks.append(('ip', self.get_ident(request), rates['ip']))
+        identity = self.get_identity(request) if 'identity' in rates else None
+        if identity:
+            checks.append(('identity', identity, rates['identity']))
+
+        now = time.time()
+        wait = 0
+        for kind, value, rate in checks:
+            limit, window = parse_rate(rate)
+            previous, current = self.hit(f'ratelimit:{self.scope}:{kind}:{value}', window, now)
+            elapsed = now % window
+            if previous * (window - elapsed) / window + current > limit:
+                wait = max(wait, self.seconds_until_allowed(previous, current, limit, window, elapsed))
+
+        if wait:
+            self.retry_after = max(1, math.ceil(wait))
+            return False
+        return True
+
+    def wait(self):
+        return self.retry_after
+
+
+class LoginThrottle(SlidingWindowThrottle):
+    scope = 'login'
+    identity_field = 'email'
+
+    def canonical_identity(self, value):
+        # Students may log in with a phone number in any format
+        value = super().canonical_identity(value)
+        return value if '@' in value else normalize_phone(value) or value
+
+
+class OTPRequestThrottle(SlidingWindowThrottle):
+    scope = 'otp_request'
+    identity_field = 'email'
+
+
+class OTPVerifyThrottle(SlidingWindowThrottle):
+    scope = 'otp_verify'
+    identity_field = 'email'
+
+
+class ContactThrottle(SlidingWindowThrottle):
+    scope = 'contact'
+    identity_field = 'email'
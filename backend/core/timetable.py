@@ -0,0 +1,226 @@
+import heapq
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from itertools import accumulate
+from .models import Batch, Enrollment
+from .utils import add_months, parse_time_slot
+
+MINUTES_PER_DAY = 24 * 60
+# Enrollments that still occupy a student's timetable
+ACTIVE_STATUSES = ('pending', 'approved')
+
+Slot = namedtuple('Slot', 'batch_id weekdays start_minute end_minute first_day last_day')
+
+
+def slot_for(batch):
+    """
+    Weekly schedule of a (possibly unsaved or edited) batch, parsed from
+    its time_slot, or None when that cannot be parsed. The batch runs from
+    its start date for the course's duration.
+    """
+    parsed = parse_time_slot(batch.time_slot)
+    if parsed is None or batch.start_date is None:
+        return None
+    months = max(1, batch.course.duration_months or 1)
+    return Slot(batch.pk, *parsed, batch.start_date, add_months(batch.start_date, months))
+
+
+def _load_slots(batches):
+    """Slots for a Batch queryset with one query"""
+    rows = batches.filter(start_minute__isnull=False).values_list(
+        'id', 'weekdays', 'start_minute', 'end_minute', 'start_date', 'course__duration_months'
+    )
+    return [
+        Slot(pk, weekdays, start, end, start_date, add_months(start_date, max(1, months or 1)))
+        for pk, weekdays, start, end, start_date, months in rows
+    ]
+
+
+def _intervals(slot):
+    """The slot as (start, end) minute ranges within the week, one per weekday it meets"""
+    for day in range(7):
+        if slot.weekdays & (1 << day):
+            offset = day * MINUTES_PER_DAY
+            yield offset + slot.start_minute, offset + slot.end_minute
+
+
+def _dates_overlap(a, b):
+    return a.first_day < b.last_day and b.first_day < a.last_day
+
+
+class Timetable:
+    """
+    A set of batch slots indexed for overlap queries.
+
+    Weekly intervals are kept sorted by start with a running maximum of
+    their ends, so whether a new interval clashes with anything is a
+    binary search: only intervals starting before it ends can overlap, and
+    one of them does iff the largest end among them is past its start.
+    """
+
+    def __init__(self, slots):
+        entries = sorted(
+            (start, end, slot) for slot in slots for start, end in _intervals(slot)
+        )
+        self.starts = [start for start, _, _ in entries]
+        self.ends = [end for _, end, _ in entries]
+        self.slots = [slot for _, _, slot in entries]
+        self.max_end = list(accumulate(self.ends, max))
+
+    def clashes(self, slot):
+        """
+        Slots overlapping `slot` in both weekly time and date range.
+
+        Returns:
+            list: Batch IDs, O(log n) per weekday when nothing clashes.
+        """
+        found = {}
+        for start, end in _intervals(slot):
+            index = bisect_left(self.starts, end)
+            if not index or self.max_end[index - 1] <= start:
+                continue
+            for i in range(index - 1, -1, -1):
+                if self.max_end[i] <= start:
+                    break
+                other = self.slots[i]
+                if self.ends[i] > start and other.batch_id != slot.batch_id and _dates_overlap(slot, other):
+                    found[other.batch_id] = True
+        return list(found)
+
+
+def slots_clash(a, b):
+    """Whether two slots meet on a common weekday at overlapping times within overlapping dates"""
+    return (
+        bool(a.weekdays & b.weekdays)
+        and a.start_minute < b.end_minute and b.start_minute < a.end_minute
+        and _dates_overlap(a, b)
+    )
+
+
+def student_clashes(student_id, batch):
+    """
+    Batches the student is actively enrolled in that meet at the same
+    time as `batch`.
+
+    Returns:
+        list: Clashing Batch IDs (empty if the slot is unparsed).
+    """
+    slot = slot_for(batch)
+    if slot is None:
+        return []
+    enrolled = Batch.objects.filter(
+        enrollments__student_id=student_id, enrollments__status__in=ACTIVE_STATUSES
+    ).exclude(pk=batch.pk).distinct()
+    return Timetable(_load_slots(enrolled)).clashes(slot)
+
+
+def students_clashes(student_ids, batch):
+    """
+    student_clashes() for many students with one query.
+
+    Returns:
+        dict: Clashing Batch IDs keyed by student ID, for students with a clash.
+    """
+    slot = slot_for(batch)
+    if slot is None:
+        return {}
+    rows = Enrollment.objects.filter(
+        student_id__in=student_ids, status__in=ACTIVE_STATUSES, batch__start_minute__isnull=False
+    ).exclude(batch_id=batch.pk).values_list(
+        'student_id', 'batch_id', 'batch__weekdays', 'batch__start_minute', 'batch__end_minute',
+        'batch__start_date', 'batch__course__duration_months',
+    )
+    slots = defaultdict(list)
+    for student_id, pk, weekdays, start, end, start_date, months in rows:
+        slots[student_id].append(
+            Slot(pk, weekdays, start, end, start_date, add_months(start_date, max(1, months or 1)))
+        )
+    clashes = {}
+    for student_id, student_slots in slots.items():
+        clashing = Timetable(student_slots).clashes(slot)
+        if clashing:
+            clashes[student_id] = clashing
+    return clashes
+
+
+def room_clashes(batch):
+    """
+    Other active batches booked into the same room at overlapping times.
+
+    Candidates come from batch_room_slot_idx (same room, daily time range
+    overlapping); weekdays and date ranges are checked in Python.
+
+    Returns:
+        list: Clashing Batch IDs.
+    """
+    slot = slot_for(batch)
+    if slot is None or not batch.room:
+        return []
+    same_room = Batch.objects.filter(
+        room=batch.room, is_active=True,
+        start_minute__lt=slot.end_minute, end_minute__gt=slot.start_minute,
+    )
+    if batch.pk:
+        same_room = same_room.exclude(pk=batch.pk)
+    return Timetable(_load_slots(same_room)).clashes(slot)
+
+
+def room_timetables(rooms):
+    """
+    Timetable of the active batches booked into each of `rooms`, with one query.
+
+    Returns:
+        dict: Timetable keyed by room; rooms without batches are missing.
+    """
+    rows = Batch.objects.filter(room__in=rooms, is_active=True, start_minute__isnull=False).values_list(
+        'room', 'id', 'weekdays', 'start_minute', 'end_minute', 'start_date', 'course__duration_months'
+    )
+    slots = defaultdict(list)
+    for room, pk, weekdays, start, end, start_date, months in rows:
+        slots[room].append(Slot(pk, weekdays, start, end, start_date, add_months(start_date, max(1, months or 1))))
+    return {room: Timetable(room_slots) for room, room_slots in slots.items()}
+
+
+def clash_report():
+    """
+    Every room double-booking and student timetable clash among active
+    batches.
+
+    Loads the batches, rooms and active enrollments with three queries, then
+    sweeps all weekly intervals once in start order, keeping a heap of the
+    intervals still running. Each pair that overlaps in time (and date
+    range) is checked for a shared room and for shared students.
+
+    Returns:
+        dict: 'rooms' - list of {'room', 'batches'}; 'students' - list of
+        {'student_id', 'batches'}; batch pairs are sorted ID pairs.
+    """
+    batches = Batch.objects.filter(is_active=True)
+    slots = {slot.batch_id: slot for slot in _load_slots(batches)}
+    rooms = dict(batches.filter(pk__in=slots).exclude(room='').values_list('id', 'room'))
+    students = defaultdict(set)
+    for student_id, batch_id in Enrollment.objects.filter(
+        batch_id__in=slots, status__in=ACTIVE_STATUSES
+    ).values_list('student_id', 'batch_id'):
+        students[batch_id].add(student_id)
+
+    overlapping = set()
+    running = []
+    for start, end, batch_id in sorted(
+        (start, end, slot.batch_id) for slot in slots.values() for start, end in _intervals(slot)
+    ):
+        while running and running[0][0] <= start:
+            heapq.heappop(running)
+        for _, other_id in running:
+            if other_id != batch_id and _dates_overlap(slots[batch_id], slots[other_id]):
+                overlapping.add((min(batch_id, other_id), max(batch_id, other_id)))
+        heapq.heappush(running, (end, batch_id))
+
+    report = {'rooms': [], 'students': []}
+    for pair in sorted(overlapping):
+        first, second = pair
+        if first in rooms and rooms[first] == rooms.get(second):
+            report['rooms'].append({'room': rooms[first], 'batches': list(pair)})
+        for student_id in sorted(students[first] & students[second]):
+            report['students'].append({'student_id': student_id, 'batches': list(pair)})
+    return report
@@ -0,0 +1,96 @@
+from collections import Counter
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .caching import invalidate_current_user
+from .mail_queue import enqueue_email
+from .models import Enrollment
+from .seats import release_seats
+
+# Statuses that close an enrollment; end_date is stamped when it is still empty
+ENDING_STATUSES = ('completed', 'cancelled')
+
+NOTIFICATION_SUBJECT = 'Enrollment update - CSC Computer Software College'
+NOTIFICATION_MESSAGE = (
+    'Dear {first_name},\n\n'
+    'Your enrollment in {course} is now {status}.\n\n'
+    'Regards,\nCSC Computer Software College'
+)
+
+
+def transition_enrollments(enrollments, to_status, skip_invalid=False, notify=True):
+    """
+    Move a set of enrollments to a new status in one transaction.
+
+    The selected rows are locked and checked against
+    Enrollment.ALLOWED_TRANSITIONS, then changed with a single UPDATE that
+    also stamps updated_at (and end_date when completing or cancelling).
+    Seats given up are returned with one UPDATE per batch and handed to
+    each batch's waitlist, cached /auth/me payloads are dropped in one
+    call, and notification emails are queued after commit.
+
+    Args:
+        enrollments (QuerySet): Enrollments to transition.
+        to_status (str): Target status.
+        skip_invalid (bool): Apply the valid rows and report the rest,
+            instead of changing nothing when any row is invalid.
+        notify (bool): Email each affected student.
+
+    Returns:
+        dict: 'updated' (list of IDs), 'invalid' (list of {'id', 'status'}),
+        'promoted' (waitlisted enrollment IDs that got a seat). When
+        'invalid' is non-empty and skip_invalid is False nothing was changed.
+    """
+    result = {'updated': [], 'invalid': [], 'promoted': []}
+    allowed_from = [s for s, targets in Enrollment.ALLOWED_TRANSITIONS.items() if to_status in targets]
+
+    with transaction.atomic():
+        rows = list(
+            enrollments.select_for_update().order_by('pk').values_list('id', 'status', 'batch_id', 'student_id')
+        )
+        valid = []
+        for row in rows:
+            if row[1] in allowed_from:
+                valid.append(row)
+            elif row[1] != to_status:
+                result['invalid'].append({'id': row[0], 'status': row[1]})
+        if result['invalid'] and not skip_invalid:
+            return result
+        if not valid:
+            return result
+
+        ids = [row[0] for row in valid]
+        changes = {'status': to_status, 'updated_at': timezone.now()}
+        if to_status in ENDING_STATUSES:
+            changes['end_date'] = Coalesce(F('end_date'), timezone.localdate())
+        Enrollment.objects.filter(pk__in=ids, status__in=allowed_from).update(**changes)
+        result['updated'] = ids
+
+        if to_status not in Enrollment.SEAT_STATUSES:
+            released = Counter(
+                batch_id for _, status, batch_id, _ in valid
+                if batch_id and status in Enrollment.SEAT_STATUSES
+            )
+            result['promoted'] = release_seats(released)
+
+        invalidate_current_user(*{row[3] for row in valid})
+        if notify:
+            transaction.on_commit(lambda: notify_transition(ids, to_status))
+
+    return result
+
+
+def notify_transition(enrollment_ids, status):
+    """Queue one status email per student, fetched with a single query."""
+    label = dict(Enrollment.STATUS_CHOICES).get(status, status).lower()
+    recipients = Enrollment.objects.filter(pk__in=enrollment_ids).values_list(
+        'student__email', 'student__first_name', 'course__name'
+    )
+    for email, first_name, course in recipients:
+        if email:
+            enqueue_email(
+                NOTIFICATION_SUBJECT,
+                NOTIFICATION_MESSAGE.format(first_name=first_name, course=course, status=label),
+                [email],
+            )
@@ -2,11 +2,13 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     InstituteProfileViewSet, CourseCategoryViewSet, CourseViewSet,
-    StudentViewSet, EnrollmentViewSet, ContactMessageViewSet, SeasonalOfferViewSet, BatchViewSet
+    StudentViewSet, EnrollmentViewSet, ContactMessageViewSet, SeasonalOfferViewSet, BatchViewSet,
+    MessageCampaignViewSet, BatchReminderRuleViewSet, PaymentViewSet, mail_queue_metrics,
+    enrollment_analytics, revenue_analytics
 )
 from .auth_views import (
     student_login, student_register, student_logout, get_current_user,
-    request_otp, verify_otp, reset_password
+    request_otp, verify_otp, reset_password, obtain_token, refresh_token
 )
 
 # Create router and register viewsets
@@ -19,6 +21,9 @@ router.register(r'enrollments', EnrollmentViewSet, basename='enrollment')
 router.register(r'contact', ContactMessageViewSet, basename='contact')
 router.register(r'offers', SeasonalOfferViewSet, basename='offer')
 router.register(r'batches', BatchViewSet, basename='batch')
+router.register(r'campaigns', MessageCampaignViewSet, basename='campaign')
+router.register(r'reminder-rules', BatchReminderRuleViewSet, basename='reminder-rule')
+router.register(r'payments', PaymentViewSet, basename='payment')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -30,5 +35,11 @@ urlpatterns = [
     path('auth/request-otp/', request_otp, name='request-otp'),
     path('auth/verify-otp/', verify_otp, name='verify-otp'),
     path('auth/reset-password/', reset_password, name='reset-password'),
+    path('auth/token/', obtain_token, name='token-obtain'),
+    path('auth/token/refresh/', refresh_token, name='token-refresh'),
+    # Operational metrics (staff only)
+    path('metrics/mail-queue/', mail_queue_metrics, name='mail-queue-metrics'),
+    path('analytics/enrollments/', enrollment_analytics, name='enrollment-analytics'),
+    path('analytics/revenue/', revenue_analytics, name='revenue-analytics'),
 ]
 
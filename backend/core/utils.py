@@ -1,10 +1,175 @@
+import calendar
 import logging
+import re
+from datetime import date
 from django.core.mail import send_mail
 from django.conf import settings
 from twilio.rest import Client
 
 logger = logging.getLogger(__name__)
 
+E164_PATTERN = re.compile(r'^\+[1-9]\d{7,14}$')
+
+WEEKDAY_NAMES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+ALL_WEEKDAYS = 0b1111111
+# Classes run Monday to Saturday unless the slot names its days
+DEFAULT_WEEKDAYS = 0b0111111
+WEEKDAY_WORDS = {'daily': ALL_WEEKDAYS, 'weekdays': 0b0011111, 'weekends': 0b1100000, 'weekend': 0b1100000}
+# Whole day tokens only ('Mon', 'Tues', 'Thursday'), so words such as
+# 'Sunrise' or 'Monthly' are not read as days
+_DAY = r'(mon(?:day)?|tue(?:s(?:day)?)?|wed(?:nesday)?|thu(?:r(?:s(?:day)?)?)?|fri(?:day)?|sat(?:urday)?|sun(?:day)?)\b\.?'
+DAY_PATTERN = re.compile(rf'\b{_DAY}(?:\s*(?:-|–|to)\s*{_DAY})?', re.IGNORECASE)
+TIME_RANGE_PATTERN = re.compile(
+    r'(\d{1,2})(?:[:.](\d{2}))?\s*([ap])?\.?\s*m?\.?\s*(?:-|–|to)\s*(\d{1,2})(?:[:.](\d{2}))?\s*([ap])?\.?\s*m?\.?',
+    re.IGNORECASE,
+)
+
+
+def normalize_email(email):
+    """
+    Canonicalize an email address for storage and lookup.
+
+    Args:
+        email (str): Email address as entered by the user.
+
+    Returns:
+        str: The stripped, lowercased address ('' for empty input).
+    """
+    return (email or '').strip().lower()
+
+
+def add_months(start, months):
+    """Same day `months` later, clamped to the end of shorter months"""
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def _minutes(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            raise ValueError
+        hour = hour % 12 + (12 if meridiem.lower() == 'p' else 0)
+    if hour > 23 or minute > 59:
+        raise ValueError
+    return hour * 60 + minute
+
+
+def parse_time_slot(time_slot):
+    """
+    Parse a free-text batch time slot into a weekly schedule.
+
+    Understands times like '10:00 AM - 12:00 PM', '10-11:30 am' or
+    '14:00 to 16:00', optionally with days: 'Mon, Wed, Fri', 'Mon-Fri',
+    'Weekends' or 'Daily'. Slots without days run DEFAULT_WEEKDAYS.
+
+    Args:
+        time_slot (str): Time slot as entered by staff.
+
+    Returns:
+        tuple: (weekdays bitmask with Monday as bit 0, start minute,
+        end minute), or None if no valid same-day time range is found.
+    """
+    match = TIME_RANGE_PATTERN.search(time_slot or '')
+    if not match:
+        return None
+    start_hour, start_minute, start_meridiem, end_hour, end_minute, end_meridiem = match.groups()
+    try:
+        end = _minutes(end_hour, end_minute, end_meridiem)
+        start = None
+        if end_meridiem and not start_meridiem:
+            # '10 - 11:30 AM': the start shares the end's meridiem unless
+            # that would put it after the end ('11 - 1 PM')
+            start = _minutes(start_hour, start_minute, end_meridiem)
+            if start >= end:
+                start = _minutes(start_hour, start_minute, 'a' if end_meridiem.lower() == 'p' else None)
+        if start is None:
+            start = _minutes(start_hour, start_minute, start_meridiem)
+    except ValueError:
+        return None
+    if start >= end:
+        return None
+
+    days_text = time_slot[:match.start()] + ' ' + time_slot[match.end():]
+    weekdays = 0
+    for word, mask in WEEKDAY_WORDS.items():
+        if re.search(rf'\b{word}\b', days_text, re.IGNORECASE):
+            weekdays |= mask
+    for first, last in DAY_PATTERN.findall(days_text):
+        first = WEEKDAY_NAMES.index(first[:3].lower())
+        last = WEEKDAY_NAMES.index(last[:3].lower()) if last else first
+        day = first
+        while True:
+            weekdays |= 1 << day
+            if day == last:
+                break
+            day = (day + 1) % 7
+    return weekdays or DEFAULT_WEEKDAYS, start, end
+
+
+def normalize_phone(raw_number, default_country_code=None):
+    """
+    Normalize a free-text phone number to E.164 (e.g. '+919876543210').
+    
+    Local numbers (10 digits, optionally with a trunk '0') are assumed to
+    belong to PHONE_DEFAULT_COUNTRY_CODE.
+    
+    Args:
+        raw_number (str): Phone number as entered by the user.
+        default_country_code (str): Override for the default country code.
+        
+    Returns:
+        str: The E.164 number, or '' if it cannot be normalized.
+    """
+    if not raw_number:
+        return ''
+    if default_country_code is None:
+        default_country_code = getattr(settings, 'PHONE_DEFAULT_COUNTRY_CODE', '91')
+    
+    number = raw_number.strip()
+    if number.startswith('whatsapp:'):
+        number = number[len('whatsapp:'):]
+    has_plus = number.startswith('+')
+    digits = re.sub(r'\D', '', number)
+    
+    if has_plus:
+        candidate = f"+{digits}"
+    elif digits.startswith('00'):
+        candidate = f"+{digits[2:]}"
+    elif len(digits) == 11 and digits.startswith('0'):
+        candidate = f"+{default_country_code}{digits[1:]}"
+    elif len(digits) == 10:
+        candidate = f"+{default_country_code}{digits}"
+    elif digits.startswith(default_country_code) and len(digits) == len(default_country_code) + 10:
+        candidate = f"+{digits}"
+    else:
+        return ''
+    
+    return candidate if E164_PATTERN.match(candidate) else ''
+
+
+def delete_in_batches(queryset, batch_size=1000):
+    """
+    Delete the rows of a queryset a bounded batch at a time.
+    
+    Each round selects up to batch_size primary keys and deletes just
+    those, so large purges never hold long locks or build huge
+    transactions.
+    
+    Returns:
+        int: Total number of rows deleted.
+    """
+    model = queryset.model
+    total = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return total
+        deleted, _ = model.objects.filter(pk__in=pks).delete()
+        total += deleted
+
+
 def send_professional_email(subject, message, recipient_list, fail_silently=False):
     """
     Helper function to send professional emails using Django's send_mail.
@@ -39,7 +204,7 @@ def send_whatsapp_message(to_number, body_text):
     Send a WhatsApp message using Twilio.
     
     Args:
-        to_number (str): The recipient's phone number (must verify format, usually +91...)
+        to_number (str): The recipient's phone number, ideally already in E.164 form
         body_text (str): The message content.
         
     Returns:
@@ -55,18 +220,18 @@ def send_whatsapp_message(to_number, body_text):
             logger.warning("Twilio credentials not configured.")
             return None
 
-        client = Client(account_sid, auth_token)
+        # Reject numbers Twilio would bounce instead of paying for a failed send
+        e164_number = normalize_phone(to_number)
+        if not e164_number:
+            logger.warning(f"Skipping WhatsApp to invalid number {to_number!r}")
+            return None
 
-        # Ensure number has whatsapp: prefix
-        if not to_number.startswith('whatsapp:'):
-            # Assumes number is explicitly formatted like +919876543210
-            # If not, you might need to clean/format it.
-            to_number = f"whatsapp:{to_number}"
+        client = Client(account_sid, auth_token)
 
         message = client.messages.create(
             body=body_text,
             from_=from_whatsapp_number,
-            to=to_number
+            to=f"whatsapp:{e164_number}"
         )
         return message.sid
     except Exception as e:
@@ -1,19 +1,45 @@
-from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework import mixins, viewsets, status
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from django.db import IntegrityError, transaction
+from django.db.models import Count, ProtectedError, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 import csv
-from .models import InstituteProfile, CourseCategory, Course, Student, Enrollment, ContactMessage, SeasonalOffer, Batch
-from django.core.mail import send_mail
-from django.conf import settings
+from collections import Counter
+from .models import (
+    InstituteProfile, CourseCategory, Course, Student, Enrollment, ContactMessage, SeasonalOffer, Batch,
+    BatchReminderRule, MessageCampaign, Payment
+)
+from .messaging import resolve_audience, send_bulk_email, collect_whatsapp_recipients
+from .utils import normalize_phone
+from .idempotency import idempotent
+from .mail_queue import get_mail_queue_stats
+from .throttling import ContactThrottle
+from .transitions import transition_enrollments
+from .bulk_enrollment import bulk_enroll
+from .caching import invalidate_current_user
+from .payments import record_payment, dues_queryset
+from .installments import create_installment_plans
+from .timetable import clash_report
+from .roster import ROSTER_COLUMNS, batch_roster
+from .analytics import (
+    ENROLLMENT_DIMENSIONS, REVENUE_DIMENSIONS, enrollment_breakdown, revenue_breakdown, rollup_as_of
+)
 from .serializers import (
     InstituteProfileSerializer, CourseCategorySerializer,
     CourseListSerializer, CourseDetailSerializer,
-    StudentSerializer, EnrollmentSerializer, EnrollmentCreateSerializer,
-    ContactMessageSerializer, SeasonalOfferSerializer, BatchSerializer
+    StudentSerializer, EnrollmentSerializer, EnrollmentReadSerializer, EnrollmentCreateSerializer,
+    EnrollmentTransitionSerializer, BulkEnrollmentSerializer,
+    ContactMessageSerializer, SeasonalOfferSerializer, BatchSerializer, BatchProgressSerializer,
+    BulkAudienceSerializer, MessageCampaignSerializer, BatchReminderRuleSerializer, PaymentSerializer,
+    InstallmentSerializer, InstallmentPlanSerializer
 )
 
 
@@ -107,6 +133,24 @@ class StudentViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter]
     search_fields = ['first_name', 'last_name', 'email', 'phone']
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Exact phone lookup goes through the indexed canonical column
+        phone = self.request.query_params.get('phone')
+        if phone:
+            queryset = queryset.filter(phone_e164=normalize_phone(phone) or phone)
+        return queryset
+    
+    def destroy(self, request, *args, **kwargs):
+        # Payments are kept for the books, so students who paid stay
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response(
+                {"detail": "This student has recorded payments and cannot be deleted; deactivate the student instead"},
+                status=status.HTTP_409_CONFLICT
+            )
+
     @action(detail=False, methods=['get'])
     def export_csv(self, request):
         """Export student data as CSV"""
@@ -141,47 +185,43 @@ class StudentViewSet(viewsets.ModelViewSet):
         return response
 
     @action(detail=False, methods=['post'])
+    @idempotent('students.send_bulk_message')
     def send_bulk_message(self, request):
-        """Send Email or WhatsApp message to multiple students"""
+        """
+        Send Email or WhatsApp message to multiple students.
+        Recipients are either an explicit student_ids list or an audience
+        filter resolved on the server (course, batch, status, dates...).
+        """
         student_ids = request.data.get('student_ids', [])
+        audience = request.data.get('audience')
         message_type = request.data.get('type', 'email') # email or whatsapp
         subject = request.data.get('subject', 'Message from CSC Institute')
         content = request.data.get('content', '')
         
-        if not student_ids or not content:
-            return Response({'error': 'student_ids and content are required'}, status=status.HTTP_400_BAD_REQUEST)
-            
-        students = Student.objects.filter(id__in=student_ids)
+        if (not student_ids and audience is None) or not content:
+            return Response({'error': 'student_ids or audience, and content are required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if student_ids:
+            students = Student.objects.filter(id__in=student_ids)
+        else:
+            audience_serializer = BulkAudienceSerializer(data=audience)
+            if not audience_serializer.is_valid():
+                return Response({'error': 'Invalid audience', 'details': audience_serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+            students = resolve_audience(audience_serializer.validated_data)
         
         if message_type == 'email':
-            # Collect recipient list
-            recipient_list = list(students.values_list('email', flat=True))
             try:
-                send_mail(
-                    subject,
-                    content,
-                    settings.EMAIL_HOST_USER or 'admin@csc.college',
-                    recipient_list,
-                    fail_silently=False
-                )
-                return Response({'message': f'Email sent to {len(recipient_list)} students'})
+                sent = send_bulk_email(students, subject, content)
+                return Response({'message': f'Email sent to {sent} students'})
             except Exception as e:
                 return Response({'error': f'Failed to send email: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         elif message_type == 'whatsapp':
             # For WhatsApp, we return the phone numbers and the content 
             # so the frontend can open wa.me links
-            recipients = []
-            for s in students:
-                if s.phone:
-                    recipients.append({
-                        'name': f"{s.first_name} {s.last_name}",
-                        'phone': s.phone.replace(' ', '').replace('-', ''),
-                    })
-            
             return Response({
                 'message': 'WhatsApp links generated',
-                'recipients': recipients,
+                'recipients': collect_whatsapp_recipients(students),
                 'content': content
             })
             
@@ -192,25 +232,50 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
     """
     API endpoint for enrollments
     """
-    queryset = Enrollment.objects.all().select_related('student', 'course')
+    queryset = Enrollment.objects.all().select_related('student', 'course', 'batch')
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['student', 'course', 'status', 'payment_status']
+    filterset_fields = ['student', 'course', 'batch', 'status', 'payment_status']
     ordering_fields = ['enrollment_date', 'progress_percentage']
     ordering = ['-enrollment_date']
     
+    def get_permissions(self):
+        # Schedules are readable like the rest of the viewset, but creating
+        # one writes financial records
+        if self.action == 'create_installments':
+            return [IsAdminUser()]
+        return super().get_permissions()
+    
     def get_serializer_class(self):
         if self.action == 'create':
             return EnrollmentCreateSerializer
+        if self.action in ('list', 'by_student'):
+            return EnrollmentReadSerializer
         return EnrollmentSerializer
     
+    def list(self, request, *args, **kwargs):
+        """Enrollment listing from flat rows (see EnrollmentReadSerializer)"""
+        rows = EnrollmentReadSerializer.project(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(rows, many=True).data)
+    
+    @idempotent('enrollments.create')
     def create(self, request, *args, **kwargs):
         """Create a new enrollment"""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        # Create enrollment
-        enrollment = serializer.save()
+        # Create enrollment; a concurrent duplicate trips unique_together
+        try:
+            with transaction.atomic():
+                enrollment = serializer.save()
+        except IntegrityError:
+            return Response(
+                {"detail": "Student is already enrolled in this course"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         # Return full enrollment details
         response_serializer = EnrollmentSerializer(enrollment)
@@ -219,6 +284,15 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
     
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response(
+                {"detail": "This enrollment has recorded payments and cannot be deleted; cancel it instead"},
+                status=status.HTTP_409_CONFLICT
+            )
+    
     @action(detail=False, methods=['get'])
     def by_student(self, request):
         """Get enrollments for a specific student"""
@@ -229,9 +303,98 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        enrollments = self.get_queryset().filter(student_id=student_id)
+        enrollments = EnrollmentReadSerializer.project(self.get_queryset().filter(student_id=student_id))
         serializer = self.get_serializer(enrollments, many=True)
         return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def installments(self, request, pk=None):
+        """GET the enrollment's installment schedule"""
+        enrollment = self.get_object()
+        serializer = InstallmentSerializer(enrollment.installments.all(), many=True)
+        return Response(serializer.data)
+    
+    @installments.mapping.post
+    def create_installments(self, request, pk=None):
+        """
+        POST generates the installment schedule from the fee and the
+        course's duration_months (optionally count and first_due) if it
+        does not exist yet (staff only, see get_permissions).
+        """
+        enrollment = self.get_object()
+        if enrollment.installments.exists():
+            return Response(
+                {"detail": "This enrollment already has an installment plan"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        plan = InstallmentPlanSerializer(data=request.data)
+        plan.is_valid(raise_exception=True)
+        create_installment_plans(Enrollment.objects.filter(pk=enrollment.pk), **plan.validated_data)
+        
+        serializer = InstallmentSerializer(enrollment.installments.all(), many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    @idempotent('enrollments.bulk_enroll')
+    def bulk_enroll(self, request):
+        """
+        Enroll a list of students (e.g. from a school tie-up) into one
+        course and optional batch: {"course", "batch", "students": [ids]}.
+        Students beyond the batch's free seats are waitlisted. Returns a
+        result per student: enrolled, waitlisted, already_enrolled, clash
+        (timetable overlap) or not_found.
+        """
+        serializer = BulkEnrollmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        results = bulk_enroll(data['course'], data['students'], batch=data.get('batch'))
+        counts = Counter(row['result'] for row in results)
+        return Response({
+            'enrolled': counts['enrolled'],
+            'waitlisted': counts['waitlisted'],
+            'skipped': len(results) - counts['enrolled'] - counts['waitlisted'],
+            'results': results,
+        }, status=status.HTTP_201_CREATED if counts['enrolled'] or counts['waitlisted'] else status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    @idempotent('enrollments.bulk_transition')
+    def bulk_transition(self, request):
+        """
+        Move many enrollments to one status, e.g. complete a whole batch.
+        Rows are selected by ids and/or batch, course and from_status.
+        Nothing changes if any selected row cannot make the transition,
+        unless skip_invalid is set.
+        """
+        serializer = EnrollmentTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        enrollments = Enrollment.objects.all()
+        if 'ids' in data:
+            enrollments = enrollments.filter(pk__in=data['ids'])
+        if 'batch' in data:
+            enrollments = enrollments.filter(batch_id=data['batch'])
+        if 'course' in data:
+            enrollments = enrollments.filter(course_id=data['course'])
+        if 'from_status' in data:
+            enrollments = enrollments.filter(status=data['from_status'])
+        
+        result = transition_enrollments(
+            enrollments, data['status'], skip_invalid=data['skip_invalid'], notify=data['notify']
+        )
+        if result['invalid'] and not data['skip_invalid']:
+            return Response(
+                {"detail": f"Some enrollments cannot be moved to '{data['status']}'", "invalid": result['invalid']},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({
+            'status': data['status'],
+            'updated': len(result['updated']),
+            'updated_ids': result['updated'],
+            'skipped': result['invalid'],
+            'promoted_ids': result['promoted'],
+        })
 
 
 class ContactMessageViewSet(viewsets.ModelViewSet):
@@ -245,6 +408,12 @@ class ContactMessageViewSet(viewsets.ModelViewSet):
     filterset_fields = ['is_read']
     ordering = ['-created_at']
     
+    def get_throttles(self):
+        # Only the public submission endpoint is rate limited
+        if self.action == 'create':
+            return [ContactThrottle()]
+        return super().get_throttles()
+    
     def create(self, request, *args, **kwargs):
         """Create a new contact message"""
         serializer = self.get_serializer(data=request.data)
@@ -283,3 +452,250 @@ class BatchViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['course', 'is_active']
     search_fields = ['name']
+    
+    @action(detail=True, methods=['get'], permission_classes=[IsAdminUser])
+    def roster(self, request, pk=None):
+        """
+        Students of the batch with contact details, status, progress and
+        payment, from one cached query. ?export=csv downloads it and
+        ?export=print renders a printable sheet.
+        """
+        batch = get_object_or_404(Batch.objects.select_related('course'), pk=pk)
+        roster = batch_roster(batch)
+        export = request.query_params.get('export')
+        
+        if export == 'csv':
+            response = HttpResponse(content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="batch_{batch.pk}_roster.csv"'
+            writer = csv.writer(response)
+            writer.writerow([label for _, label in ROSTER_COLUMNS])
+            for student in roster['students']:
+                writer.writerow([student[name] for name, _ in ROSTER_COLUMNS])
+            return response
+        if export == 'print':
+            return HttpResponse(render_to_string('roster/batch_roster.html', roster))
+        if export:
+            return Response({"detail": "export must be csv or print"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(roster)
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def clashes(self, request):
+        """
+        Room double-bookings and students enrolled in overlapping batches,
+        across all active batches.
+        """
+        report = clash_report()
+        names = dict(Batch.objects.values_list('id', 'name'))
+        for clash in report['rooms'] + report['students']:
+            clash['batch_names'] = [names[pk] for pk in clash['batches']]
+        return Response(report)
+    
+    @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
+    def progress(self, request, pk=None):
+        """
+        Update progress for many students of a batch in one call (staff only), either
+        {"progress": {enrollment_id: 0-100}} or {"increment": N} for every
+        active enrollment (clamped to 0-100). Only changed rows are written,
+        with one bulk UPDATE touching progress_percentage and updated_at.
+        Returns {enrollment_id: [old, new]} for the rows that changed.
+        """
+        batch = self.get_object()
+        serializer = BatchProgressSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        enrollments = Enrollment.objects.filter(batch=batch, status__in=['pending', 'approved'])
+        if 'progress' in data:
+            enrollments = enrollments.filter(pk__in=data['progress'])
+        with transaction.atomic():
+            # Locked so concurrent increments are not lost
+            rows = list(enrollments.select_for_update().only('id', 'student_id', 'progress_percentage'))
+            
+            if 'progress' in data:
+                missing = sorted(set(data['progress']) - {row.id for row in rows})
+                if missing:
+                    return Response(
+                        {"detail": "Enrollments not active in this batch", "ids": missing},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+            
+            now = timezone.now()
+            changes = {}
+            changed = []
+            for row in rows:
+                if 'progress' in data:
+                    new_progress = data['progress'][row.id]
+                else:
+                    new_progress = min(100, max(0, row.progress_percentage + data['increment']))
+                if new_progress != row.progress_percentage:
+                    changes[row.id] = [row.progress_percentage, new_progress]
+                    row.progress_percentage = new_progress
+                    row.updated_at = now
+                    changed.append(row)
+            
+            if changed:
+                Enrollment.objects.bulk_update(changed, ['progress_percentage', 'updated_at'], batch_size=500)
+                invalidate_current_user(*{row.student_id for row in changed})
+        
+        return Response({
+            'updated': len(changed),
+            'unchanged': len(rows) - len(changed),
+            'changes': changes,
+        })
+
+
+class MessageCampaignViewSet(viewsets.ModelViewSet):
+    """
+    API endpoint for scheduled message campaigns (staff only)
+    """
+    queryset = MessageCampaign.objects.all()
+    serializer_class = MessageCampaignSerializer
+    permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['status', 'message_type', 'reminder_rule', 'batch']
+    ordering_fields = ['send_at', 'created_at']
+    ordering = ['-send_at']
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel a campaign that has not been picked up by the scheduler yet"""
+        updated = MessageCampaign.objects.filter(pk=pk, status='scheduled').update(status='cancelled')
+        if not updated:
+            return Response(
+                {"detail": "Only scheduled campaigns can be cancelled"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({"detail": "Campaign cancelled"})
+
+
+class BatchReminderRuleViewSet(viewsets.ModelViewSet):
+    """
+    API endpoint for recurring batch-start reminder rules (staff only)
+    """
+    queryset = BatchReminderRule.objects.all()
+    serializer_class = BatchReminderRuleSerializer
+    permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['is_active', 'message_type']
+
+
+class PaymentViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                     viewsets.GenericViewSet):
+    """
+    API endpoint for the append-only payment ledger (staff only)
+    """
+    queryset = Payment.objects.all()
+    serializer_class = PaymentSerializer
+    permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['enrollment', 'mode', 'enrollment__student', 'enrollment__course']
+    ordering_fields = ['paid_at', 'amount']
+    ordering = ['-paid_at']
+    
+    @idempotent('payments.create')
+    def create(self, request, *args, **kwargs):
+        """Record a payment and update the enrollment's balance in one transaction"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            payment = record_payment(recorded_by_id=request.user.id, **serializer.validated_data)
+        except IntegrityError:
+            return Response(
+                {"detail": "A payment with this receipt number already exists"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(self.get_serializer(payment).data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['get'])
+    def dues(self, request):
+        """
+        Outstanding dues from the materialized enrollment balances, largest
+        first, with totals. Filter with ?course=, ?batch= and ?status=.
+        """
+        lookups = {}
+        for param, lookup in (('course', 'course_id'), ('batch', 'batch_id'), ('status', 'status')):
+            if request.query_params.get(param):
+                lookups[lookup] = request.query_params[param]
+        enrollments = dues_queryset(**lookups)
+        
+        totals = enrollments.aggregate(enrollments=Count('id'), balance_due=Sum('balance_due'))
+        page = self.paginate_queryset(enrollments.values(
+            'id', 'status', 'payment_status', 'fee_due', 'amount_paid', 'balance_due',
+            'student_id', 'student__first_name', 'student__last_name', 'student__email',
+            'course__code', 'batch__name'
+        ))
+        response = self.get_paginated_response(page)
+        response.data['totals'] = totals
+        return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def mail_queue_metrics(request):
+    """
+    Background mail sender metrics for this worker process:
+    queue depth, delivery counters and send latency.
+    """
+    return Response(get_mail_queue_stats())
+
+
+def _analytics_params(request, dimensions):
+    """Parse start/end (ISO dates, default: this month so far) and group_by"""
+    today = timezone.localdate()
+    start = request.query_params.get('start')
+    end = request.query_params.get('end')
+    try:
+        start = parse_date(start) if start else today.replace(day=1)
+        end = parse_date(end) if end else today
+    except ValueError:
+        start = end = None
+    if start is None or end is None:
+        return None, {'detail': 'start and end must be dates (YYYY-MM-DD).'}
+    if start > end:
+        return None, {'detail': 'start must not be after end.'}
+    group_by = [key for key in request.query_params.get('group_by', '').split(',') if key]
+    unknown = [key for key in group_by if key not in dimensions]
+    if unknown:
+        return None, {'detail': f'Unknown group_by: {", ".join(unknown)}. Choose from {", ".join(dimensions)}.'}
+    return (start, end, group_by), None
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def enrollment_analytics(request):
+    """
+    Enrollment counts for a date range from the daily rollups.
+
+    Query params: start, end (YYYY-MM-DD, inclusive) and group_by, a
+    comma-separated subset of course, category, status and month.
+    'as_of' is when the rollup was last refreshed.
+    """
+    params, error = _analytics_params(request, ENROLLMENT_DIMENSIONS)
+    if error:
+        return Response(error, status=status.HTTP_400_BAD_REQUEST)
+    start, end, group_by = params
+    return Response({
+        'start': start,
+        'end': end,
+        'as_of': rollup_as_of().get('enrollments'),
+        'results': enrollment_breakdown(start, end, group_by),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def revenue_analytics(request):
+    """
+    Ledger revenue (payments net of refunds) for a date range from the
+    daily rollups; group_by accepts course, category and month.
+    """
+    params, error = _analytics_params(request, REVENUE_DIMENSIONS)
+    if error:
+        return Response(error, status=status.HTTP_400_BAD_REQUEST)
+    start, end, group_by = params
+    return Response({
+        'start': start,
+        'end': end,
+        'as_of': rollup_as_of().get('revenue'),
+        'results': revenue_breakdown(start, end, group_by),
+    })
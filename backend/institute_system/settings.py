@@ -11,9 +11,11 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+from datetime import timedelta
 from pathlib import Path
 from decouple import config
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +46,7 @@ INSTALLED_APPS = [
     
     # Third-party apps
     'rest_framework',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'django_filters',
     
@@ -98,6 +101,11 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # IMMEDIATE takes the write lock at BEGIN, so read-then-write
+            # transactions wait out `timeout` instead of failing as locked
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+            # A file: in-memory test databases fail concurrent writers at once
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 
@@ -121,6 +129,20 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Student password hashing (separate from staff PASSWORD_HASHERS).
+# The first hasher is used for new hashes; hashes made by the others still
+# verify and are upgraded transparently on the next successful login.
+# Run `python manage.py benchmark_login` to size the scrypt work factor.
+STUDENT_PASSWORD_HASHERS = [
+    'core.hashers.StudentScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+STUDENT_SCRYPT_WORK_FACTOR = config('STUDENT_SCRYPT_WORK_FACTOR', default=2**14, cast=int)
+STUDENT_SCRYPT_BLOCK_SIZE = config('STUDENT_SCRYPT_BLOCK_SIZE', default=8, cast=int)
+STUDENT_SCRYPT_PARALLELISM = config('STUDENT_SCRYPT_PARALLELISM', default=1, cast=int)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -152,6 +174,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework Configuration
 REST_FRAMEWORK = {
+    # Bearer JWTs (API clients) first, then the SPA's session cookie
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'core.authentication.StatelessJWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
@@ -162,6 +190,65 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 50,
+    # Proxies in front of Django, used to find the client IP for throttling.
+    # Render (which sets RENDER=true) has one; with 0 behind a proxy every
+    # client would share the proxy's rate limit bucket
+    'NUM_PROXIES': config('NUM_PROXIES', default=1 if config('RENDER', default=False, cast=bool) else 0, cast=int),
+}
+
+# JWT authentication for API clients (see core.authentication)
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=config('JWT_ACCESS_MINUTES', default=15, cast=int)),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=config('JWT_REFRESH_DAYS', default=7, cast=int)),
+    'ROTATE_REFRESH_TOKENS': True,
+    'BLACKLIST_AFTER_ROTATION': True,
+    'UPDATE_LAST_LOGIN': False,
+}
+
+# Caches
+# 'default' can be pointed at a shared backend (memcached/redis) via env.
+# 'ratelimit' is a per-process in-memory cache: the lightweight throttling
+# mode, which needs no network or database writes but counts per worker.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='csc-default'),
+    },
+    'ratelimit': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'csc-ratelimit',
+    },
+}
+_SHARED_DEFAULT_CACHE = not CACHES['default']['BACKEND'].endswith('LocMemCache')
+
+# /auth/me payload cache (per student, invalidated on Student/Enrollment
+# changes). On by default only with a shared CACHE_BACKEND: a per-process
+# cache would keep serving stale payloads on the workers that missed the
+# invalidation.
+CURRENT_USER_CACHE_ENABLED = config('CURRENT_USER_CACHE_ENABLED', default=_SHARED_DEFAULT_CACHE, cast=bool)
+CURRENT_USER_CACHE_TTL = config('CURRENT_USER_CACHE_TTL', default=300, cast=int)
+CURRENT_USER_MAX_AGE = config('CURRENT_USER_MAX_AGE', default=10, cast=int)
+
+# Batch rosters are cached under a fingerprint of the batch's enrollments,
+# so changes show up immediately; the TTL only evicts superseded entries.
+BATCH_ROSTER_CACHE_TTL = config('BATCH_ROSTER_CACHE_TTL', default=3600, cast=int)
+
+# Admin changelists: cached filter choices (dropped when batches/courses
+# change) and, on PostgreSQL, planner row estimates instead of COUNT(*)
+# for unfiltered lists of tables larger than the threshold.
+ADMIN_FILTER_CACHE_TTL = config('ADMIN_FILTER_CACHE_TTL', default=600, cast=int)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=10000, cast=int)
+
+# Sliding-window rate limits ('count/seconds') per endpoint, by client IP
+# and by the targeted account (email). Set RATE_LIMIT_CACHE=default to
+# share counters across workers through the main cache.
+RATE_LIMIT_ENABLED = config('RATE_LIMIT_ENABLED', default=True, cast=bool)
+RATE_LIMIT_CACHE = config('RATE_LIMIT_CACHE', default='ratelimit')
+RATE_LIMITS = {
+    'login': {'ip': '30/300', 'identity': '10/300'},
+    'otp_request': {'ip': '10/3600', 'identity': '5/3600'},
+    'otp_verify': {'ip': '30/600', 'identity': '10/600'},
+    'contact': {'ip': '5/600', 'identity': '5/600'},
 }
 
 # CORS Configuration
@@ -169,7 +256,32 @@ CORS_ALLOWED_ORIGINS = [url.strip() for url in config('CORS_ALLOWED_ORIGINS', de
 
 CORS_ALLOW_CREDENTIALS = True
 
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
+# How long (seconds) a stored Idempotency-Key response is replayed for
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60, cast=int)
+# Seconds after which a key whose request never finished (crashed worker)
+# can be retried instead of answering 409
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT = config('IDEMPOTENCY_IN_FLIGHT_TIMEOUT', default=5 * 60, cast=int)
+
+# Seconds before a campaign stuck in 'sending' is picked up by the next
+# scheduler run
+CAMPAIGN_CLAIM_TIMEOUT = config('CAMPAIGN_CLAIM_TIMEOUT', default=30 * 60, cast=int)
+
 # Session Configuration for cross-origin auth
+# cached_db serves session reads from SESSION_CACHE_ALIAS and only falls
+# back to django_session on a cache miss. It is only the default when
+# 'default' is a shared cache: with per-process LocMem, a logout on one
+# worker would leave the session cached (and valid) on the others, so the
+# plain db engine is used instead. Use
+# 'django.contrib.sessions.backends.signed_cookies' for fully stateless
+# sessions. Expired rows are pruned by `manage.py purge_expired_sessions`.
+SESSION_ENGINE = config(
+    'SESSION_ENGINE',
+    default='django.contrib.sessions.backends.cached_db' if _SHARED_DEFAULT_CACHE
+    else 'django.contrib.sessions.backends.db',
+)
+SESSION_CACHE_ALIAS = config('SESSION_CACHE_ALIAS', default='default')
 SESSION_COOKIE_SAMESITE = 'Lax'
 SESSION_COOKIE_HTTPONLY = True
 
@@ -185,7 +297,26 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 
+# Password-reset OTPs. OTP_STORE='cache' keeps them only in OTP_CACHE
+# (native TTL, no database access on verify); 'db' uses OTPVerification
+# rows, pruned by `manage.py purge_expired_otps`.
+OTP_STORE = config('OTP_STORE', default='db')
+OTP_CACHE = config('OTP_CACHE', default='default')
+OTP_TTL_MINUTES = config('OTP_TTL_MINUTES', default=10, cast=int)
+OTP_RESET_WINDOW_MINUTES = config('OTP_RESET_WINDOW_MINUTES', default=15, cast=int)
+OTP_MAX_ATTEMPTS = config('OTP_MAX_ATTEMPTS', default=5, cast=int)
+
+# Background sender for transactional emails (OTPs); disable to send inline
+MAIL_QUEUE_ENABLED = config('MAIL_QUEUE_ENABLED', default=True, cast=bool)
+MAIL_QUEUE_WORKERS = config('MAIL_QUEUE_WORKERS', default=2, cast=int)
+MAIL_QUEUE_MAXSIZE = config('MAIL_QUEUE_MAXSIZE', default=500, cast=int)
+MAIL_QUEUE_MAX_RETRIES = config('MAIL_QUEUE_MAX_RETRIES', default=3, cast=int)
+MAIL_QUEUE_EXIT_TIMEOUT = config('MAIL_QUEUE_EXIT_TIMEOUT', default=30, cast=int)
+
 # Twilio Configuration
 TWILIO_ACCOUNT_SID = config('TWILIO_ACCOUNT_SID', default='')
 TWILIO_AUTH_TOKEN = config('TWILIO_AUTH_TOKEN', default='')
 TWILIO_WHATSAPP_NUMBER = config('TWILIO_WHATSAPP_NUMBER', default='whatsapp:+14155238886')
+
+# Phone numbers without a country code are stored in E.164 with this prefix
+PHONE_DEFAULT_COUNTRY_CODE = config('PHONE_DEFAULT_COUNTRY_CODE', default='91')
@@ -20,6 +20,8 @@ function AdminDashboard() {
         content: ''
     });
     const [whatsappRecipients, setWhatsappRecipients] = useState([]);
+    // Reused across retries of the same send so a timed-out request isn't delivered twice
+    const [messageIdempotencyKey, setMessageIdempotencyKey] = useState(() => crypto.randomUUID());
 
     // New Batch State
     const [showNewBatchModal, setShowNewBatchModal] = useState(false);
@@ -114,10 +116,12 @@ function AdminDashboard() {
     const handleSendMessage = async (e) => {
         e.preventDefault();
         try {
+            // Only the checked rows of the visible page are messaged
             const res = await sendBulkMessage({
                 student_ids: selectedStudentIds,
                 ...messageData
-            });
+            }, messageIdempotencyKey);
+            setMessageIdempotencyKey(crypto.randomUUID());
 
             if (messageData.type === 'whatsapp') {
                 setWhatsappRecipients(res.data.recipients);
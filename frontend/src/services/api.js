@@ -47,7 +47,14 @@ export const updateStudentProfile = (id, data) => {
 export const exportStudentsCSV = (params = {}) =>
     api.get('/students/export_csv/', { params, responseType: 'blob' });
 
-export const sendBulkMessage = (data) => api.post('/students/send_bulk_message/', data);
+// Idempotent POSTs: the caller creates one key per form submission (not per
+// call) and passes it again on retries/double-clicks, so the server replays
+// the first response instead of redoing the work.
+const idempotencyHeaders = (idempotencyKey) =>
+    idempotencyKey ? { headers: { 'Idempotency-Key': idempotencyKey } } : undefined;
+
+export const sendBulkMessage = (data, idempotencyKey) =>
+    api.post('/students/send_bulk_message/', data, idempotencyHeaders(idempotencyKey));
 
 // Batches
 export const getBatches = (params = {}) => api.get('/batches/', { params });
@@ -55,7 +62,8 @@ export const createBatch = (data) => api.post('/batches/', data);
 export const updateBatch = (id, data) => api.patch(`/batches/${id}/`, data);
 
 // Enrollments
-export const createEnrollment = (data) => api.post('/enrollments/', data);
+export const createEnrollment = (data, idempotencyKey) =>
+    api.post('/enrollments/', data, idempotencyHeaders(idempotencyKey));
 export const getEnrollmentsByStudent = (studentId) =>
     api.get('/enrollments/by_student/', { params: { student_id: studentId } });
 